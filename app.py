@@ -1,5 +1,6 @@
 from flask import Flask, render_template, session, redirect, jsonify, request
 from flask_wtf.csrf import CSRFProtect
+from sqlalchemy import func, select
 from models import db, WorkoutPlan
 import os
 from user_profile import profile_bp
@@ -9,6 +10,10 @@ from user_profile import profile_bp
 from auth import auth_bp
 from record import record_bp, log_cardio, log_strength
 from social.social import social_bp
+from cache import analytics_cache
+from ratelimit import auth_limiter
+import passwords
+from versions import CATEGORIES, conditional, plans, version_stamp
 
 # Initialize Flask app
 app = Flask(__name__, static_folder='.', static_url_path='', template_folder='.')
@@ -16,7 +21,12 @@ app = Flask(__name__, static_folder='.', static_url_path='', template_folder='.'
 #Upload Configuration
 BASEDIR = os.path.abspath(os.path.dirname(__file__))
 app.config['UPLOAD_FOLDER'] = os.path.join(BASEDIR, 'uploads')
-app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024    # 5 MB limited
+# Whole request body, enforced by Werkzeug before the view runs (answered by the 413
+# handlers in user_profile.py). Kept above the per-file cap so that one is reachable.
+app.config['MAX_CONTENT_LENGTH'] = 6 * 1024 * 1024
+# Per uploaded avatar; Werkzeug spools larger multipart parts to a temp file, and
+# blobstore.receive() copies them from there in chunks, stopping past this size
+app.config['AVATAR_MAX_BYTES'] = 5 * 1024 * 1024
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
 # Secret key for session and CSRF. Use environment or generate random
 key_file = os.path.join(app.instance_path, 'secret_key.txt')
@@ -36,9 +46,30 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'app.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# Password hashing policy; stored hashes made under another policy are upgraded at login
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256')
+# Unset: the method's own default cost (passwords.DEFAULT_COSTS)
+app.config['PASSWORD_HASH_ITERATIONS'] = (
+    int(os.environ['PASSWORD_HASH_ITERATIONS']) if os.environ.get('PASSWORD_HASH_ITERATIONS') else None
+)
+
+# Admission control for login and password reset, checked before any hashing:
+# identity kind -> (max requests, window seconds). 'memory' counts per process; use 'sqlite'
+# whenever more than one worker serves requests, or each gets the full limit
+app.config['AUTH_RATE_LIMIT_BACKEND'] = os.environ.get('AUTH_RATE_LIMIT_BACKEND', 'memory')
+app.config['AUTH_RATE_LIMITS'] = {'username': (10, 300), 'ip': (30, 60)}
+
+# Shared cache for cross-user analytics; use 'sqlite' to share it between workers
+app.config['ANALYTICS_CACHE_BACKEND'] = os.environ.get('ANALYTICS_CACHE_BACKEND', 'memory')
+app.config['ANALYTICS_CACHE_TTL'] = 60
+app.config['ANALYTICS_CACHE_SIZE'] = 256
+
 # Initialize extensions
 db.init_app(app)
 csrf = CSRFProtect(app)
+analytics_cache.init_app(app)
+auth_limiter.init_app(app)
+passwords.init_app(app)
 
 # Register blueprints
 app.register_blueprint(auth_bp)
@@ -73,15 +104,25 @@ def my_plan_api():
     if not user_id:
         return jsonify([]) if request.method == 'GET' else jsonify({'error': 'Not logged in'}), 401
     if request.method == 'GET':
-        plans = WorkoutPlan.query.filter_by(user_id=user_id).order_by(WorkoutPlan.start_time.desc()).all()
-        return jsonify([
-            {
-                'id': p.id,
-                'activity': p.activity,
-                'start_time': p.start_time.strftime('%Y-%m-%dT%H:%M'),
-                'end_time': p.end_time.strftime('%Y-%m-%dT%H:%M')
-            } for p in plans
-        ])
+        mine = WorkoutPlan.user_id == user_id
+        stamp = version_stamp(
+            [plans(user_id)],
+            select(func.count(WorkoutPlan.id)).where(mine).scalar_subquery(),
+            select(func.max(WorkoutPlan.id)).where(mine).scalar_subquery(),
+            extra=(user_id,)
+        )
+
+        def build():
+            rows = WorkoutPlan.query.filter_by(user_id=user_id).order_by(WorkoutPlan.start_time.desc()).all()
+            return jsonify([
+                {
+                    'id': p.id,
+                    'activity': p.activity,
+                    'start_time': p.start_time.strftime('%Y-%m-%dT%H:%M'),
+                    'end_time': p.end_time.strftime('%Y-%m-%dT%H:%M')
+                } for p in rows
+            ])
+        return conditional(stamp, build)
     else:
         data = request.get_json()
         activity = data.get('activity')
@@ -116,8 +157,16 @@ def my_plan_api():
 @app.route('/api/sport_categories')
 def get_sport_categories():
     from models import SportsCategory
-    cats = SportsCategory.query.all()
-    return jsonify([{'id': c.id, 'name': c.name} for c in cats])
+    stamp = version_stamp(
+        [CATEGORIES],
+        select(func.count(SportsCategory.id)).scalar_subquery(),
+        select(func.max(SportsCategory.id)).scalar_subquery()
+    )
+
+    def build():
+        cats = SportsCategory.query.all()
+        return jsonify([{'id': c.id, 'name': c.name} for c in cats])
+    return conditional(stamp, build)
 
 if __name__ == '__main__':
     with app.app_context():
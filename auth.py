@@ -1,10 +1,21 @@
 from flask import Blueprint, jsonify, redirect, request, session, url_for
-from werkzeug.security import generate_password_hash, check_password_hash
 from models import db, User
+from passwords import check_password, hash_password
+from ratelimit import auth_limiter
 from flask_wtf.csrf import generate_csrf
 
 auth_bp = Blueprint('auth', __name__)
 
+def rate_limited(scope, username):
+    # 429 response when this username or client IP is over its limit, else None
+    retry_after = auth_limiter.hit(scope, username=username, ip=request.remote_addr)
+    if not retry_after:
+        return None
+    response = jsonify({'success': False, 'error': 'Too many attempts, try again later'})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
 @auth_bp.route('/api/csrf-token', methods=['GET'])
 def get_csrf_token():
     # Provide CSRF token for AJAX requests
@@ -19,7 +30,7 @@ def signup():
     password = data.get('password')
     if User.query.filter((User.username == username) | (User.email == email)).first():
         return jsonify({'success': False, 'error': 'Username or Email already exists'}), 400
-    hashed_pw = generate_password_hash(password)
+    hashed_pw = hash_password(password)
     user = User(username=username, email=email, password_hash=hashed_pw)
     db.session.add(user)
     db.session.commit()
@@ -30,12 +41,26 @@ def login():
     data = request.get_json()
     username = data.get('username')
     password = data.get('password')
+    # Before the user lookup and the password hash
+    limited = rate_limited('login', username)
+    if limited:
+        return limited
     user = User.query.filter_by(username=username).first()
-    if user and check_password_hash(user.password_hash, password):
+    if user and check_password(user, password):
+        # Persists a hash upgraded to the current policy, if any
+        db.session.commit()
         session['user_id'] = user.id
         return jsonify({'success': True})
     return jsonify({'success': False, 'error': 'Invalid credentials'}), 401
 
+@auth_bp.route('/api/auth/limiterStats')
+def limiter_stats():
+    # Admitted/rejected counters of the login and reset-password limiter;
+    # not public, or a flood could watch how well it is getting through
+    if not session.get('user_id'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify(auth_limiter.stats())
+
 @auth_bp.route('/api/logout', methods=['POST'])
 def logout():
     session.pop('user_id', None)
@@ -55,10 +80,13 @@ def reset_password():
     data = request.get_json()
     username = data.get('username')
     new_password = data.get('password')
+    limited = rate_limited('reset-password', username)
+    if limited:
+        return limited
     user = User.query.filter_by(username=username).first()
     if not user:
         return jsonify({'success': False, 'error': 'User not found'}), 404
-    user.password_hash = generate_password_hash(new_password)
+    user.password_hash = hash_password(new_password)
     db.session.commit()
     return jsonify({'success': True})
 
@@ -73,10 +101,9 @@ def register():
         email=email,
         nickname='Not set',
         address='Not set',
-        avatar='default.jpg',
         coins=0
     )
-    new_user.set_password(password)
+    new_user.password_hash = hash_password(password)
     db.session.add(new_user)
     db.session.commit()
     return redirect(url_for('auth_bp.login'))
@@ -0,0 +1,96 @@
+import io
+import os
+from PIL import Image, ImageOps
+import blobstore
+
+# Square thumbnail edge lengths in pixels, smallest first
+SIZES = (40, 128, 256)
+THUMBNAIL_FORMAT = 'JPEG'
+THUMBNAIL_MIMETYPE = 'image/jpeg'
+# Largest decoded image accepted (~100 MB as RGBA); checked before any pixels are decoded.
+# Pillow's own DecompressionBombError only fires at ~178M pixels.
+MAX_PIXELS = 25_000_000
+# Accepted uploads, recognised by their leading bytes rather than the client's claim
+SIGNATURES = {
+    b'\x89PNG\r\n\x1a\n': 'image/png',
+    b'\xff\xd8\xff': 'image/jpeg',
+}
+
+
+def sniff(head):
+    """Mimetype from an upload's first bytes; raises ValueError for anything else."""
+    for signature, mimetype in SIGNATURES.items():
+        if head.startswith(signature):
+            return mimetype
+    raise ValueError('not a PNG or JPEG image')
+
+
+def thumbnail_path(root, digest, size):
+    return blobstore.variant_path(root, digest, f'{size}.jpg')
+
+
+def make_thumbnails(path):
+    """Decode the image at ``path`` once and re-encode it at every size in SIZES.
+
+    Returns {size: jpeg bytes}; raises ValueError when it is not an image
+    Pillow can read or would decode to more than MAX_PIXELS.
+    """
+    try:
+        with Image.open(path) as source:
+            # JPEGs can decode straight at a reduced scale
+            source.draft('RGB', (SIZES[-1], SIZES[-1]))
+            # Size after draft(): a large JPEG that decodes at 1/8 scale is fine
+            width, height = source.size
+            if width * height > MAX_PIXELS:
+                raise ValueError('image has too many pixels')
+            image = ImageOps.exif_transpose(source)
+            image.load()
+    except (OSError, Image.DecompressionBombError, SyntaxError) as e:
+        raise ValueError('not a readable image') from e
+    if image.mode in ('RGBA', 'LA', 'P'):
+        # Flatten transparency onto white; JPEG has no alpha channel
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    else:
+        image = image.convert('RGB')
+
+    thumbnails = {}
+    for size in reversed(SIZES):
+        # Each size is cut from the one above it, which is cheaper than the original
+        image = ImageOps.fit(image, (size, size), Image.LANCZOS)
+        out = io.BytesIO()
+        image.save(out, THUMBNAIL_FORMAT, quality=85, optimize=True)
+        thumbnails[size] = out.getvalue()
+    return thumbnails
+
+
+def save(root, stream, max_size):
+    """Stream an uploaded avatar into the blob store and make its thumbnails.
+
+    Returns (digest, mimetype). Raises blobstore.TooLarge past ``max_size``
+    bytes and ValueError for anything but a readable PNG or JPEG; nothing
+    is stored in either case.
+    """
+    with blobstore.receive(root, stream, max_size, check_head=sniff) as incoming:
+        mimetype = sniff(incoming.head)
+        thumbnails = make_thumbnails(incoming.path)
+        digest = incoming.commit()
+    write_thumbnails(root, digest, thumbnails)
+    return digest, mimetype
+
+
+def write_thumbnails(root, digest, thumbnails):
+    for size, jpeg in thumbnails.items():
+        blobstore.store_variant(root, digest, f'{size}.jpg', jpeg)
+
+
+def ensure_thumbnails(root, digest):
+    """Create missing thumbnails for a stored avatar; returns False if the original is gone."""
+    if all(os.path.isfile(thumbnail_path(root, digest, size)) for size in SIZES):
+        return True
+    if not blobstore.exists(root, digest):
+        return False
+    write_thumbnails(root, digest, make_thumbnails(blobstore.blob_path(root, digest)))
+    return True
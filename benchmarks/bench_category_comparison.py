@@ -0,0 +1,116 @@
+# Compares the old per-category AVG loop with /api/record/categoryComparison:
+# cold (cross-user averages recomputed, as on the first request after a write
+# or TTL expiry) and warm (averages served from the analytics cache).
+#
+#   python benchmarks/bench_category_comparison.py [categories] [users] [records_per_user]
+
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import event, func
+from cache import analytics_cache
+from models import db, User, SportsCategory, WorkoutRecord
+from record import category_comparison
+
+
+def old_loop(user_id, start):
+    # The implementation before the rewrite: two AVG queries per category
+    categories = SportsCategory.query.all()
+    you_data, avg_data = [], []
+    for cat in categories:
+        your_avg = (
+            db.session.query(func.avg(WorkoutRecord.difficulty))
+            .filter(
+                WorkoutRecord.user_id == user_id,
+                WorkoutRecord.category_id == cat.id,
+                WorkoutRecord.date >= start
+            )
+            .scalar() or 0
+        )
+        avg_all = (
+            db.session.query(func.avg(WorkoutRecord.difficulty))
+            .filter(
+                WorkoutRecord.category_id == cat.id,
+                WorkoutRecord.date >= start
+            )
+            .scalar() or 0
+        )
+        you_data.append(round(your_avg, 2))
+        avg_data.append(round(avg_all, 2))
+    return {'categories': [c.name for c in categories], 'you': you_data, 'average': avg_data}
+
+
+def seed(n_categories, n_users, records_per_user):
+    random.seed(5505)
+    cats = [SportsCategory(name=f'Sport {i}', met_value=random.uniform(2, 11)) for i in range(n_categories)]
+    users = [User(username=f'user{i}', email=f'user{i}@example.com', password_hash='x') for i in range(n_users)]
+    db.session.add_all(cats + users)
+    db.session.commit()
+    for u in users:
+        db.session.add_all([
+            WorkoutRecord(
+                user_id=u.id,
+                category_id=random.choice(cats).id,
+                date=date.today() - timedelta(days=random.randint(0, 60)),
+                duration_min=random.randint(20, 120),
+                difficulty=random.randint(1, 5),
+                calories_burn=random.randint(100, 900)
+            )
+            for _ in range(records_per_user)
+        ])
+        db.session.commit()
+    return users[0].id
+
+
+def measure(fn, repeat=20):
+    queries = []
+    listener = lambda *args: queries.append(1)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        started = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        elapsed = (time.perf_counter() - started) / repeat
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    return elapsed * 1000, len(queries) // repeat
+
+
+def main():
+    n_categories = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    n_users = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    records_per_user = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(tmp, 'bench.db')
+        app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            user_id = seed(n_categories, n_users, records_per_user)
+            start = date.today() - timedelta(days=30)
+
+            print(f'{n_categories} categories, {n_users} users, {n_users * records_per_user} records')
+            old_ms, old_q = measure(lambda: old_loop(user_id, start))
+
+            def cold():
+                analytics_cache.invalidate()
+                return category_comparison('month', user_id, start, date.today())
+            cold_ms, cold_q = measure(cold)
+            category_comparison('month', user_id, start, date.today())
+            warm_ms, warm_q = measure(lambda: category_comparison('month', user_id, start, date.today()))
+            print(f'old loop:       {old_ms:8.2f} ms/request  {old_q:4d} queries')
+            print(f'grouped, cold:  {cold_ms:8.2f} ms/request  {cold_q:4d} queries  ({old_ms / cold_ms:.1f}x)')
+            print(f'grouped, warm:  {warm_ms:8.2f} ms/request  {warm_q:4d} queries  ({old_ms / warm_ms:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+# Measures how many password checks (the CPU cost of one /api/login) a
+# single core can do under each hashing policy, to size workers against the
+# expected login rate. PASSWORD_HASH_METHOD / PASSWORD_HASH_ITERATIONS pick
+# the policy in app.py.
+#
+#   python benchmarks/bench_passwords.py [seconds_per_policy]
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import check_password_hash, generate_password_hash
+from passwords import DEFAULT_ITERATIONS, DEFAULT_METHOD, method_string
+
+POLICIES = [
+    ('pbkdf2:sha256', 100_000),
+    ('pbkdf2:sha256', 260_000),
+    (DEFAULT_METHOD, DEFAULT_ITERATIONS),
+    ('pbkdf2:sha512', 210_000),
+    ('scrypt', 2 ** 14),
+    ('scrypt', 2 ** 15),
+]
+
+
+def checks_per_second(method, seconds):
+    hashed = generate_password_hash('correct horse battery staple', method=method)
+    checks = 0
+    started = time.perf_counter()
+    while True:
+        check_password_hash(hashed, 'correct horse battery staple')
+        checks += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= seconds:
+            return checks / elapsed, len(hashed)
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    cores = os.cpu_count() or 1
+    print(f'{cores} cores; hashing is CPU-bound, so totals assume one busy worker per core')
+    print(f'{"policy":32} {"ms/login":>9} {"logins/s/core":>14} {"logins/s total":>15} {"hash len":>9}')
+    for method, iterations in POLICIES:
+        name = method_string(method, iterations)
+        rate, length = checks_per_second(name, seconds)
+        marker = '  (default)' if (method, iterations) == (DEFAULT_METHOD, DEFAULT_ITERATIONS) else ''
+        print(f'{name:32} {1000 / rate:9.1f} {rate:14.1f} {rate * cores:15.0f} {length:9}{marker}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+# Compares ranking posts by scanning posts/likes/comments with decay computed
+# per request against reading the indexed posts.trend_score column used by
+# /api/posts/trending, and times the incremental and periodic maintenance.
+#
+#   python benchmarks/bench_trending.py [posts] [likes_per_post] [comments_per_post]
+
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import event, text
+from models import db
+from social import trending
+from social.engagement import set_engagement
+
+SCAN_QUERY = text(
+    'SELECT post_id, SUM(weight * decay(julianday(created_at))) AS score FROM ('
+    '  SELECT id AS post_id, created_at, 1.0 AS weight FROM posts'
+    '  UNION ALL SELECT post_id, created_at, 1.0 FROM likes'
+    '  UNION ALL SELECT post_id, created_at, 3.0 FROM comments'
+    ') GROUP BY post_id ORDER BY score DESC LIMIT 20'
+)
+
+
+def register_decay():
+    # The per-request alternative: decay every engagement row relative to now
+    now = time.time() / 86400 + 2440587.5
+    half_life = trending.HALF_LIFE / timedelta(days=1)
+
+    def connect(dbapi_connection, record):
+        dbapi_connection.create_function(
+            'decay', 1, lambda day: 2 ** ((day - now) / half_life) if day else 0, deterministic=True
+        )
+    event.listen(db.engine, 'connect', connect)
+
+
+def seed(n_posts, likes_per_post, comments_per_post):
+    random.seed(5505)
+    n_users = 1000
+    now = datetime.utcnow()
+    conn = db.session.connection()
+
+    def stamp(days):
+        return (now - timedelta(days=random.random() * days)).strftime('%Y-%m-%d %H:%M:%S.%f')
+
+    conn.exec_driver_sql(
+        'INSERT INTO users (id, username, email, password_hash, created_at, follower_count) VALUES (?, ?, ?, ?, ?, 0)',
+        [(i, f'user{i}', f'user{i}@example.com', 'x', stamp(0)) for i in range(1, n_users + 1)]
+    )
+    conn.exec_driver_sql(
+        'INSERT INTO posts (id, user_id, content, created_at, like_count, bookmark_count, '
+        'comment_count, fanned_out, trend_score) VALUES (?, ?, ?, ?, 0, 0, 0, 1, 0)',
+        [(i, random.randint(1, n_users), f'post {i}', stamp(30)) for i in range(1, n_posts + 1)]
+    )
+    conn.exec_driver_sql(
+        'INSERT OR IGNORE INTO likes (user_id, post_id, created_at) VALUES (?, ?, ?)',
+        [(random.randint(1, n_users), random.randint(1, n_posts), stamp(30))
+         for _ in range(int(n_posts * likes_per_post))]
+    )
+    conn.exec_driver_sql(
+        'INSERT INTO comments (user_id, post_id, content, created_at) VALUES (?, ?, ?, ?)',
+        [(random.randint(1, n_users), random.randint(1, n_posts), 'nice', stamp(30))
+         for _ in range(int(n_posts * comments_per_post))]
+    )
+    db.session.commit()
+    return n_users
+
+
+def timed(fn, repeat=1):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - started) / repeat * 1000, result
+
+
+def main():
+    n_posts = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    likes_per_post = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    comments_per_post = float(sys.argv[3]) if len(sys.argv) > 3 else 0.3
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(tmp, 'bench.db')
+        app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(app)
+        with app.app_context():
+            register_decay()
+            db.create_all()
+            seed_ms, n_users = timed(lambda: seed(n_posts, likes_per_post, comments_per_post))
+            rebuild_ms, _ = timed(trending.rebuild_trending)
+            print(f'{n_posts} posts, ~{int(n_posts * likes_per_post)} likes, '
+                  f'{int(n_posts * comments_per_post)} comments (seeded in {seed_ms / 1000:.1f} s)')
+
+            scan_ms, _ = timed(lambda: db.session.execute(SCAN_QUERY).all(), repeat=3)
+            index_ms, _ = timed(lambda: trending.trending_page(20), repeat=100)
+
+            def like_once():
+                set_engagement('like', random.randint(1, n_users), random.randint(1, n_posts), True)
+                db.session.commit()
+            write_ms, _ = timed(like_once, repeat=200)
+
+            def renormalize_week():
+                trending.renormalize(datetime.utcnow() + trending.EPOCH_STEP)
+                db.session.commit()
+            renorm_ms, _ = timed(renormalize_week)
+
+            print(f'scan + decay per request:   {scan_ms:10.2f} ms/request')
+            print(f'indexed trend_score page:   {index_ms:10.2f} ms/request')
+            print(f'speedup:                    {scan_ms / index_ms:10.1f}x')
+            print(f'incremental like (commit):  {write_ms:10.2f} ms/write')
+            print(f'weekly renormalize:         {renorm_ms:10.2f} ms')
+            print(f'full rebuild (backfill):    {rebuild_ms:10.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+import hashlib
+import os
+import tempfile
+from contextlib import contextmanager
+
+# Content-addressed files: <root>/blobs/<first 2 hex chars>/<sha256 hex>.
+# The same bytes always land at the same path, so identical uploads are
+# stored once and a stored blob never changes. Files derived from a blob
+# (e.g. thumbnails) sit next to it as <sha256 hex>.<variant>.
+
+
+def blob_path(root, digest):
+    return os.path.join(root, 'blobs', digest[:2], digest)
+
+
+def variant_path(root, digest, variant):
+    return blob_path(root, digest) + '.' + variant
+
+
+def _write_atomic(path, data):
+    # Temp file in the target directory, then rename: readers never see a partial file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def store(root, data):
+    """Write ``data`` under its SHA-256 and return the hex digest.
+
+    Blobs that already exist are not rewritten.
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    path = blob_path(root, digest)
+    if not os.path.exists(path):
+        _write_atomic(path, data)
+    return digest
+
+
+def store_variant(root, digest, variant, data):
+    """Write a file derived from blob ``digest``; returns its path."""
+    path = variant_path(root, digest, variant)
+    _write_atomic(path, data)
+    return path
+
+
+class TooLarge(ValueError):
+    """An incoming blob went over its size limit."""
+
+
+class Incoming:
+    """A blob received into a temp file by receive(), not yet in the store."""
+
+    def __init__(self, root, path):
+        self.root = root
+        self.path = path
+        self.head = b''
+        self.size = 0
+        self.digest = None
+
+    def commit(self):
+        """Move the temp file to its content address; returns the digest."""
+        # A concurrent upload of the same bytes may have won; the content is identical
+        target = blob_path(self.root, self.digest)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(self.path, target)
+        self.path = target
+        return self.digest
+
+
+@contextmanager
+def receive(root, stream, max_size, check_head=None, chunk_size=64 * 1024):
+    """Copy ``stream`` to a temp file in chunks, hashing and counting as it goes.
+
+    Raises TooLarge as soon as more than ``max_size`` bytes arrive.
+    ``check_head`` is called with the first chunk and may raise to reject
+    the stream before the rest is read. Yields an Incoming; unless the
+    caller commits it, the temp file is removed on exit.
+    """
+    tmp_dir = os.path.join(root, 'blobs')
+    os.makedirs(tmp_dir, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=tmp_dir, prefix='.tmp-')
+    incoming = Incoming(root, tmp)
+    try:
+        sha = hashlib.sha256()
+        with os.fdopen(fd, 'wb') as f:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                if not incoming.size:
+                    incoming.head = chunk
+                    if check_head:
+                        check_head(chunk)
+                incoming.size += len(chunk)
+                if incoming.size > max_size:
+                    raise TooLarge(f'more than {max_size} bytes')
+                sha.update(chunk)
+                f.write(chunk)
+        incoming.digest = sha.hexdigest()
+        yield incoming
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def exists(root, digest):
+    return os.path.isfile(blob_path(root, digest))
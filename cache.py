@@ -0,0 +1,176 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+
+_MISSING = object()
+
+
+class MemoryBackend:
+    """Per-process LRU store of (value, expires_at) pairs."""
+    name = 'memory'
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, now):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISSING
+            value, expires_at = entry
+            if expires_at <= now:
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires_at):
+        # Returns the number of entries evicted to make room
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            evicted = 0
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                evicted += 1
+            return evicted
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                del self._data[key]
+
+    def size(self):
+        return len(self._data)
+
+
+class SQLiteBackend:
+    """LRU store in a local SQLite file so several workers share entries."""
+    name = 'sqlite'
+
+    def __init__(self, path, max_entries=1024):
+        self.path = path
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache_entries ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                'expires_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_cache_entries_accessed ON cache_entries (accessed_at)')
+
+    def _connect(self):
+        # Callers commit with ``with conn`` and close with closing(): the
+        # connection's own context manager leaves it open
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get(self, key, now):
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute(
+                'SELECT value, expires_at FROM cache_entries WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return _MISSING
+            if row[1] <= now:
+                conn.execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+                return _MISSING
+            conn.execute('UPDATE cache_entries SET accessed_at = ? WHERE key = ?', (now, key))
+            return json.loads(row[0])
+
+    def set(self, key, value, expires_at):
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO cache_entries (key, value, expires_at, accessed_at) '
+                'VALUES (?, ?, ?, ?)',
+                (key, json.dumps(value), expires_at, now)
+            )
+            cur = conn.execute(
+                'DELETE FROM cache_entries WHERE key IN ('
+                'SELECT key FROM cache_entries ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            )
+            return cur.rowcount
+
+    def delete_prefix(self, prefix):
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "DELETE FROM cache_entries WHERE substr(key, 1, ?) = ?",
+                (len(prefix), prefix)
+            )
+
+    def size(self):
+        with closing(self._connect()) as conn, conn:
+            return conn.execute('SELECT COUNT(*) FROM cache_entries').fetchone()[0]
+
+
+class Cache:
+    """TTL + LRU cache for values that are identical for every caller.
+
+    Keys are tuples such as (endpoint, range, day); the first element is the
+    namespace that invalidate() works on. Values must be JSON-serialisable so
+    that any backend can store them.
+    """
+
+    def __init__(self, backend=None, ttl=60):
+        self.backend = backend or MemoryBackend()
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def init_app(self, app):
+        config = app.config
+        size = config.get('ANALYTICS_CACHE_SIZE', 256)
+        if config.get('ANALYTICS_CACHE_BACKEND', 'memory') == 'sqlite':
+            path = config.get('ANALYTICS_CACHE_PATH') or os.path.join(app.instance_path, 'analytics_cache.sqlite3')
+            self.backend = SQLiteBackend(path, size)
+        else:
+            self.backend = MemoryBackend(size)
+        self.ttl = config.get('ANALYTICS_CACHE_TTL', 60)
+
+    @staticmethod
+    def make_key(parts):
+        return '|'.join(str(p) for p in parts)
+
+    def get_or_set(self, parts, compute):
+        key = self.make_key(parts)
+        now = time.time()
+        value = self.backend.get(key, now)
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = compute()
+        self.evictions += self.backend.set(key, value, now + self.ttl)
+        return value
+
+    def invalidate(self, namespace=''):
+        # Empty namespace drops everything
+        self.invalidations += 1
+        self.backend.delete_prefix(self.make_key([namespace]) + '|' if namespace else '')
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'backend': self.backend.name,
+            'size': self.backend.size(),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations
+        }
+
+
+# Shared cache for cross-user analytics (trend average, category averages, leaderboard)
+analytics_cache = Cache()
@@ -0,0 +1,31 @@
+// fetch_cache.js
+// Conditional GET for JSON endpoints that send an ETag: the last ETag and
+// body of each URL are kept in sessionStorage, sent back as If-None-Match,
+// and the stored body is reused when the server answers 304 Not Modified.
+
+function fetchJSON(url) {
+    const key = `etag:${url}`;
+    let cached = null;
+    try {
+        cached = JSON.parse(sessionStorage.getItem(key));
+    } catch (e) {
+        cached = null;
+    }
+    const headers = cached ? { 'If-None-Match': cached.etag } : {};
+    // no-store: revalidate here rather than inside the browser's HTTP cache
+    return fetch(url, { headers, cache: 'no-store' }).then(res => {
+        if (res.status === 304 && cached) return cached.body;
+        return res.json().then(body => {
+            const etag = res.headers.get('ETag');
+            if (res.ok && etag) {
+                try {
+                    sessionStorage.setItem(key, JSON.stringify({ etag, body }));
+                } catch (e) {
+                    // Storage full or disabled: just skip caching
+                }
+            }
+            if (!res.ok && !body.error) throw new Error(`Request failed: ${res.status}`);
+            return body;
+        });
+    });
+}
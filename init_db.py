@@ -16,6 +16,11 @@ from models import (
     Post
 )
 from werkzeug.security import generate_password_hash
+from stats import rebuild_daily_stats
+from social.counters import repair_post_counters
+from social.search import rebuild_search_index
+from social.timeline import rebuild_timelines
+from social.trending import rebuild_trending
 from datetime import datetime, date, timedelta
 import os
 import random
@@ -171,6 +176,11 @@ def init_db():
     db.session.commit()
 
     db.session.commit()
+    rebuild_daily_stats()
+    repair_post_counters()
+    rebuild_search_index()
+    rebuild_timelines()
+    rebuild_trending()
     print("Database initialized with mock data.")
 
 if __name__ == '__main__':
@@ -129,21 +129,13 @@ function loadRecord() {
     // Read current time range and selected user
     const range = $('#record-range-select').val();
     const userId = $('#user-select').val();
-    // Fetch all record data endpoints with both parameters
-    fetchMetrics(range, userId);
-    fetchTrend(range, userId);
-    fetchAeroAnaerobic(range, userId);
-    fetchCategoryComparison(range, userId);
-    fetchLeaderboard(range);
-}
-
-// Fetch and display metrics (streak, calories, hours, percentile)
-function fetchMetrics(range, userId) {
-    $.getJSON(`/api/record/metrics?range=${range}&user_id=${userId}`, function(data) {
-        $('#streak-count').text(data.current_streak);
-        $('#total-calories').text(data.total_calories);
-        $('#total-hours').text(data.total_hours);
-        $('#percentile').text(data.percentile + '%');
+    // One request returns every record payload for the selected range
+    $.getJSON(`/api/record/dashboard?range=${range}&user_id=${userId}`, function(data) {
+        renderMetrics(data.metrics);
+        renderTrend(data.trend);
+        renderAeroAnaerobic(data.aeroAnaerobic);
+        renderCategoryComparison(data.categoryComparison);
+        renderLeaderboard(data.leaderboard);
     }).fail(function(xhr) {
         if (xhr.status === 401) {
             alert('Please login first');
@@ -152,45 +144,47 @@ function fetchMetrics(range, userId) {
     });
 }
 
-// Fetch and update line chart
-function fetchTrend(range, userId) {
-    $.getJSON(`/api/record/trend?range=${range}&user_id=${userId}`, function(data) {
-        lineChart.data.labels = data.labels;
-        lineChart.data.datasets[0].data = data.you;
-        lineChart.data.datasets[1].data = data.average;
-        lineChart.update();
-    });
+// Display metrics (streak, calories, hours, percentile)
+function renderMetrics(data) {
+    $('#streak-count').text(data.current_streak);
+    $('#total-calories').text(data.total_calories);
+    $('#total-hours').text(data.total_hours);
+    $('#percentile').text(data.percentile + '%');
 }
 
-// Fetch and update pie chart
-function fetchAeroAnaerobic(range, userId) {
-    $.getJSON(`/api/record/aeroAnaerobic?range=${range}&user_id=${userId}`, function(data) {
-        pieChart.data.datasets[0].data = [data.aerobic, data.anaerobic];
-        pieChart.update();
-    });
+// Update line chart
+function renderTrend(data) {
+    lineChart.data.labels = data.labels;
+    lineChart.data.datasets[0].data = data.you;
+    lineChart.data.datasets[1].data = data.average;
+    lineChart.update();
 }
 
-// Fetch and update radar chart
-function fetchCategoryComparison(range, userId) {
-    $.getJSON(`/api/record/categoryComparison?range=${range}&user_id=${userId}`, function(data) {
-        radarChart.data.labels = data.categories;
-        radarChart.data.datasets[0].data = data.you;
-        radarChart.data.datasets[1].data = data.average;
-        radarChart.update();
-    });
+// Update pie chart
+function renderAeroAnaerobic(data) {
+    pieChart.data.datasets[0].data = [data.aerobic, data.anaerobic];
+    pieChart.update();
 }
 
-// Fetch and render leaderboard table (no user param needed)
-function fetchLeaderboard(range) {
-    $.getJSON(`/api/record/leaderboard?range=${range}`, function(list) {
-        const tbody = $('#leaderboard-table tbody').empty();
-        list.forEach(item => {
-            tbody.append(
-                `<tr><td>${item.rank}</td><td>${item.username}</td>` +
-                `<td>${item.total_calories}</td><td>${item.total_hours}</td></tr>`
-            );
-        });
+// Update radar chart
+function renderCategoryComparison(data) {
+    radarChart.data.labels = data.categories;
+    radarChart.data.datasets[0].data = data.you;
+    radarChart.data.datasets[1].data = data.average;
+    radarChart.update();
+}
+
+// Render leaderboard table
+function renderLeaderboard(data) {
+    const tbody = $('#leaderboard-table tbody').empty();
+    data.leaderboard.forEach(item => {
+        tbody.append(
+            `<tr><td>${item.rank}</td><td>${item.username}</td>` +
+            `<td>${item.total_calories}</td><td>${item.total_hours}</td></tr>`
+        );
     });
+    const you = data.your_rank;
+    $('#your-rank').text(you ? `Your rank: #${you.rank} (${you.total_calories} Cal, ${you.total_hours} H)` : '');
 }
 
 // Fetch and render post of main account page
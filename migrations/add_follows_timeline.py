@@ -0,0 +1,57 @@
+"""Add follows and timeline_entries
+
+Revision ID: add_follows_timeline
+Revises: add_post_search
+Create Date: 2026-10-18 20:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = 'add_follows_timeline'
+down_revision = 'add_post_search'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table('follows',
+        sa.Column('follower_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('followee_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('created_at', sa.DateTime()),
+        sa.PrimaryKeyConstraint('follower_id', 'followee_id')
+    )
+    op.create_index('ix_follows_followee_id', 'follows', ['followee_id'])
+
+    op.create_table('timeline_entries',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('post_id', sa.Integer(), sa.ForeignKey('posts.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('author_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('user_id', 'post_id')
+    )
+    op.create_index('ix_timeline_entries_user_created', 'timeline_entries', ['user_id', 'created_at', 'post_id'])
+
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.add_column(sa.Column('follower_count', sa.Integer(), nullable=False, server_default='0'))
+    with op.batch_alter_table('posts') as batch_op:
+        batch_op.add_column(sa.Column('fanned_out', sa.Boolean(), nullable=False, server_default='1'))
+    op.create_index('ix_posts_fanout_pending', 'posts', ['user_id', 'created_at', 'id'],
+                    sqlite_where=sa.text('fanned_out = 0'))
+
+    # Nobody follows anyone yet: every timeline starts with the user's own posts
+    op.execute(
+        'INSERT INTO timeline_entries (user_id, post_id, author_id, created_at) '
+        'SELECT user_id, id, user_id, created_at FROM posts'
+    )
+
+def downgrade():
+    op.drop_index('ix_posts_fanout_pending', table_name='posts')
+    with op.batch_alter_table('posts') as batch_op:
+        batch_op.drop_column('fanned_out')
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('follower_count')
+    op.drop_index('ix_timeline_entries_user_created', table_name='timeline_entries')
+    op.drop_table('timeline_entries')
+    op.drop_index('ix_follows_followee_id', table_name='follows')
+    op.drop_table('follows')
@@ -0,0 +1,38 @@
+"""Add denormalized engagement counters to posts
+
+Revision ID: add_post_counters
+Revises: add_user_streaks
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = 'add_post_counters'
+down_revision = 'add_user_streaks'
+branch_labels = None
+depends_on = None
+
+COUNTERS = [
+    ('like_count', 'likes'),
+    ('bookmark_count', 'bookmarks'),
+    ('comment_count', 'comments'),
+]
+
+def upgrade():
+    with op.batch_alter_table('posts') as batch_op:
+        for column, _ in COUNTERS:
+            batch_op.add_column(sa.Column(column, sa.Integer(), nullable=False, server_default='0'))
+
+    # Backfill from the child tables
+    for column, table in COUNTERS:
+        op.execute(
+            f"UPDATE posts SET {column} = "
+            f"(SELECT COUNT(*) FROM {table} WHERE {table}.post_id = posts.id)"
+        )
+
+def downgrade():
+    with op.batch_alter_table('posts') as batch_op:
+        for column, _ in COUNTERS:
+            batch_op.drop_column(column)
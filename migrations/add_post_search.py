@@ -0,0 +1,50 @@
+"""Add post_search full-text index
+
+Revision ID: add_post_search
+Revises: add_resource_versions
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers
+revision = 'add_post_search'
+down_revision = 'add_resource_versions'
+branch_labels = None
+depends_on = None
+
+# Mirrors social/search.py: rowid = id * 2 for posts, id * 2 + 1 for comments
+TRIGGERS = {
+    'posts_search_insert': "AFTER INSERT ON posts BEGIN "
+        "INSERT INTO post_search (rowid, body, post_id) VALUES (new.id * 2, new.content, new.id); END",
+    'posts_search_update': "AFTER UPDATE OF content ON posts BEGIN "
+        "UPDATE post_search SET body = new.content WHERE rowid = new.id * 2; END",
+    'posts_search_delete': "AFTER DELETE ON posts BEGIN "
+        "DELETE FROM post_search WHERE rowid = old.id * 2; END",
+    'comments_search_insert': "AFTER INSERT ON comments BEGIN "
+        "INSERT INTO post_search (rowid, body, post_id) VALUES (new.id * 2 + 1, new.content, new.post_id); END",
+    'comments_search_update': "AFTER UPDATE OF content, post_id ON comments BEGIN "
+        "UPDATE post_search SET body = new.content, post_id = new.post_id WHERE rowid = new.id * 2 + 1; END",
+    'comments_search_delete': "AFTER DELETE ON comments BEGIN "
+        "DELETE FROM post_search WHERE rowid = old.id * 2 + 1; END",
+}
+
+def upgrade():
+    op.execute(
+        "CREATE VIRTUAL TABLE post_search USING fts5("
+        "body, post_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    for name, body in TRIGGERS.items():
+        op.execute(f'CREATE TRIGGER {name} {body}')
+
+    # Backfill existing rows
+    op.execute('INSERT INTO post_search (rowid, body, post_id) SELECT id * 2, content, id FROM posts')
+    op.execute(
+        'INSERT INTO post_search (rowid, body, post_id) '
+        'SELECT id * 2 + 1, content, post_id FROM comments'
+    )
+
+def downgrade():
+    for name in TRIGGERS:
+        op.execute(f'DROP TRIGGER IF EXISTS {name}')
+    op.execute('DROP TABLE IF EXISTS post_search')
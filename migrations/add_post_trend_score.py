@@ -0,0 +1,26 @@
+"""Add posts.trend_score
+
+Revision ID: add_post_trend_score
+Revises: add_follows_timeline
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = 'add_post_trend_score'
+down_revision = 'add_follows_timeline'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.batch_alter_table('posts') as batch_op:
+        batch_op.add_column(sa.Column('trend_score', sa.Float(), nullable=False, server_default='0'))
+    op.create_index('ix_posts_trend_score', 'posts', ['trend_score', 'id'])
+    # Scores are backfilled by `flask --app app social rebuild-trending`
+
+def downgrade():
+    op.drop_index('ix_posts_trend_score', table_name='posts')
+    with op.batch_alter_table('posts') as batch_op:
+        batch_op.drop_column('trend_score')
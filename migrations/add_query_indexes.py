@@ -0,0 +1,32 @@
+"""Add indexes for hot query paths
+
+Revision ID: add_query_indexes
+Revises: add_user_daily_stats
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers
+revision = 'add_query_indexes'
+down_revision = 'add_user_daily_stats'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_workout_records_user_date', 'workout_records', ['user_id', 'date']),
+    ('ix_workout_records_category_date', 'workout_records', ['category_id', 'date']),
+    ('ix_workout_plans_user_start', 'workout_plans', ['user_id', 'start_time']),
+    ('ix_posts_created_at', 'posts', ['created_at', 'id']),
+    ('ix_comments_post_id', 'comments', ['post_id']),
+    ('ix_likes_post_id', 'likes', ['post_id']),
+    ('ix_bookmarks_post_id', 'bookmarks', ['post_id']),
+]
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,27 @@
+"""Add resource_versions
+
+Revision ID: add_resource_versions
+Revises: add_post_counters
+Create Date: 2026-10-18 19:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = 'add_resource_versions'
+down_revision = 'add_post_counters'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table('resource_versions',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+    # No backfill: a missing row reads as version 0, and ETags also include
+    # MAX(id)/COUNT(*) of the underlying rows.
+
+def downgrade():
+    op.drop_table('resource_versions')
@@ -0,0 +1,34 @@
+"""Add settings and move the trending epoch out of resource_versions
+
+Revision ID: add_settings
+Revises: widen_password_hash
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = 'add_settings'
+down_revision = 'widen_password_hash'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table('settings',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('value', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+    op.execute(
+        "INSERT INTO settings (name, value) "
+        "SELECT name, version FROM resource_versions WHERE name = 'trending_epoch'"
+    )
+    op.execute("DELETE FROM resource_versions WHERE name = 'trending_epoch'")
+
+def downgrade():
+    op.execute(
+        "INSERT INTO resource_versions (name, version) "
+        "SELECT name, value FROM settings WHERE name = 'trending_epoch'"
+    )
+    op.drop_table('settings')
@@ -0,0 +1,40 @@
+"""Add user_daily_stats rollup
+
+Revision ID: add_user_daily_stats
+Revises: initial_migration
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = 'add_user_daily_stats'
+down_revision = 'initial_migration'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table('user_daily_stats',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('category_id', sa.Integer(), sa.ForeignKey('sports_categories.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('total_minutes', sa.Integer(), nullable=False),
+        sa.Column('total_calories', sa.Float(), nullable=False),
+        sa.Column('difficulty_sum', sa.Integer(), nullable=False),
+        sa.Column('difficulty_count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('user_id', 'date', 'category_id')
+    )
+    op.create_index('ix_user_daily_stats_date', 'user_daily_stats', ['date'])
+
+    # Backfill from existing workout records
+    op.execute(
+        "INSERT INTO user_daily_stats "
+        "(user_id, date, category_id, total_minutes, total_calories, difficulty_sum, difficulty_count) "
+        "SELECT user_id, date, category_id, SUM(duration_min), SUM(COALESCE(calories_burn, 0)), "
+        "SUM(difficulty), COUNT(id) FROM workout_records GROUP BY user_id, date, category_id"
+    )
+
+def downgrade():
+    op.drop_index('ix_user_daily_stats_date', table_name='user_daily_stats')
+    op.drop_table('user_daily_stats')
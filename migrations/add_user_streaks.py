@@ -0,0 +1,29 @@
+"""Add user_streaks
+
+Revision ID: add_user_streaks
+Revises: add_query_indexes
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = 'add_user_streaks'
+down_revision = 'add_query_indexes'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table('user_streaks',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('current_run', sa.Integer(), nullable=False),
+        sa.Column('run_end', sa.Date()),
+        sa.Column('longest_run', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+    # Streaks are backfilled by `flask --app app record rebuild-stats`; until
+    # then they are computed on read and filled in on the user's next workout.
+
+def downgrade():
+    op.drop_table('user_streaks')
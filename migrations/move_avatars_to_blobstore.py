@@ -0,0 +1,59 @@
+"""Move avatars from users.avatar into the blob store
+
+Revision ID: move_avatars_to_blobstore
+Revises: add_post_trend_score
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+import mimetypes
+import os
+from alembic import op
+import sqlalchemy as sa
+import blobstore
+
+# revision identifiers
+revision = 'move_avatars_to_blobstore'
+down_revision = 'add_post_trend_score'
+branch_labels = None
+depends_on = None
+
+# Same default as app.config['UPLOAD_FOLDER']
+UPLOAD_FOLDER = os.environ.get(
+    'UPLOAD_FOLDER', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'uploads')
+)
+
+def upgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.add_column(sa.Column('avatar_hash', sa.String(64), nullable=True))
+
+    conn = op.get_bind()
+    # One blob in memory at a time
+    ids = conn.execute(sa.text('SELECT id FROM users WHERE avatar IS NOT NULL')).scalars().all()
+    for user_id in ids:
+        kind, data, mimetype = conn.execute(sa.text(
+            'SELECT typeof(avatar), avatar, avatar_mimetype FROM users WHERE id = :id'
+        ), {'id': user_id}).one()
+        if kind == 'text':
+            # Older form uploads stored a filename under UPLOAD_FOLDER instead of the bytes
+            path = os.path.join(UPLOAD_FOLDER, os.path.basename(data))
+            mimetype = mimetypes.guess_type(path)[0]
+            data = None
+            if os.path.isfile(path) and os.path.basename(path) != 'default.jpg':
+                with open(path, 'rb') as f:
+                    data = f.read()
+        digest = blobstore.store(UPLOAD_FOLDER, data) if data else None
+        conn.execute(sa.text(
+            'UPDATE users SET avatar_hash = :digest, avatar_mimetype = :mimetype, avatar = NULL WHERE id = :id'
+        ), {'digest': digest, 'mimetype': mimetype if digest else None, 'id': user_id})
+
+def downgrade():
+    conn = op.get_bind()
+    rows = conn.execute(sa.text('SELECT id, avatar_hash FROM users WHERE avatar_hash IS NOT NULL')).all()
+    for user_id, digest in rows:
+        path = blobstore.blob_path(UPLOAD_FOLDER, digest)
+        if os.path.isfile(path):
+            with open(path, 'rb') as f:
+                conn.execute(sa.text('UPDATE users SET avatar = :data WHERE id = :id'),
+                             {'data': f.read(), 'id': user_id})
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('avatar_hash')
@@ -0,0 +1,24 @@
+"""Widen users.password_hash for longer hash methods
+
+Revision ID: widen_password_hash
+Revises: move_avatars_to_blobstore
+Create Date: 2026-10-18 23:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = 'widen_password_hash'
+down_revision = 'move_avatars_to_blobstore'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # scrypt and pbkdf2:sha512 hashes run past 160 characters
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.alter_column('password_hash', type_=sa.String(255), existing_nullable=False)
+
+def downgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.alter_column('password_hash', type_=sa.String(128), existing_nullable=False)
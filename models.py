@@ -14,18 +14,26 @@ class WorkoutPlan(db.Model):
 
     user = db.relationship('User', backref='plans')
 
+    __table_args__ = (
+        db.Index('ix_workout_plans_user_start', 'user_id', 'start_time'),
+    )
+
 class User(db.Model):
     __tablename__ = 'users'
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(128), nullable=False)
+    password_hash = db.Column(db.String(255), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     nickname = db.Column(db.String(80), default='Not set')
     address = db.Column(db.String(200), default='Not set')
-    avatar = db.Column(db.LargeBinary)
+    # Legacy inline avatar bytes; new uploads live in blobstore under avatar_hash
+    avatar = db.deferred(db.Column(db.LargeBinary))
+    avatar_hash = db.Column(db.String(64))
     avatar_mimetype  = db.Column(db.String(50))
     coins = db.Column(db.Integer, default=0)
+    # Denormalized by social/timeline.py; decides fan-out on write vs on read
+    follower_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     records = db.relationship('WorkoutRecord', back_populates='user', cascade='all, delete-orphan')
     comments = db.relationship('Comment', back_populates='user', cascade='all, delete-orphan')
@@ -52,6 +60,46 @@ class WorkoutRecord(db.Model):
     user = db.relationship('User', back_populates='records')
     category = db.relationship('SportsCategory', back_populates='records')
 
+    __table_args__ = (
+        db.Index('ix_workout_records_user_date', 'user_id', 'date'),
+        db.Index('ix_workout_records_category_date', 'category_id', 'date'),
+    )
+
+class UserDailyStats(db.Model):
+    # Per-user, per-day, per-category rollup of workout_records, kept in sync by stats.py
+    __tablename__ = 'user_daily_stats'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    category_id = db.Column(db.Integer, db.ForeignKey('sports_categories.id', ondelete='CASCADE'), primary_key=True)
+    total_minutes = db.Column(db.Integer, nullable=False, default=0)
+    total_calories = db.Column(db.Float, nullable=False, default=0)
+    difficulty_sum = db.Column(db.Integer, nullable=False, default=0)
+    difficulty_count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_user_daily_stats_date', 'date'),
+    )
+
+class UserStreak(db.Model):
+    # Consecutive-day workout streaks, maintained by stats.py on every record write
+    __tablename__ = 'user_streaks'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    current_run = db.Column(db.Integer, nullable=False, default=0)
+    run_end = db.Column(db.Date)
+    longest_run = db.Column(db.Integer, nullable=False, default=0)
+
+class ResourceVersion(db.Model):
+    # Write counters behind the ETags of cacheable GET endpoints, bumped by versions.py
+    __tablename__ = 'resource_versions'
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class Setting(db.Model):
+    # Small integer app state kept apart from the ETag counters, e.g. the trending epoch
+    __tablename__ = 'settings'
+    name = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.Integer, nullable=False)
+
 class FavoriteCollection(db.Model):
     __tablename__ = 'favorite_collections'
     id = db.Column(db.Integer, primary_key=True)
@@ -81,6 +129,10 @@ class Comment(db.Model):
     user = db.relationship('User', back_populates='comments')
     # post = db.relationship('Post', back_populates='comments')  # 可选
 
+    __table_args__ = (
+        db.Index('ix_comments_post_id', 'post_id'),
+    )
+
 class Like(db.Model):
     __tablename__ = 'likes'
     user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
@@ -89,6 +141,10 @@ class Like(db.Model):
     user = db.relationship('User', back_populates='likes')
     # post = db.relationship('Post', back_populates='likes')  # 可选
 
+    __table_args__ = (
+        db.Index('ix_likes_post_id', 'post_id'),
+    )
+
 class Bookmark(db.Model):
     __tablename__ = 'bookmarks'
     user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
@@ -97,15 +153,59 @@ class Bookmark(db.Model):
     user = db.relationship('User', back_populates='bookmarks')
     # post = db.relationship('Post', back_populates='bookmarks')  # 可选
 
+    __table_args__ = (
+        db.Index('ix_bookmarks_post_id', 'post_id'),
+    )
+
 class Post(db.Model):
     __tablename__ = 'posts'
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    # Denormalized engagement counts, kept in step by social/counters.py
+    like_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    bookmark_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # False when the author had too many followers to copy the post into
+    # their timelines; such posts are merged into timelines on read
+    fanned_out = db.Column(db.Boolean, nullable=False, default=True, server_default='1')
+    # Time-decayed engagement score relative to social/trending.py's epoch
+    trend_score = db.Column(db.Float, nullable=False, default=0, server_default='0')
 
     user = db.relationship('User', backref='posts')
     comments = db.relationship('Comment', backref='post', cascade='all, delete-orphan', foreign_keys='Comment.post_id')
     likes = db.relationship('Like', backref='post', cascade='all, delete-orphan', foreign_keys='Like.post_id')
     bookmarks = db.relationship('Bookmark', backref='post', cascade='all, delete-orphan', foreign_keys='Bookmark.post_id')
 
+    __table_args__ = (
+        db.Index('ix_posts_created_at', 'created_at', 'id'),
+        db.Index('ix_posts_trend_score', 'trend_score', 'id'),
+        # Only the (few) posts left for fan-out on read
+        db.Index('ix_posts_fanout_pending', 'user_id', 'created_at', 'id',
+                 sqlite_where=db.text('fanned_out = 0')),
+    )
+
+class Follow(db.Model):
+    __tablename__ = 'follows'
+    follower_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    followee_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_follows_followee_id', 'followee_id'),
+    )
+
+class TimelineEntry(db.Model):
+    # Precomputed home timelines: one row per (reader, post), written on fan-out
+    __tablename__ = 'timeline_entries'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('posts.id', ondelete='CASCADE'), primary_key=True)
+    author_id = db.Column(db.Integer, nullable=False)
+    # Copy of posts.created_at so a slice is read from this table's index alone
+    created_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_timeline_entries_user_created', 'user_id', 'created_at', 'post_id'),
+    )
+
@@ -6,8 +6,7 @@ document.addEventListener('DOMContentLoaded', function() {
 });
 
 function loadBookmarkedPosts() {
-    fetch('/api/posts/bookmarked')
-        .then(res => res.json())
+    fetchJSON('/api/posts/bookmarked')
         .then(posts => {
             if (posts.error) {
                 document.getElementById('post-list').innerHTML = '<p>请先登录。</p>';
@@ -37,7 +36,7 @@ function renderPosts(posts) {
             <div class="post-content">${post.content}</div>
             <div class="post-actions" style="display: flex; gap: 20px; font-size: 18px;">
                 <span>❤️ ${post.likes}</span>
-                <span>💬 ${post.comments.length}</span>
+                <span>💬 ${post.comment_count}</span>
                 <span>🔖 ${post.bookmarks}</span>
             </div>
             <div class="post-comments" style="border-top: 1px solid #eee; padding-top: 10px;">
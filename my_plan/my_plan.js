@@ -9,8 +9,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
 // Load and display existing plans from the server
 function loadPlans() {
-    fetch('/api/my_plan')
-        .then(res => res.json())
+    fetchJSON('/api/my_plan')
         .then(plans => {
             const list = document.getElementById('plan-list');
             list.innerHTML = '';
@@ -31,8 +30,7 @@ function loadPlans() {
 
 // Load available activity categories from the server
 function loadCategories() {
-    fetch('/api/sport_categories')
-        .then(res => res.json())
+    fetchJSON('/api/sport_categories')
         .then(categories => {
             const sel = document.getElementById('activity');
             sel.innerHTML = '';
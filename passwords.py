@@ -0,0 +1,67 @@
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# Werkzeug 2.3's own default, so existing hashes already match the policy
+DEFAULT_METHOD = 'pbkdf2:sha256'
+DEFAULT_ITERATIONS = 600_000
+# Cost used when PASSWORD_HASH_ITERATIONS is not set: PBKDF2 iterations
+# (OWASP 2023 figures), or the scrypt cost N
+DEFAULT_COSTS = {
+    'pbkdf2:sha256': DEFAULT_ITERATIONS,
+    'pbkdf2:sha512': 210_000,
+    'scrypt': 2 ** 15,
+}
+
+
+def method_string(method, iterations=None):
+    """Werkzeug method string for a policy, e.g. 'pbkdf2:sha256:600000'.
+
+    For 'scrypt' the iterations are the cost parameter N (a power of two).
+    Raises ValueError for an unknown method or an unusable cost.
+    """
+    if method not in DEFAULT_COSTS:
+        raise ValueError(f'unsupported password hash method {method!r}')
+    if iterations is None:
+        iterations = DEFAULT_COSTS[method]
+    if not isinstance(iterations, int) or iterations < 2:
+        raise ValueError(f'password hash cost must be an integer above 1, got {iterations!r}')
+    if method == 'scrypt':
+        if iterations & (iterations - 1):
+            raise ValueError(f'scrypt cost N must be a power of two, got {iterations}')
+        return f'scrypt:{iterations}:8:1'
+    return f'{method}:{iterations}'
+
+
+def init_app(app):
+    # Fail at startup rather than on every signup and login
+    method_string(app.config.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD),
+                  app.config.get('PASSWORD_HASH_ITERATIONS'))
+
+
+def current_method():
+    config = current_app.config
+    return method_string(
+        config.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD),
+        config.get('PASSWORD_HASH_ITERATIONS')
+    )
+
+
+def hash_password(password):
+    return generate_password_hash(password, method=current_method())
+
+
+def needs_rehash(password_hash):
+    # Werkzeug prefixes every hash with the full method string it used
+    return password_hash.partition('$')[0] != current_method()
+
+
+def check_password(user, password):
+    """Verify ``password`` for ``user``, upgrading a hash made under an old policy.
+
+    A rehash only changes ``user.password_hash``; the caller commits.
+    """
+    if not check_password_hash(user.password_hash, password):
+        return False
+    if needs_rehash(user.password_hash):
+        user.password_hash = hash_password(password)
+    return True
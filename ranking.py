@@ -0,0 +1,145 @@
+from sqlalchemy import and_, case, func, or_, select
+from models import db, User, UserDailyStats
+
+# Metrics a caller can be ranked on, computed per user from the rollup
+METRICS = ('hours', 'calories', 'difficulty')
+
+
+def _user_totals(start, end):
+    # Per-user window totals for every rankable metric
+    return (
+        select(
+            UserDailyStats.user_id.label('user_id'),
+            (func.sum(UserDailyStats.total_minutes) / 60.0).label('hours'),
+            func.sum(UserDailyStats.total_calories).label('calories'),
+            (func.sum(UserDailyStats.difficulty_sum) * 1.0
+             / func.nullif(func.sum(UserDailyStats.difficulty_count), 0)).label('difficulty')
+        )
+        .where(UserDailyStats.date >= start, UserDailyStats.date <= end)
+        .group_by(UserDailyStats.user_id)
+        .cte('user_totals')
+    )
+
+
+def percentiles(user_id, start, end):
+    """Percentile of ``user_id`` among all users for each metric in METRICS.
+
+    Users without records in the window count as 0. The percentile is the
+    share of other users strictly below the caller, so tied users always get
+    the same (lowest) percentile regardless of row order.
+    """
+    totals = _user_totals(start, end)
+    values = {
+        metric: func.coalesce(getattr(totals.c, metric), 0)
+        for metric in METRICS
+    }
+    mine = {
+        metric: func.coalesce(
+            select(getattr(totals.c, metric))
+            .where(totals.c.user_id == user_id)
+            .scalar_subquery(),
+            0
+        )
+        for metric in METRICS
+    }
+    row = db.session.execute(
+        select(
+            func.count(User.id),
+            *[func.sum(case((values[m] < mine[m], 1), else_=0)) for m in METRICS]
+        )
+        .select_from(User)
+        .outerjoin(totals, totals.c.user_id == User.id)
+    ).one()
+
+    n = row[0]
+    result = {}
+    for metric, below in zip(METRICS, row[1:]):
+        result[metric] = int((below or 0) / (n - 1) * 100) if n > 1 else 100
+    return result
+
+
+def _calorie_totals(start, end, category_id=None):
+    # Per-user window calories/minutes, optionally for one category
+    query = (
+        select(
+            UserDailyStats.user_id.label('user_id'),
+            func.sum(UserDailyStats.total_calories).label('calories'),
+            func.sum(UserDailyStats.total_minutes).label('minutes')
+        )
+        .where(UserDailyStats.date >= start, UserDailyStats.date <= end)
+    )
+    if category_id is not None:
+        query = query.where(UserDailyStats.category_id == category_id)
+    return query.group_by(UserDailyStats.user_id).cte('calorie_totals')
+
+
+def leaderboard(start, end, limit=10, category_id=None):
+    """Top ``limit`` users by calories, ties broken by user id."""
+    totals = _calorie_totals(start, end, category_id)
+    calories = func.coalesce(totals.c.calories, 0)
+    rows = db.session.execute(
+        select(User.username, calories, func.coalesce(totals.c.minutes, 0))
+        .select_from(User)
+        .outerjoin(totals, totals.c.user_id == User.id)
+        .order_by(calories.desc(), User.id)
+        .limit(limit)
+    ).all()
+    return [
+        {
+            'rank': idx + 1,
+            'username': uname,
+            'total_calories': round(cal, 1),
+            'total_hours': round(mins / 60, 2)
+        }
+        for idx, (uname, cal, mins) in enumerate(rows)
+    ]
+
+
+def calorie_rank(user_id, start, end, category_id=None):
+    """Leaderboard position of ``user_id`` using the same ordering as leaderboard().
+
+    Counts the users ahead of the caller from the rollup (GROUP BY ... HAVING
+    total beats the caller's) instead of materializing every user's total and
+    joining it against users. The rollup rows in the window are still
+    aggregated once, but the users table is only touched for a caller with
+    nothing in the window, where everyone without rows ties at 0.
+    """
+    window = [UserDailyStats.date >= start, UserDailyStats.date <= end]
+    if category_id is not None:
+        window.append(UserDailyStats.category_id == category_id)
+    my_cal, my_min = db.session.execute(
+        select(
+            func.coalesce(func.sum(UserDailyStats.total_calories), 0),
+            func.coalesce(func.sum(UserDailyStats.total_minutes), 0)
+        )
+        .where(UserDailyStats.user_id == user_id, *window)
+    ).one()
+
+    total = func.sum(UserDailyStats.total_calories)
+    ahead = (
+        select(UserDailyStats.user_id)
+        .where(*window)
+        .group_by(UserDailyStats.user_id)
+        .having(or_(total > my_cal, and_(total == my_cal, UserDailyStats.user_id < user_id)))
+        .subquery()
+    )
+    rank = db.session.execute(select(func.count()).select_from(ahead)).scalar() + 1
+    if not my_cal:
+        # Lower ids without any rows in the window tie at 0 and come first
+        with_rows = (
+            select(UserDailyStats.user_id)
+            .where(UserDailyStats.user_id < user_id, *window)
+            .distinct()
+            .subquery()
+        )
+        rank += db.session.execute(
+            select(
+                select(func.count(User.id)).where(User.id < user_id).scalar_subquery()
+                - select(func.count()).select_from(with_rows).scalar_subquery()
+            )
+        ).scalar()
+    return {
+        'rank': rank,
+        'total_calories': round(my_cal, 1),
+        'total_hours': round(my_min / 60, 2)
+    }
@@ -0,0 +1,248 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+# Sliding-window counters: each key keeps the count of the current fixed
+# window and of the one before it. The rate at time t is estimated as
+#   previous * (time left in the current window / window) + current
+# which approximates a true sliding window with O(1) state per key.
+
+
+def _slide(state, now, window):
+    """(window_start, current, previous) of ``state`` moved forward to ``now``."""
+    start = now - now % window
+    if state is None:
+        return start, 0, 0
+    state_start, current, previous = state
+    if state_start == start:
+        return start, current, previous
+    if state_start == start - window:
+        return start, 0, current
+    return start, 0, 0
+
+
+def _retry_after(start, current, previous, now, limit, window):
+    # Seconds until one more hit fits under ``limit``
+    if current + 1 > limit:
+        # Not before the next window, where this window's count fades out
+        wait = start + window - now
+        if current:
+            wait += window * max(0.0, 1 - (limit - 1) / current)
+        return wait
+    if previous:
+        return max(0.0, start + window * (1 - (limit - 1 - current) / previous) - now)
+    return 0.0
+
+
+def _admit(states, rules, now):
+    """Check every rule against its slid state.
+
+    Returns (new states, None) when admitted, else (None, seconds to wait).
+    """
+    slid, retry_after = [], None
+    for state, (key, limit, window) in zip(states, rules):
+        start, current, previous = _slide(state, now, window)
+        estimate = previous * (1 - (now - start) / window) + current
+        if estimate + 1 > limit:
+            wait = _retry_after(start, current, previous, now, limit, window)
+            retry_after = max(retry_after or 0.0, wait)
+        slid.append((start, current + 1, previous))
+    if retry_after is not None:
+        return None, retry_after
+    return slid, None
+
+
+def _outcome(scope, retry_after):
+    # Names of the admission counters one acquire() adds to
+    if retry_after is None:
+        return ['allowed']
+    return ['rejected', f'rejected|{scope}']
+
+
+class MemoryBackend:
+    """Window and admission counters in this process only.
+
+    Every worker process keeps its own, so with N workers a key gets up to
+    N times its limit; use SQLiteBackend when running more than one.
+    """
+    name = 'memory'
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._data = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, scope, rules, now):
+        # None when admitted (and counted), else seconds until it would be
+        with self._lock:
+            states = [self._data.get(key) for key, _, _ in rules]
+            slid, retry_after = _admit([s and s[:3] for s in states], rules, now)
+            for name in _outcome(scope, retry_after):
+                self._counters[name] = self._counters.get(name, 0) + 1
+            if slid is None:
+                return retry_after
+            for state, (key, _, window) in zip(slid, rules):
+                self._data[key] = state + (window,)
+            if len(self._data) > self.max_entries:
+                self._prune(now)
+            return None
+
+    def _prune(self, now):
+        # Keys idle for two windows count nothing any more
+        for key in [k for k, (start, _, _, window) in self._data.items() if start + 2 * window <= now]:
+            del self._data[key]
+
+    def reset(self):
+        with self._lock:
+            self._data.clear()
+            self._counters.clear()
+
+    def size(self):
+        return len(self._data)
+
+    def counters(self):
+        with self._lock:
+            return dict(self._counters)
+
+
+class SQLiteBackend:
+    """Window and admission counters in a local SQLite file, shared by every worker on the host."""
+    name = 'sqlite'
+    # Stale keys are deleted on every this-many acquires
+    PRUNE_EVERY = 100
+
+    def __init__(self, path):
+        self.path = path
+        self._acquires = 0
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS rate_limits ('
+                'key TEXT PRIMARY KEY, window_start REAL NOT NULL, '
+                'current INTEGER NOT NULL, previous INTEGER NOT NULL, expires_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_rate_limits_expires ON rate_limits (expires_at)')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS rate_limit_counters ('
+                'name TEXT PRIMARY KEY, value INTEGER NOT NULL)'
+            )
+
+    def _connect(self):
+        # Autocommit mode, so acquire() can open its own IMMEDIATE transaction
+        # and one-off statements need no commit; callers close the connection
+        return sqlite3.connect(self.path, timeout=5, isolation_level=None)
+
+    def acquire(self, scope, rules, now):
+        self._acquires += 1
+        conn = self._connect()
+        try:
+            # Takes the write lock up front: check-then-increment is atomic across workers
+            conn.execute('BEGIN IMMEDIATE')
+            states = []
+            for key, _, _ in rules:
+                states.append(conn.execute(
+                    'SELECT window_start, current, previous FROM rate_limits WHERE key = ?', (key,)
+                ).fetchone())
+            slid, retry_after = _admit(states, rules, now)
+            if slid is not None:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO rate_limits (key, window_start, current, previous, expires_at) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    [(key, start, current, previous, start + 2 * window)
+                     for (start, current, previous), (key, _, window) in zip(slid, rules)]
+                )
+            conn.executemany(
+                'INSERT INTO rate_limit_counters (name, value) VALUES (?, 1) '
+                'ON CONFLICT (name) DO UPDATE SET value = value + 1',
+                [(name,) for name in _outcome(scope, retry_after)]
+            )
+            if self._acquires % self.PRUNE_EVERY == 0:
+                conn.execute('DELETE FROM rate_limits WHERE expires_at <= ?', (now,))
+            conn.execute('COMMIT')
+            return retry_after
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def reset(self):
+        with closing(self._connect()) as conn:
+            conn.execute('DELETE FROM rate_limits')
+            conn.execute('DELETE FROM rate_limit_counters')
+
+    def size(self):
+        with closing(self._connect()) as conn:
+            return conn.execute('SELECT COUNT(*) FROM rate_limits').fetchone()[0]
+
+    def counters(self):
+        with closing(self._connect()) as conn:
+            return dict(conn.execute('SELECT name, value FROM rate_limit_counters'))
+
+
+class RateLimiter:
+    """Admission control for expensive endpoints.
+
+    ``limits`` maps an identity kind (e.g. 'username', 'ip') to
+    (max requests, window seconds). A request is admitted only if every
+    identity it carries is under its limit, and only admitted requests
+    are counted, so a key never does more than the limit's worth of work
+    per window however hard it is flooded. Limits and the admission
+    counters in stats() are as wide as the backend: one process for
+    MemoryBackend, every worker on the host for SQLiteBackend.
+    """
+
+    def __init__(self, backend=None, limits=None):
+        self.backend = backend or MemoryBackend()
+        self.limits = limits or {}
+
+    def init_app(self, app):
+        config = app.config
+        if config.get('AUTH_RATE_LIMIT_BACKEND', 'memory') == 'sqlite':
+            path = config.get('AUTH_RATE_LIMIT_PATH') or os.path.join(app.instance_path, 'rate_limits.sqlite3')
+            self.backend = SQLiteBackend(path)
+        else:
+            self.backend = MemoryBackend()
+        self.limits = dict(config.get('AUTH_RATE_LIMITS', {}))
+
+    def hit(self, scope, now=None, **identities):
+        """Count one ``scope`` request; returns 0 if admitted, else seconds to wait.
+
+        Identities that are None or have no configured limit are ignored.
+        """
+        now = time.time() if now is None else now
+        rules = [
+            (f'{scope}|{kind}|{value}', *self.limits[kind])
+            for kind, value in identities.items()
+            if value is not None and kind in self.limits
+        ]
+        retry_after = self.backend.acquire(scope, rules, now)
+        if retry_after is None:
+            return 0
+        return max(1, math.ceil(retry_after))
+
+    def reset(self):
+        self.backend.reset()
+
+    def stats(self):
+        counters = self.backend.counters()
+        return {
+            'backend': self.backend.name,
+            'keys': self.backend.size(),
+            'allowed': counters.get('allowed', 0),
+            'rejected': counters.get('rejected', 0),
+            'rejected_by': {
+                name.partition('|')[2]: value
+                for name, value in counters.items() if name.startswith('rejected|')
+            }
+        }
+
+
+# Login and password reset: each admitted request costs one password hash
+auth_limiter = RateLimiter()
@@ -1,185 +1,337 @@
+import click
+import numpy as np
 from flask import Blueprint, jsonify, request, session
 from datetime import date, timedelta
-from sqlalchemy import func
-from models import db, User, WorkoutRecord, SportsCategory
+from sqlalchemy import and_, case, func
+from models import db, User, WorkoutRecord, SportsCategory, UserDailyStats
+from stats import rebuild_daily_stats, current_streak
+from ranking import percentiles, leaderboard, calorie_rank
+from cache import analytics_cache
+import timeseries
 
 
 record_bp = Blueprint('record', __name__)
 
+MAX_LEADERBOARD_LIMIT = 50
+
 def get_current_user_id():
     return session.get('user_id')
 
+# Named windows for ?range=; anything unknown falls back to a week
+RANGE_DAYS = {'week': 7, 'month': 30, 'quarter': 90, 'year': 365}
+# Widest window served: per-day series are built for every day in it
+MAX_WINDOW_DAYS = 5 * 366
+
 def parse_range(rng: str):
     today = date.today()
-    if rng == 'month':
-        return today - timedelta(days=30)
-    return today - timedelta(days=7)
+    return today - timedelta(days=RANGE_DAYS.get(rng, 7))
 
-@record_bp.route('/api/record/metrics')
-def record_metrics():
+def _first_record_date():
+    return db.session.query(func.min(UserDailyStats.date)).scalar() or date.today()
+
+def parse_window(args):
+    """Resolve ?range= or ?from=&to= into (cache key, start, end).
+
+    Returns None when the dates are malformed, reversed or more than
+    MAX_WINDOW_DAYS apart. range=all reaches back at most that far.
+    """
+    today = date.today()
+    if args.get('from') or args.get('to'):
+        try:
+            start = date.fromisoformat(args['from']) if args.get('from') else _first_record_date()
+            end = date.fromisoformat(args['to']) if args.get('to') else today
+        except ValueError:
+            return None
+        if start > end or (end - start).days >= MAX_WINDOW_DAYS:
+            return None
+        return f'{start.isoformat()}..{end.isoformat()}', start, end
+    rng = args.get('range', 'week')
+    if rng != 'all' and rng not in RANGE_DAYS:
+        # Normalized so made-up names share the week's cache entries
+        rng = 'week'
+    if rng == 'all':
+        earliest = today - timedelta(days=MAX_WINDOW_DAYS - 1)
+        return rng, max(min(_first_record_date(), today), earliest), today
+    return rng, parse_range(rng), today
+
+def pick_bucket(start, end, requested=None):
+    # Default granularity keeps long windows to a readable number of points
+    if requested:
+        return requested if requested in timeseries.BUCKETS else None
+    span = (end - start).days
+    if span <= 92:
+        return 'day'
+    return 'week' if span <= 731 else 'month'
+
+def load_user_days(user_id, start, end):
+    """The caller's rollup rows in the window: (date, category_id, met_value, minutes, calories).
+
+    Loaded once per request and shared by every per-user payload below.
+    """
+    return (
+        db.session.query(
+            UserDailyStats.date,
+            UserDailyStats.category_id,
+            SportsCategory.met_value,
+            UserDailyStats.total_minutes,
+            UserDailyStats.total_calories
+        )
+        .join(SportsCategory, SportsCategory.id == UserDailyStats.category_id)
+        .filter(
+            UserDailyStats.user_id == user_id,
+            UserDailyStats.date >= start,
+            UserDailyStats.date <= end
+        )
+        .all()
+    )
+
+def metrics_payload(user_id, start, end, rows):
+    # Streaks are kept per user by stats.py, so they are not capped by the window
+    streak, longest = current_streak(user_id)
+
+    total_cal = sum(r.total_calories or 0 for r in rows)
+    total_hrs = sum(r.total_minutes or 0 for r in rows) / 60
+
+    ranks = percentiles(user_id, start, end)
+
+    return {
+        'current_streak': streak,
+        'longest_streak': longest,
+        'total_calories': round(total_cal, 1),
+        'total_hours': round(total_hrs, 1),
+        'percentile': ranks['hours'],
+        'percentiles': ranks
+    }
+
+def _average_daily_hours(start, end):
+    # Zero-filled per-day hours averaged over every user
+    rows = (
+        db.session.query(UserDailyStats.date, func.sum(UserDailyStats.total_minutes))
+        .filter(
+            UserDailyStats.date >= start,
+            UserDailyStats.date <= end
+        )
+        .group_by(UserDailyStats.date)
+        .all()
+    )
+    user_count = db.session.query(func.count(User.id)).scalar() or 0
+    if not user_count:
+        return [0.0] * ((end - start).days + 1)
+    series = timeseries.daily_series(start, end, [d for d, _ in rows], [m for _, m in rows])
+    return (series / 60 / user_count).tolist()
+
+def trend_payload(rng, start, end, rows, bucket='day'):
+    days = timeseries.day_axis(start, end)
+    yours = timeseries.daily_series(
+        start, end, [r.date for r in rows], [r.total_minutes or 0 for r in rows]
+    ) / 60
+    # The average line is the same for every caller, so share it
+    average = np.asarray(shared_for_window('trend_average', rng, lambda: _average_daily_hours(start, end)))
+
+    starts, your_vals, last_idx = timeseries.bucketize(days, yours, bucket)
+    _, avg_vals, _ = timeseries.bucketize(days, average, bucket)
+    # Rolling and cumulative values are read at the last day of each bucket
+    rolling = timeseries.rolling_mean(yours)[last_idx]
+    total = timeseries.cumulative(yours)[last_idx]
+
+    return {
+        'labels': timeseries.labels(starts, bucket),
+        'you': np.round(your_vals, 2).tolist(),
+        'average': np.round(avg_vals, 2).tolist(),
+        'bucket': bucket,
+        'rolling_7d': np.round(rolling, 2).tolist(),
+        'cumulative': np.round(total, 2).tolist()
+    }
+
+def aero_anaerobic_payload(rows):
+    aerobic = sum(r.total_minutes for r in rows if r.met_value is not None and r.met_value >= 6.0)
+    anaerobic = sum(r.total_minutes for r in rows if r.met_value is not None and r.met_value < 6.0)
+    return {
+        'aerobic': round(aerobic / 60, 2),
+        'anaerobic': round(anaerobic / 60, 2)
+    }
+
+def shared_for_window(kind, rng, compute, *extra):
+    """``compute()`` through the analytics cache, for named windows only.
+
+    Custom from/to windows are computed per request: their keys are
+    unbounded, so caching them would fill the cache with one-off entries.
+    """
+    if rng != 'all' and rng not in RANGE_DAYS:
+        return compute()
+    return analytics_cache.get_or_set((kind, rng, date.today().isoformat(), *extra), compute)
+
+def _category_averages(start, end):
+    # Everyone's average difficulty per category: [[name, average], ...] in category order
+    rows = (
+        db.session.query(
+            SportsCategory.name,
+            func.sum(UserDailyStats.difficulty_sum),
+            func.sum(UserDailyStats.difficulty_count)
+        )
+        .outerjoin(UserDailyStats, and_(
+            UserDailyStats.category_id == SportsCategory.id,
+            UserDailyStats.date >= start,
+            UserDailyStats.date <= end
+        ))
+        .group_by(SportsCategory.id)
+        .order_by(SportsCategory.id)
+        .all()
+    )
+    return [[name, _avg(total, count)] for name, total, count in rows]
+
+def _avg(total, count):
+    return round(total / count, 2) if count else 0
+
+def category_comparison(rng, user_id, start, end):
+    """Per-category difficulty (caller vs everyone) plus the caller's minutes and calories.
+
+    The cross-user averages are identical for every caller and go through
+    the analytics cache, keyed by window; the caller's own figures are one
+    GROUP BY over their rollup rows, however many categories exist.
+    """
+    averages = dict(shared_for_window('category_average', rng, lambda: _category_averages(start, end)))
+    rows = (
+        db.session.query(
+            SportsCategory.name,
+            func.sum(UserDailyStats.difficulty_sum),
+            func.sum(UserDailyStats.difficulty_count),
+            func.sum(UserDailyStats.total_minutes),
+            func.sum(UserDailyStats.total_calories)
+        )
+        .outerjoin(UserDailyStats, and_(
+            UserDailyStats.category_id == SportsCategory.id,
+            UserDailyStats.user_id == user_id,
+            UserDailyStats.date >= start,
+            UserDailyStats.date <= end
+        ))
+        .group_by(SportsCategory.id)
+        .order_by(SportsCategory.id)
+        .all()
+    )
+    return {
+        'categories': [name for name, *_ in rows],
+        'you': [_avg(r[1], r[2]) for r in rows],
+        # A category added since the averages were cached averages 0 until the next refresh
+        'average': [averages.get(name, 0) for name, *_ in rows],
+        'minutes': [r[3] or 0 for r in rows],
+        'calories': [round(r[4] or 0, 1) for r in rows]
+    }
+
+def leaderboard_payload(rng, start, end, user_id, limit=10, category_id=None):
+    board = shared_for_window(
+        'leaderboard', rng, lambda: leaderboard(start, end, limit, category_id), limit, category_id
+    )
+    return {
+        'leaderboard': board,
+        'your_rank': calorie_rank(user_id, start, end, category_id) if user_id else None
+    }
+
+@record_bp.route('/api/record/dashboard')
+def record_dashboard():
+    # Everything the Record tab needs for one range change, in one round trip
     user_id = get_current_user_id()
     if not user_id:
         return jsonify({'error': 'Unauthorized'}), 401
-    rng = request.args.get('range', 'week')
-    start = parse_range(rng)
-
-    recs = WorkoutRecord.query.filter(
-        WorkoutRecord.user_id == user_id,
-        WorkoutRecord.date >= start
-    ).all()
-
-    dates_set = {r.date for r in recs}
-    streak = 0
-    d = date.today()
-    while d in dates_set:
-        streak += 1
-        d -= timedelta(days=1)
-
-    total_cal = sum(r.calories_burn or 0 for r in recs)
-    total_hrs = sum(r.duration_min or 0 for r in recs) / 60
-
-    all_users = User.query.all()
-    hours_list = [
-        sum(rec.duration_min for rec in u.records if rec.date >= start) / 60
-        for u in all_users
-    ]
-    your_hours = next((h for uid, h in zip([u.id for u in all_users], hours_list) if uid == user_id), 0)
-    n = len(hours_list)
-    if n > 1:
-        sorted_hours = sorted(hours_list)
-        idx = sorted_hours.index(your_hours)
-        percentile = int(idx / (n - 1) * 100)
-    else:
-        percentile = 100
+    window = parse_window(request.args)
+    if window is None:
+        return jsonify({'error': 'Invalid date range'}), 400
+    rng, start, end = window
+    bucket = pick_bucket(start, end, request.args.get('bucket'))
+    if bucket is None:
+        return jsonify({'error': 'Invalid bucket'}), 400
+    rows = load_user_days(user_id, start, end)
 
     return jsonify({
-        'current_streak': streak,
-        'total_calories': round(total_cal, 1),
-        'total_hours': round(total_hrs, 1),
-        'percentile': percentile
+        'metrics': metrics_payload(user_id, start, end, rows),
+        'trend': trend_payload(rng, start, end, rows, bucket),
+        'aeroAnaerobic': aero_anaerobic_payload(rows),
+        'categoryComparison': category_comparison(rng, user_id, start, end),
+        'leaderboard': leaderboard_payload(rng, start, end, user_id)
     })
 
+@record_bp.route('/api/record/metrics')
+def record_metrics():
+    user_id = get_current_user_id()
+    if not user_id:
+        return jsonify({'error': 'Unauthorized'}), 401
+    window = parse_window(request.args)
+    if window is None:
+        return jsonify({'error': 'Invalid date range'}), 400
+    rng, start, end = window
+    return jsonify(metrics_payload(user_id, start, end, load_user_days(user_id, start, end)))
+
 @record_bp.route('/api/record/trend')
 def record_trend():
     user_id = get_current_user_id()
     if not user_id:
         return jsonify({'error': 'Unauthorized'}), 401
-    rng = request.args.get('range', 'week')
-    start = parse_range(rng)
-    today = date.today()
-    days = [start + timedelta(days=i) for i in range((today - start).days + 1)]
-    labels = [d.strftime('%m-%d') for d in days]
-
-    your_vals = []
-    for d in days:
-        hrs = (
-            WorkoutRecord.query
-            .filter_by(user_id=user_id, date=d)
-            .with_entities(func.sum(WorkoutRecord.duration_min))
-            .scalar() or 0
-        )
-        your_vals.append(round(hrs / 60, 2))
-
-    all_users = User.query.all()
-    avg_vals = []
-    for d in days:
-        total = 0
-        for u in all_users:
-            day_sum = (
-                WorkoutRecord.query
-                .filter_by(user_id=u.id, date=d)
-                .with_entities(func.sum(WorkoutRecord.duration_min))
-                .scalar() or 0
-            )
-            total += day_sum
-        avg = (total / 60 / len(all_users)) if all_users else 0
-        avg_vals.append(round(avg, 2))
-
-    return jsonify({'labels': labels, 'you': your_vals, 'average': avg_vals})
+    window = parse_window(request.args)
+    if window is None:
+        return jsonify({'error': 'Invalid date range'}), 400
+    rng, start, end = window
+    bucket = pick_bucket(start, end, request.args.get('bucket'))
+    if bucket is None:
+        return jsonify({'error': 'Invalid bucket'}), 400
+    return jsonify(trend_payload(rng, start, end, load_user_days(user_id, start, end), bucket))
 
 @record_bp.route('/api/record/aeroAnaerobic')
 def record_aero_anaerobic():
     user_id = get_current_user_id()
     if not user_id:
         return jsonify({'error': 'Unauthorized'}), 401
-    rng = request.args.get('range', 'week')
-    start = parse_range(rng)
-
-    recs = (
-        WorkoutRecord.query
-        .join(SportsCategory)
-        .filter(
-            WorkoutRecord.user_id == user_id,
-            WorkoutRecord.date >= start
-        )
-        .all()
-    )
-
-    aerobic = sum(r.duration_min for r in recs if r.category and r.category.met_value >= 6.0)
-    anaerobic = sum(r.duration_min for r in recs if r.category and r.category.met_value < 6.0)
-
-    return jsonify({
-        'aerobic': round(aerobic / 60, 2),
-        'anaerobic': round(anaerobic / 60, 2)
-    })
+    window = parse_window(request.args)
+    if window is None:
+        return jsonify({'error': 'Invalid date range'}), 400
+    rng, start, end = window
+    return jsonify(aero_anaerobic_payload(load_user_days(user_id, start, end)))
 
 @record_bp.route('/api/record/categoryComparison')
 def record_category_comparison():
     user_id = get_current_user_id()
     if not user_id:
         return jsonify({'error': 'Unauthorized'}), 401
-    rng = request.args.get('range', 'week')
-    start = parse_range(rng)
-
-    categories = SportsCategory.query.all()
-    labels = [cat.name for cat in categories]
-    you_data = []
-    avg_data = []
-    for cat in categories:
-        your_avg = (
-            db.session.query(func.avg(WorkoutRecord.difficulty))
-            .filter(
-                WorkoutRecord.user_id == user_id,
-                WorkoutRecord.category_id == cat.id,
-                WorkoutRecord.date >= start
-            )
-            .scalar() or 0
-        )
-        avg_all = (
-            db.session.query(func.avg(WorkoutRecord.difficulty))
-            .filter(
-                WorkoutRecord.category_id == cat.id,
-                WorkoutRecord.date >= start
-            )
-            .scalar() or 0
-        )
-        you_data.append(round(your_avg, 2))
-        avg_data.append(round(avg_all, 2))
-
-    return jsonify({'categories': labels, 'you': you_data, 'average': avg_data})
+    window = parse_window(request.args)
+    if window is None:
+        return jsonify({'error': 'Invalid date range'}), 400
+    rng, start, end = window
+    return jsonify(category_comparison(rng, user_id, start, end))
 
 @record_bp.route('/api/record/leaderboard')
 def record_leaderboard():
-    rng = request.args.get('range', 'week')
-    start = parse_range(rng)
-
-    stats = []
-    for u in User.query.all():
-        total_cal = sum((r.calories_burn or 0) for r in u.records if r.date >= start)
-        total_hr = sum((r.duration_min or 0) for r in u.records if r.date >= start) / 60
-        stats.append((u.username, total_cal, total_hr))
-
-    stats.sort(key=lambda x: x[1], reverse=True)
-    leaderboard = [
-        {
-            'rank': idx + 1,
-            'username': uname,
-            'total_calories': round(cal, 1),
-            'total_hours': round(hr, 2)
-        }
-        for idx, (uname, cal, hr) in enumerate(stats[:10])
-    ]
-    return jsonify(leaderboard)
+    # Anonymous callers get the named ranges only; custom from/to windows
+    # need a login and are computed per request (see shared_for_window)
+    if (request.args.get('from') or request.args.get('to')) and not get_current_user_id():
+        return jsonify({'error': 'Custom date ranges require login'}), 401
+    window = parse_window(request.args)
+    if window is None:
+        return jsonify({'error': 'Invalid date range'}), 400
+    rng, start, end = window
+    # Public endpoint: keep the page size bounded
+    limit = min(max(request.args.get('limit', 10, type=int), 1), MAX_LEADERBOARD_LIMIT)
+
+    category_id = None
+    category_name = request.args.get('category')
+    if category_name:
+        category = SportsCategory.query.filter_by(name=category_name).first()
+        if not category:
+            return jsonify({'error': 'Invalid category'}), 400
+        category_id = category.id
+
+    return jsonify(leaderboard_payload(rng, start, end, get_current_user_id(), limit, category_id))
+
+@record_bp.route('/api/record/cacheStats')
+def record_cache_stats():
+    # Hit/miss counters of the shared analytics cache, for tuning TTL and size
+    if not get_current_user_id():
+        return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify(analytics_cache.stats())
+
+@record_bp.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """Backfill user_daily_stats from workout_records."""
+    rows = rebuild_daily_stats()
+    click.echo(f'Rebuilt user_daily_stats: {rows} rows.')
 
 @record_bp.route('/api/log_cardio', methods=['POST'])
 def log_cardio():
@@ -213,6 +365,7 @@ def log_cardio():
             calories_burn=float(calories)
         )
         db.session.add(record)
+        # stats.py folds the record into user_daily_stats during this commit
         db.session.commit()
         return jsonify({'success': True}), 200
     except Exception as e:
@@ -246,6 +399,7 @@ def log_strength():
             calories_burn=float(calories)
         )
         db.session.add(record)
+        # stats.py folds the record into user_daily_stats during this commit
         db.session.commit()
         return jsonify({'success': True}), 200
     except Exception as e:
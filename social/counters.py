@@ -0,0 +1,52 @@
+from sqlalchemy import func, or_, select, update
+from models import db, Post, Comment, Like, Bookmark
+from versions import FEED, touch
+
+# Child table -> denormalized counter column on posts
+COUNTERS = (
+    (Like, Post.like_count),
+    (Bookmark, Post.bookmark_count),
+    (Comment, Post.comment_count),
+)
+
+
+def bump(post_id, column, delta, trend=0.0):
+    """Atomically add ``delta`` to a post counter in the current transaction.
+
+    ``trend`` is added to the post's trend score in the same UPDATE. Returns
+    the new counter value, or None when the post does not exist. Loaded Post
+    objects are not refreshed, so nothing is read before the write.
+    """
+    touch(FEED)
+    values = {column: column + delta}
+    if trend:
+        # Never below zero: float rounding on removals must not go negative
+        values[Post.trend_score] = func.max(Post.trend_score + trend, 0.0)
+    return db.session.execute(
+        update(Post)
+        .where(Post.id == post_id)
+        .values(values)
+        .returning(column),
+        execution_options={'synchronize_session': False}
+    ).scalar()
+
+
+def repair_post_counters():
+    """Recount every counter from its child table; returns how many posts changed."""
+    actual = {
+        column.key: (
+            select(func.count())
+            .where(model.post_id == Post.id)
+            .scalar_subquery()
+        )
+        for model, column in COUNTERS
+    }
+    result = db.session.execute(
+        update(Post)
+        .where(or_(*[getattr(Post, key) != count for key, count in actual.items()]))
+        .values(actual)
+    )
+    if result.rowcount:
+        touch(FEED)
+    db.session.commit()
+    return result.rowcount
@@ -0,0 +1,90 @@
+from datetime import datetime
+from sqlalchemy import delete, literal, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import db, Post, Like, Bookmark
+from social.counters import bump
+from social.events import queue_event
+from social import trending
+
+# Engagement type -> (membership table, denormalized counter on posts)
+ENGAGEMENTS = {
+    'like': (Like, Post.like_count),
+    'bookmark': (Bookmark, Post.bookmark_count),
+}
+
+# Upper bound on operations accepted by one /api/engagement/batch call
+MAX_BATCH_OPS = 100
+
+
+def _remove(model, user_id, post_id):
+    # DELETE ... RETURNING: only the caller that actually removed the row sees
+    # it. Returns the removed (post_id, created_at) row, or None.
+    return db.session.execute(
+        delete(model)
+        .where(model.user_id == user_id, model.post_id == post_id)
+        .returning(model.post_id, model.created_at)
+    ).first()
+
+
+def _add(model, user_id, post_id):
+    # INSERT ... SELECT ... ON CONFLICT DO NOTHING RETURNING: a duplicate is a
+    # no-op instead of an IntegrityError, and nothing is inserted for a
+    # post that does not exist. Returns the new (post_id, created_at) row, or None.
+    stmt = sqlite_insert(model).from_select(
+        ['user_id', 'post_id', 'created_at'],
+        select(literal(user_id), Post.id, literal(datetime.utcnow())).where(Post.id == post_id)
+    )
+    return db.session.execute(
+        stmt.on_conflict_do_nothing().returning(model.post_id, model.created_at)
+    ).first()
+
+
+def set_engagement(kind, user_id, post_id, state=None):
+    """Like/bookmark (state=True), undo it (False) or toggle it (None).
+
+    Runs in the current transaction without reading first and returns the
+    resulting (state, count). Raises LookupError for an unknown post.
+    """
+    model, column = ENGAGEMENTS[kind]
+    if state is None:
+        changed = _remove(model, user_id, post_id)
+        state = changed is None
+        if state:
+            changed = _add(model, user_id, post_id)
+    elif state:
+        changed = _add(model, user_id, post_id)
+    else:
+        changed = _remove(model, user_id, post_id)
+    if changed is not None:
+        # Undoing subtracts exactly what the original event added; rows without
+        # a timestamp never counted towards the trend score (see rebuild_trending)
+        changed_at = changed.created_at
+        trend = trending.contribution(kind, changed_at) if changed_at is not None else 0.0
+        count = bump(post_id, column, 1 if state else -1, trend if state else -trend)
+        if count is not None:
+            # Feed field name: 'likes' / 'bookmarks'
+            queue_event('engagement', {'post_id': post_id, 'field': f'{kind}s', 'count': count})
+    else:
+        # Already in the requested state (or lost a race to an identical request)
+        count = db.session.execute(select(column).where(Post.id == post_id)).scalar()
+    if count is None:
+        raise LookupError(post_id)
+    return state, count
+
+
+def parse_ops(data):
+    """Validated (kind, post_id, state) triples from a batch body, or None."""
+    ops = data.get('ops') if isinstance(data, dict) else None
+    if not isinstance(ops, list) or not 0 < len(ops) <= MAX_BATCH_OPS:
+        return None
+    parsed = []
+    for op in ops:
+        if not isinstance(op, dict) or op.get('type') not in ENGAGEMENTS:
+            return None
+        post_id, state = op.get('post_id'), op.get('state')
+        if not isinstance(post_id, int) or isinstance(post_id, bool):
+            return None
+        if state is not None and not isinstance(state, bool):
+            return None
+        parsed.append((op['type'], post_id, state))
+    return parsed
@@ -0,0 +1,104 @@
+import json
+import threading
+from collections import deque
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import db
+
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT_SECONDS = 15
+# Events kept for clients that reconnect with Last-Event-ID
+HISTORY_SIZE = 1000
+
+
+class EventBus:
+    """In-process pub/sub with a bounded replay buffer.
+
+    Event ids increase by one per publish, so a client that saw event N can
+    be sent everything after it as long as N is still in the buffer. Ids are
+    per process: with several workers, each one has its own stream.
+    """
+
+    def __init__(self, history=HISTORY_SIZE):
+        self._events = deque(maxlen=history)
+        self._last_id = 0
+        self._cond = threading.Condition()
+
+    @property
+    def last_id(self):
+        return self._last_id
+
+    def publish(self, kind, data):
+        with self._cond:
+            self._last_id += 1
+            self._events.append((self._last_id, kind, data))
+            self._cond.notify_all()
+            return self._last_id
+
+    def since(self, last_id):
+        """Events after ``last_id``, or None when they can no longer be replayed."""
+        with self._cond:
+            if last_id > self._last_id:
+                # Id from before a restart
+                return None
+            if self._events and last_id < self._events[0][0] - 1:
+                # Older than the replay buffer
+                return None
+            return [e for e in self._events if e[0] > last_id]
+
+    def wait(self, last_id, timeout):
+        """Block until something newer than ``last_id`` is published (or timeout)."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._last_id > last_id, timeout)
+        return self.since(last_id)
+
+
+# Feed updates: 'post', 'comment' and 'engagement' events
+feed_bus = EventBus()
+
+
+def queue_event(kind, data):
+    """Publish ``data`` once the current transaction commits."""
+    db.session.info.setdefault('feed_events', []).append((kind, data))
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_feed_events(session):
+    for kind, data in session.info.pop('feed_events', ()):
+        feed_bus.publish(kind, data)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_feed_events(session):
+    session.info.pop('feed_events', None)
+
+
+def format_event(event_id, kind, data):
+    return f'id: {event_id}\nevent: {kind}\ndata: {json.dumps(data)}\n\n'
+
+
+def stream(last_id, heartbeat=HEARTBEAT_SECONDS):
+    """SSE body: replay after ``last_id``, then live events and heartbeats.
+
+    When the requested events are gone a single 'reset' event tells the
+    client to reload the feed and continue from the current id.
+    """
+    yield 'retry: 3000\n\n'
+    if last_id is None:
+        last_id = feed_bus.last_id
+    while True:
+        events = feed_bus.since(last_id)
+        if events is None:
+            last_id = feed_bus.last_id
+            yield format_event(last_id, 'reset', {})
+            continue
+        if not events:
+            events = feed_bus.wait(last_id, heartbeat)
+            if events is None:
+                continue
+            if not events:
+                yield ': heartbeat\n\n'
+                continue
+        for event_id, kind, data in events:
+            yield format_event(event_id, kind, data)
+            last_id = event_id
@@ -0,0 +1,136 @@
+import math
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import func, literal, select, tuple_, union_all
+from sqlalchemy.orm import joinedload
+from models import db, Post, Comment, Like, Bookmark, User
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 50
+# Latest comments embedded per post; the rest come from /api/posts/<id>/comments
+COMMENT_PREVIEW = 3
+
+
+def encode_cursor(key, row_id):
+    # Opaque to clients: "<sort key>_<id>" of the last row on a page.
+    # Timestamps are ISO 8601; repr() round-trips float scores exactly.
+    key = key.isoformat() if isinstance(key, datetime) else repr(key)
+    return f'{key}_{row_id}'
+
+
+def decode_cursor(cursor, parse_key=datetime.fromisoformat):
+    """(sort key, id) from a cursor; raises ValueError when malformed."""
+    key, _, row_id = cursor.rpartition('_')
+    return parse_key(key), int(row_id)
+
+
+def parse_score(text):
+    # Sort key of score-ordered cursors (search rank, trending score)
+    score = float(text)
+    if not math.isfinite(score):
+        raise ValueError(text)
+    return score
+
+
+def page_size(value):
+    return min(max(value or DEFAULT_PAGE_SIZE, 1), MAX_PAGE_SIZE)
+
+
+def feed_query():
+    # Posts with just the author's username joined in (never the avatar blob)
+    return Post.query.options(joinedload(Post.user).load_only(User.id, User.username))
+
+
+def paginate(query, limit, before=None):
+    """Newest-first keyset page of ``query`` strictly older than ``before``.
+
+    Returns (posts, next_cursor); next_cursor is None on the last page.
+    """
+    if before is not None:
+        query = query.filter(tuple_(Post.created_at, Post.id) < tuple_(*before))
+    posts = query.order_by(Post.created_at.desc(), Post.id.desc()).limit(limit + 1).all()
+    if len(posts) > limit:
+        return posts[:limit], encode_cursor(posts[limit - 1].created_at, posts[limit - 1].id)
+    return posts, None
+
+
+def serialize_comment(comment_id, username, content):
+    return {'id': comment_id, 'username': username, 'text': content}
+
+
+def comment_page(post_id, limit, before=None):
+    """Comments of a post older than comment id ``before``, oldest first.
+
+    Returns (comments, next_cursor); next_cursor is the id to pass as the
+    next ``cursor`` and is None once the start of the thread is reached.
+    """
+    query = (
+        select(Comment.id, User.username, Comment.content)
+        .join(User, User.id == Comment.user_id)
+        .where(Comment.post_id == post_id)
+    )
+    if before is not None:
+        query = query.where(Comment.id < before)
+    rows = db.session.execute(query.order_by(Comment.id.desc()).limit(limit + 1)).all()
+    next_cursor = rows[limit - 1][0] if len(rows) > limit else None
+    return [serialize_comment(*row) for row in reversed(rows[:limit])], next_cursor
+
+
+def serialize_posts(posts, user_id):
+    """Feed JSON for a page of posts in a fixed number of queries.
+
+    Counts come from the posts' counter columns, is_liked/is_bookmarked from one
+    membership query for the whole page, and the latest comments (with their
+    authors) from one windowed query, however many posts are on the page.
+    """
+    post_ids = [post.id for post in posts]
+    if not post_ids:
+        return []
+
+    liked, bookmarked = set(), set()
+    if user_id:
+        membership = union_all(
+            select(Like.post_id, literal('like').label('kind'))
+            .where(Like.user_id == user_id, Like.post_id.in_(post_ids)),
+            select(Bookmark.post_id, literal('bookmark').label('kind'))
+            .where(Bookmark.user_id == user_id, Bookmark.post_id.in_(post_ids))
+        )
+        for post_id, kind in db.session.execute(membership):
+            (liked if kind == 'like' else bookmarked).add(post_id)
+
+    # Latest COMMENT_PREVIEW comments per post, oldest first, in one windowed query
+    ranked = (
+        select(
+            Comment.id, Comment.post_id, Comment.user_id, Comment.content,
+            func.row_number().over(
+                partition_by=Comment.post_id, order_by=Comment.id.desc()
+            ).label('rn')
+        )
+        .where(Comment.post_id.in_(post_ids))
+        .subquery()
+    )
+    rows = db.session.execute(
+        select(ranked.c.post_id, ranked.c.id, User.username, ranked.c.content)
+        .join(User, User.id == ranked.c.user_id)
+        .where(ranked.c.rn <= COMMENT_PREVIEW)
+        .order_by(ranked.c.post_id, ranked.c.id)
+    )
+    comments = defaultdict(list)
+    for post_id, comment_id, username, content in rows:
+        comments[post_id].append(serialize_comment(comment_id, username, content))
+
+    return [
+        {
+            'id': post.id,
+            'username': post.user.username,
+            'content': post.content,
+            'timestamp': post.created_at.strftime('%Y-%m-%d %H:%M'),
+            'likes': post.like_count,
+            'comments': comments[post.id],
+            'comment_count': post.comment_count,
+            'bookmarks': post.bookmark_count,
+            'is_liked': post.id in liked,
+            'is_bookmarked': post.id in bookmarked
+        }
+        for post in posts
+    ]
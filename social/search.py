@@ -0,0 +1,82 @@
+import re
+from sqlalchemy import DDL, event, text
+from models import db
+from social.feed import encode_cursor
+
+# FTS5 index over post bodies and comments. Each indexed row's rowid encodes
+# its source: id * 2 for a post, id * 2 + 1 for a comment, so triggers can
+# update or delete exactly one row without scanning the index.
+SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS post_search USING fts5("
+    "body, post_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS posts_search_insert AFTER INSERT ON posts BEGIN "
+    "INSERT INTO post_search (rowid, body, post_id) VALUES (new.id * 2, new.content, new.id); END",
+    "CREATE TRIGGER IF NOT EXISTS posts_search_update AFTER UPDATE OF content ON posts BEGIN "
+    "UPDATE post_search SET body = new.content WHERE rowid = new.id * 2; END",
+    "CREATE TRIGGER IF NOT EXISTS posts_search_delete AFTER DELETE ON posts BEGIN "
+    "DELETE FROM post_search WHERE rowid = old.id * 2; END",
+    "CREATE TRIGGER IF NOT EXISTS comments_search_insert AFTER INSERT ON comments BEGIN "
+    "INSERT INTO post_search (rowid, body, post_id) VALUES (new.id * 2 + 1, new.content, new.post_id); END",
+    "CREATE TRIGGER IF NOT EXISTS comments_search_update AFTER UPDATE OF content, post_id ON comments BEGIN "
+    "UPDATE post_search SET body = new.content, post_id = new.post_id WHERE rowid = new.id * 2 + 1; END",
+    "CREATE TRIGGER IF NOT EXISTS comments_search_delete AFTER DELETE ON comments BEGIN "
+    "DELETE FROM post_search WHERE rowid = old.id * 2 + 1; END",
+]
+
+# Keep the index next to the tables it mirrors when create_all()/drop_all() run
+for statement in SEARCH_DDL:
+    event.listen(db.metadata, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+event.listen(db.metadata, 'before_drop', DDL('DROP TABLE IF EXISTS post_search').execute_if(dialect='sqlite'))
+
+
+def match_query(q):
+    """FTS5 MATCH expression for free text, or None when it has no words.
+
+    Every word is quoted, so operators and punctuation in user input are
+    plain text; the last word also matches as a prefix.
+    """
+    words = re.findall(r'\w+', q or '')
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search_posts(q, limit, after=None):
+    """Best-matching post ids for ``q``, most relevant first.
+
+    A post scores by its best bm25 rank over its own body and its comments
+    (lower is better). Pages are keyset-paginated on (score, post_id).
+    Returns (post_ids, next_cursor); next_cursor is None on the last page.
+    """
+    params = {'q': q, 'limit': limit + 1}
+    having = ''
+    if after is not None:
+        having = 'HAVING (score, post_id) > (:score, :post_id)'
+        params.update(score=after[0], post_id=after[1])
+    rows = db.session.execute(text(
+        'SELECT post_id, MIN(rank) AS score FROM ('
+        '  SELECT post_id, rank FROM post_search WHERE post_search MATCH :q'
+        f') GROUP BY post_id {having} ORDER BY score, post_id LIMIT :limit'
+    ), params).all()
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(last.score, last.post_id)
+    return [row.post_id for row in rows[:limit]], next_cursor
+
+
+def rebuild_search_index():
+    """Re-index every post and comment (backfill / repair); returns the row count."""
+    db.session.execute(text('DELETE FROM post_search'))
+    db.session.execute(text(
+        'INSERT INTO post_search (rowid, body, post_id) SELECT id * 2, content, id FROM posts'
+    ))
+    db.session.execute(text(
+        'INSERT INTO post_search (rowid, body, post_id) '
+        'SELECT id * 2 + 1, content, post_id FROM comments'
+    ))
+    db.session.execute(text("INSERT INTO post_search (post_search) VALUES ('optimize')"))
+    db.session.commit()
+    return db.session.execute(text('SELECT COUNT(*) FROM post_search')).scalar()
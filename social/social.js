@@ -7,50 +7,158 @@ fetch('/api/csrf-token')
     })
     .catch(err => console.error('Failed to fetch CSRF token:', err));
 
-// Render posts to #post-list
-function renderPosts(posts) {
+// Keyset cursor of the next feed page (null when everything is loaded)
+let nextCursor = null;
+let loadingPosts = false;
+
+// Build the card for one post
+function buildPostCard(post) {
+    const postCard = document.createElement('div');
+    postCard.className = 'card post-card';
+    postCard.style.marginBottom = '24px';
+    postCard.dataset.postId = post.id;
+    postCard.innerHTML = `
+        <div class="post-header">
+            <strong>${post.username}</strong>
+            <small style="margin-left: 8px; color: #777;">${post.timestamp}</small>
+        </div>
+        <div class="post-content">${post.content}</div>
+        <div class="post-actions" style="display: flex; gap: 20px; font-size: 18px;">
+            <span class="action-button" onclick="likePost(${post.id}, this)">❤️ <span class="likes-count">${post.likes}</span></span>
+            <span>💬 <span class="comment-count">${post.comment_count}</span></span>
+            <span class="action-button" onclick="bookmarkPost(${post.id}, this)"><span class="bookmark-icon">${post.is_bookmarked ? '🔖' : '📑'}</span> <span class="bookmarks-count">${post.bookmarks}</span></span>
+        </div>
+        <div class="post-comments" style="border-top: 1px solid #eee; padding-top: 10px;">
+            ${post.comment_count > post.comments.length
+                ? `<a href="#" class="more-comments" onclick="loadMoreComments(${post.id}, this); return false;">View earlier comments</a>`
+                : ''}
+            <div class="comment-list">${post.comments.map(renderComment).join('')}</div>
+            <input type="text" class="comment-input" placeholder="Add a comment..." onkeydown="if(event.key==='Enter'){submitComment(${post.id}, this.value); this.value='';}">
+        </div>
+    `;
+    // Oldest comment shown so far; older pages are fetched before it
+    postCard.dataset.commentCursor = post.comments.length ? post.comments[0].id : '';
+    return postCard;
+}
+
+// Render posts to #post-list (append = keep the posts already shown)
+function renderPosts(posts, append = false) {
     const postList = document.getElementById('post-list');
-    postList.innerHTML = '';
-    posts.forEach(post => {
-        const postCard = document.createElement('div');
-        postCard.className = 'card post-card';
-        postCard.style.marginBottom = '24px';
-        postCard.innerHTML = `
-            <div class="post-header">
-                <strong>${post.username}</strong>
-                <small style="margin-left: 8px; color: #777;">${post.timestamp}</small>
-            </div>
-            <div class="post-content">${post.content}</div>
-            <div class="post-actions" style="display: flex; gap: 20px; font-size: 18px;">
-                <span class="action-button" onclick="likePost(${post.id})">❤️ ${post.likes}</span>
-                <span>💬 ${post.comments.length}</span>
-                <span class="action-button" onclick="bookmarkPost(${post.id})">${post.is_bookmarked ? '🔖' : '📑'} ${post.bookmarks}</span>
-            </div>
-            <div class="post-comments" style="border-top: 1px solid #eee; padding-top: 10px;">
-                ${post.comments.map(c => `<p><strong>${c.username}:</strong> ${c.text}</p>`).join('')}
-                <input type="text" class="comment-input" placeholder="Add a comment..." onkeydown="if(event.key==='Enter'){submitComment(${post.id}, this.value); this.value='';}">
-            </div>
-        `;
-        postList.appendChild(postCard);
-    });
+    if (!append) postList.innerHTML = '';
+    posts.forEach(post => postList.appendChild(buildPostCard(post)));
 }
 
-// Load posts from backend
-function loadPosts() {
-    fetch('/api/posts')
+function renderComment(c) {
+    return `<p><strong>${c.username}:</strong> ${c.text}</p>`;
+}
+
+// Prepend the previous page of a post's comments
+function loadMoreComments(postId, link) {
+    const postCard = link.closest('.post-card');
+    const cursor = postCard.dataset.commentCursor;
+    fetch(`/api/posts/${postId}/comments?cursor=${cursor}`)
         .then(res => {
-            if (!res.ok) throw new Error('Failed to load posts');
+            if (!res.ok) throw new Error('Failed to load comments');
             return res.json();
         })
-        .then(posts => {
-            renderPosts(posts);
+        .then(page => {
+            postCard.querySelector('.comment-list')
+                .insertAdjacentHTML('afterbegin', page.comments.map(renderComment).join(''));
+            if (page.comments.length) postCard.dataset.commentCursor = page.comments[0].id;
+            if (!page.next_cursor) link.remove();
         })
+        .catch(err => console.error('Error loading comments:', err));
+}
+
+// Active search text; the feed shows search results while it is set
+let searchQuery = '';
+
+function feedUrl(cursor) {
+    if (searchQuery) {
+        const after = cursor ? `&after=${encodeURIComponent(cursor)}` : '';
+        return `/api/posts/search?q=${encodeURIComponent(searchQuery)}${after}`;
+    }
+    return cursor ? `/api/posts?before=${encodeURIComponent(cursor)}` : '/api/posts';
+}
+
+// Fetch one page of the feed, starting after `cursor` when given
+function fetchPostPage(cursor) {
+    const url = feedUrl(cursor);
+    loadingPosts = true;
+    // fetchJSON (fetch_cache.js) revalidates with the stored ETag
+    return fetchJSON(url)
+        .then(page => {
+            if (page.error) throw new Error(page.error);
+            renderPosts(page.posts, Boolean(cursor));
+            nextCursor = page.next_cursor;
+        })
+        .finally(() => {
+            loadingPosts = false;
+        });
+}
+
+// Load the first page of posts from backend
+function loadPosts() {
+    fetchPostPage(null)
         .catch(err => {
             console.error('Error loading posts:', err);
             alert('Failed to load posts. Please try again later.');
         });
 }
 
+// Append the next page when the end of the feed scrolls into view
+function loadMorePosts() {
+    if (!nextCursor || loadingPosts) return;
+    fetchPostPage(nextCursor)
+        .catch(err => console.error('Error loading more posts:', err));
+}
+
+function setupInfiniteScroll() {
+    const postList = document.getElementById('post-list');
+    if (!postList || !('IntersectionObserver' in window)) return;
+    const sentinel = document.createElement('div');
+    sentinel.id = 'post-list-sentinel';
+    postList.after(sentinel);
+    new IntersectionObserver(entries => {
+        if (entries.some(entry => entry.isIntersecting)) loadMorePosts();
+    }, { rootMargin: '200px' }).observe(sentinel);
+}
+
+// Live feed updates over Server-Sent Events (null when unsupported)
+let feedStream = null;
+
+function findPostCard(postId) {
+    return document.querySelector(`.post-card[data-post-id="${postId}"]`);
+}
+
+function connectFeedStream() {
+    if (!('EventSource' in window)) return;
+    // The browser reconnects by itself and resends Last-Event-ID
+    feedStream = new EventSource('/api/posts/stream');
+    feedStream.addEventListener('post', e => {
+        // Search results are ranked, not chronological
+        if (searchQuery) return;
+        const post = JSON.parse(e.data);
+        const postList = document.getElementById('post-list');
+        if (!findPostCard(post.id)) postList.prepend(buildPostCard(post));
+    });
+    feedStream.addEventListener('comment', e => {
+        const delta = JSON.parse(e.data);
+        const postCard = findPostCard(delta.post_id);
+        if (!postCard) return;
+        postCard.querySelector('.comment-list').insertAdjacentHTML('beforeend', renderComment(delta.comment));
+        postCard.querySelector('.comment-count').textContent = delta.comment_count;
+        if (!postCard.dataset.commentCursor) postCard.dataset.commentCursor = delta.comment.id;
+    });
+    feedStream.addEventListener('engagement', e => {
+        const delta = JSON.parse(e.data);
+        const postCard = findPostCard(delta.post_id);
+        if (postCard) postCard.querySelector(`.${delta.field}-count`).textContent = delta.count;
+    });
+    // Missed too much while disconnected: start over from the first page
+    feedStream.addEventListener('reset', () => loadPosts());
+}
+
 // Submit a new post
 function submitPost(content) {
     fetch('/api/posts', {
@@ -67,7 +175,8 @@ function submitPost(content) {
     })
     .then(data => {
         if (data.success) {
-            loadPosts();
+            // The new post arrives through the feed stream
+            if (!feedStream) loadPosts();
         } else {
             throw new Error(data.error || 'Failed to create post');
         }
@@ -99,7 +208,7 @@ function submitComment(postId, text) {
     })
     .then(data => {
         if (data.success) {
-            loadPosts();
+            if (!feedStream) loadPosts();
         } else {
             throw new Error(data.error || 'Failed to submit comment');
         }
@@ -111,7 +220,7 @@ function submitComment(postId, text) {
 }
 
 // Like or unlike a post
-function likePost(postId) {
+function likePost(postId, button) {
     fetch(`/api/posts/${postId}/like`, {
         method: 'POST',
         headers: {
@@ -124,7 +233,8 @@ function likePost(postId) {
     })
     .then(data => {
         if (data.success) {
-            loadPosts();
+            // The response carries the new count, so patch the button in place
+            button.querySelector('.likes-count').textContent = data.likes;
         } else {
             throw new Error(data.error || 'Failed to like/unlike post');
         }
@@ -146,11 +256,24 @@ window.addEventListener('DOMContentLoaded', function() {
             document.getElementById('new-post-content').value = '';
         };
     }
+    const search = document.getElementById('post-search');
+    if (search) {
+        let timer = null;
+        search.addEventListener('input', () => {
+            clearTimeout(timer);
+            timer = setTimeout(() => {
+                searchQuery = search.value.trim();
+                loadPosts();
+            }, 300);
+        });
+    }
+    setupInfiniteScroll();
     loadPosts();
+    connectFeedStream();
 });
 
 // Bookmark or unbookmark a post
-function bookmarkPost(postId) {
+function bookmarkPost(postId, button) {
     fetch(`/api/posts/${postId}/bookmark`, {
         method: 'POST',
         headers: {
@@ -163,7 +286,8 @@ function bookmarkPost(postId) {
     })
     .then(data => {
         if (data.success) {
-            loadPosts();
+            button.querySelector('.bookmark-icon').textContent = data.is_bookmarked ? '🔖' : '📑';
+            button.querySelector('.bookmarks-count').textContent = data.bookmarks;
         } else {
             throw new Error(data.error || 'Failed to bookmark/unbookmark post');
         }
@@ -1,32 +1,92 @@
-from flask import Blueprint, jsonify, request, session
-from models import db, Post, Comment, Like, Bookmark, User
+import click
+from flask import Blueprint, Response, jsonify, request, session
+from sqlalchemy import func, select
+from models import db, Post, Comment, Bookmark, User
 from datetime import datetime
+from social.counters import bump, repair_post_counters
+from social.engagement import MAX_BATCH_OPS, parse_ops, set_engagement
+from social.events import queue_event, stream
+from social import search, timeline, trending
+from versions import FEED, TRENDING, conditional, version_stamp
+from social.feed import (
+    comment_page, decode_cursor, encode_cursor, feed_query, page_size, paginate, parse_score,
+    serialize_comment, serialize_posts
+)
 
 social_bp = Blueprint('social', __name__)
 
 @social_bp.route('/api/posts', methods=['GET'])
 def get_posts():
-    posts = Post.query.order_by(Post.created_at.desc()).all()
-    current_user_id = session.get('user_id')
-    
-    result = []
-    for post in posts:
-        post_data = {
-            'id': post.id,
-            'username': post.user.username,
-            'content': post.content,
-            'timestamp': post.created_at.strftime('%Y-%m-%d %H:%M'),
-            'likes': len(post.likes),
-            'comments': [{
-                'username': comment.user.username,
-                'text': comment.content
-            } for comment in post.comments],
-            'bookmarks': len(post.bookmarks),
-            'is_liked': any(like.user_id == current_user_id for like in post.likes),
-            'is_bookmarked': any(bookmark.user_id == current_user_id for bookmark in post.bookmarks)
-        }
-        result.append(post_data)
-    return jsonify(result)
+    # Keyset pagination: ?limit=&before=<next_cursor of the previous page>
+    limit = page_size(request.args.get('limit', type=int))
+    before = request.args.get('before')
+    if before:
+        try:
+            before = decode_cursor(before)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+    user_id = session.get('user_id')
+    stamp = version_stamp(
+        [FEED],
+        select(func.max(Post.id)).scalar_subquery(),
+        extra=(user_id, limit, before)
+    )
+
+    def build():
+        posts, next_cursor = paginate(feed_query(), limit, before or None)
+        result = serialize_posts(posts, user_id)
+        return jsonify({'posts': result, 'next_cursor': next_cursor})
+    return conditional(stamp, build)
+
+@social_bp.route('/api/posts/search')
+def search_posts():
+    # Ranked full-text search over posts and their comments:
+    # ?q=&limit=&after=<next_cursor of the previous page>
+    query = search.match_query(request.args.get('q'))
+    if query is None:
+        return jsonify({'error': 'Search query is required'}), 400
+    limit = page_size(request.args.get('limit', type=int))
+    after = request.args.get('after')
+    if after:
+        try:
+            after = decode_cursor(after, parse_score)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+    user_id = session.get('user_id')
+    stamp = version_stamp(
+        [FEED],
+        select(func.max(Post.id)).scalar_subquery(),
+        extra=(user_id, query, limit, after)
+    )
+
+    def build():
+        post_ids, next_cursor = search.search_posts(query, limit, after or None)
+        posts = {post.id: post for post in feed_query().filter(Post.id.in_(post_ids))}
+        result = serialize_posts([posts[i] for i in post_ids if i in posts], user_id)
+        return jsonify({'posts': result, 'next_cursor': next_cursor})
+    return conditional(stamp, build)
+
+@social_bp.route('/api/posts/trending')
+def get_trending():
+    # Posts by time-decayed engagement: ?limit=&after=<next_cursor>
+    limit = page_size(request.args.get('limit', type=int))
+    after = request.args.get('after')
+    if after:
+        try:
+            after = decode_cursor(after, parse_score)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+    user_id = session.get('user_id')
+    stamp = version_stamp(
+        [FEED, TRENDING],
+        select(func.max(Post.id)).scalar_subquery(),
+        extra=(user_id, limit, after)
+    )
+
+    def build():
+        posts, next_cursor = trending.trending_page(limit, after or None)
+        return jsonify({'posts': serialize_posts(posts, user_id), 'next_cursor': next_cursor})
+    return conditional(stamp, build)
 
 @social_bp.route('/api/posts', methods=['POST'])
 def create_post():
@@ -39,11 +99,81 @@ def create_post():
     if not content:
         return jsonify({'error': 'Content is required'}), 400
     
-    post = Post(user_id=user_id, content=content)
+    now = datetime.utcnow()
+    post = Post(user_id=user_id, content=content, created_at=now,
+                trend_score=trending.contribution('post', now))
     db.session.add(post)
+    db.session.flush()
+    timeline.fan_out(post)
+    queue_event('post', serialize_posts([post], None)[0])
     db.session.commit()
     return jsonify({'success': True})
 
+@social_bp.route('/api/timeline')
+def get_timeline():
+    # Home timeline (own posts + people followed), same paging as /api/posts
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'Unauthorized'}), 401
+    limit = page_size(request.args.get('limit', type=int))
+    before = request.args.get('before')
+    if before:
+        try:
+            before = decode_cursor(before)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+    post_ids, last = timeline.timeline_page(user_id, limit, before or None)
+    posts = {post.id: post for post in feed_query().filter(Post.id.in_(post_ids))}
+    result = serialize_posts([posts[i] for i in post_ids if i in posts], user_id)
+    next_cursor = encode_cursor(*last) if last else None
+    return jsonify({'posts': result, 'next_cursor': next_cursor})
+
+@social_bp.route('/api/users/<int:followee_id>/follow', methods=['POST', 'DELETE'])
+def follow_user(followee_id):
+    # POST follows, DELETE unfollows; both are idempotent
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'Unauthorized'}), 401
+    if followee_id == user_id:
+        return jsonify({'error': 'You cannot follow yourself'}), 400
+    if db.session.get(User, followee_id) is None:
+        return jsonify({'error': 'User not found'}), 404
+
+    if request.method == 'POST':
+        _, followers = timeline.follow(user_id, followee_id)
+    else:
+        _, followers = timeline.unfollow(user_id, followee_id)
+    db.session.commit()
+    return jsonify({'success': True, 'following': request.method == 'POST', 'followers': followers})
+
+@social_bp.route('/api/posts/stream')
+def feed_stream():
+    # Server-Sent Events: 'post', 'comment' and 'engagement' deltas for the
+    # feed. Browsers resend Last-Event-ID on reconnect; ?last_event_id= works
+    # for the first connection.
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        return jsonify({'error': 'Invalid event id'}), 400
+    return Response(stream(last_id), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@social_bp.route('/api/posts/<int:post_id>/comments', methods=['GET'])
+def get_comments(post_id):
+    # Older comments of one post: ?cursor=<next_cursor>&limit=
+    limit = page_size(request.args.get('limit', type=int))
+    cursor = request.args.get('cursor')
+    if cursor is not None:
+        try:
+            cursor = int(cursor)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+    comments, next_cursor = comment_page(post_id, limit, cursor)
+    return jsonify({'comments': comments, 'next_cursor': next_cursor})
+
 @social_bp.route('/api/posts/<int:post_id>/comments', methods=['POST'])
 def add_comment(post_id):
     user_id = session.get('user_id')
@@ -55,8 +185,21 @@ def add_comment(post_id):
     if not text:
         return jsonify({'error': 'Comment text is required'}), 400
     
-    comment = Comment(user_id=user_id, post_id=post_id, content=text)
+    now = datetime.utcnow()
+    # Bump first: it also tells us whether the post exists, before anything is inserted
+    comment_count = bump(post_id, Post.comment_count, 1, trending.contribution('comment', now))
+    if comment_count is None:
+        db.session.rollback()
+        return jsonify({'error': 'Post not found'}), 404
+    comment = Comment(user_id=user_id, post_id=post_id, content=text, created_at=now)
     db.session.add(comment)
+    db.session.flush()
+    username = db.session.get(User, user_id).username
+    queue_event('comment', {
+        'post_id': post_id,
+        'comment': serialize_comment(comment.id, username, text),
+        'comment_count': comment_count
+    })
     db.session.commit()
     return jsonify({'success': True})
 
@@ -65,53 +208,107 @@ def toggle_like(post_id):
     user_id = session.get('user_id')
     if not user_id:
         return jsonify({'error': 'Unauthorized'}), 401
-    
-    like = Like.query.filter_by(user_id=user_id, post_id=post_id).first()
-    if like:
-        db.session.delete(like)
-    else:
-        like = Like(user_id=user_id, post_id=post_id)
-        db.session.add(like)
+
+    try:
+        liked, likes = set_engagement('like', user_id, post_id)
+    except LookupError:
+        db.session.rollback()
+        return jsonify({'error': 'Post not found'}), 404
     db.session.commit()
-    return jsonify({'success': True})
+    return jsonify({'success': True, 'is_liked': liked, 'likes': likes})
 
 @social_bp.route('/api/posts/<int:post_id>/bookmark', methods=['POST'])
 def toggle_bookmark(post_id):
     user_id = session.get('user_id')
     if not user_id:
         return jsonify({'error': 'Unauthorized'}), 401
-    
-    bookmark = Bookmark.query.filter_by(user_id=user_id, post_id=post_id).first()
-    if bookmark:
-        db.session.delete(bookmark)
-    else:
-        bookmark = Bookmark(user_id=user_id, post_id=post_id)
-        db.session.add(bookmark)
+
+    try:
+        bookmarked, bookmarks = set_engagement('bookmark', user_id, post_id)
+    except LookupError:
+        db.session.rollback()
+        return jsonify({'error': 'Post not found'}), 404
     db.session.commit()
-    return jsonify({'success': True})
+    return jsonify({'success': True, 'is_bookmarked': bookmarked, 'bookmarks': bookmarks})
+
+@social_bp.route('/api/engagement/batch', methods=['POST'])
+def engagement_batch():
+    # Body: {"ops": [{"type": "like"|"bookmark", "post_id": 1, "state": true|false|null}]}
+    # A missing/null state toggles. All operations commit together or not at all.
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    ops = parse_ops(request.get_json(silent=True))
+    if ops is None:
+        return jsonify({'error': f'Expected 1-{MAX_BATCH_OPS} like/bookmark operations'}), 400
+    results = []
+    for index, (kind, post_id, state) in enumerate(ops):
+        try:
+            state, count = set_engagement(kind, user_id, post_id, state)
+        except LookupError:
+            db.session.rollback()
+            return jsonify({'error': 'Post not found', 'index': index}), 404
+        results.append({'type': kind, 'post_id': post_id, 'state': state, 'count': count})
+    db.session.commit()
+    return jsonify({'success': True, 'results': results})
 
 @social_bp.route('/api/posts/bookmarked')
 def get_bookmarked_posts():
     user_id = session.get('user_id')
     if not user_id:
         return jsonify({'error': 'Unauthorized'}), 401
-    bookmarks = Bookmark.query.filter_by(user_id=user_id).all()
-    posts = [bm.post for bm in bookmarks]
-    result = []
-    for post in posts:
-        post_data = {
-            'id': post.id,
-            'username': post.user.username,
-            'content': post.content,
-            'timestamp': post.created_at.strftime('%Y-%m-%d %H:%M'),
-            'likes': len(post.likes),
-            'comments': [{
-                'username': comment.user.username,
-                'text': comment.content
-            } for comment in post.comments],
-            'bookmarks': len(post.bookmarks),
-            'is_liked': any(like.user_id == user_id for like in post.likes),
-            'is_bookmarked': True
-        }
-        result.append(post_data)
-    return jsonify(result)
\ No newline at end of file
+    mine = Bookmark.user_id == user_id
+    stamp = version_stamp(
+        [FEED],
+        select(func.count(Bookmark.post_id)).where(mine).scalar_subquery(),
+        select(func.max(Bookmark.created_at)).where(mine).scalar_subquery(),
+        extra=(user_id,)
+    )
+
+    def build():
+        posts = (
+            feed_query()
+            .join(Bookmark, Bookmark.post_id == Post.id)
+            .filter(Bookmark.user_id == user_id)
+            .order_by(Bookmark.created_at, Bookmark.post_id)
+            .all()
+        )
+        return jsonify(serialize_posts(posts, user_id))
+    return conditional(stamp, build)
+
+
+@social_bp.cli.command('rebuild-search')
+def rebuild_search_command():
+    """Backfill the full-text search index from posts and comments."""
+    indexed = search.rebuild_search_index()
+    click.echo(f'Indexed {indexed} posts and comments.')
+
+
+@social_bp.cli.command('rebuild-timelines')
+def rebuild_timelines_command():
+    """Recompute home timelines and follower counts from the follow graph."""
+    entries = timeline.rebuild_timelines()
+    click.echo(f'Wrote {entries} timeline entries.')
+
+
+@social_bp.cli.command('renormalize-trending')
+def renormalize_trending_command():
+    """Move the trending epoch forward and rescale scores (run daily)."""
+    epoch = trending.renormalize()
+    db.session.commit()
+    click.echo(f'Trending epoch is now {epoch}.')
+
+
+@social_bp.cli.command('rebuild-trending')
+def rebuild_trending_command():
+    """Recompute every post's trending score from its engagement rows."""
+    scored = trending.rebuild_trending()
+    click.echo(f'Scored {scored} posts.')
+
+
+@social_bp.cli.command('repair-counters')
+def repair_counters_command():
+    """Recount like/bookmark/comment counters from the child tables."""
+    repaired = repair_post_counters()
+    click.echo(f'Repaired counters on {repaired} posts.')
@@ -0,0 +1,145 @@
+from datetime import datetime
+from sqlalchemy import delete, func, insert, literal, select, tuple_, union_all, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import db, Follow, Post, TimelineEntry, User
+
+# Authors with more followers than this are not copied into every timeline
+# on write; their posts are merged into followers' timelines on read.
+FANOUT_LIMIT = 1000
+# Recent posts copied into a timeline when its owner follows someone
+FOLLOW_BACKFILL = 20
+
+
+def fan_out(post):
+    """Copy a new post into its author's and followers' timelines.
+
+    The author always gets an entry. Followers only get one when the author
+    has at most FANOUT_LIMIT of them; otherwise the post is flagged for
+    fan-out on read. Runs in the current transaction.
+    """
+    table = TimelineEntry.__table__
+    own = select(literal(post.user_id), literal(post.id), literal(post.user_id), literal(post.created_at))
+    # users.follower_count is kept by follow()/unfollow(): one primary-key read
+    follower_count = db.session.execute(select(User.follower_count).where(User.id == post.user_id)).scalar()
+    post.fanned_out = (follower_count or 0) <= FANOUT_LIMIT
+    source = own
+    if post.fanned_out:
+        followers = select(
+            Follow.follower_id, literal(post.id), literal(post.user_id), literal(post.created_at)
+        ).where(Follow.followee_id == post.user_id)
+        source = union_all(own, followers)
+    db.session.execute(
+        insert(table).from_select(['user_id', 'post_id', 'author_id', 'created_at'], source)
+    )
+
+
+def follow(follower_id, followee_id):
+    """Follow a user; returns (changed, followee's follower count)."""
+    stmt = sqlite_insert(Follow).values(
+        follower_id=follower_id, followee_id=followee_id, created_at=datetime.utcnow()
+    )
+    changed = db.session.execute(
+        stmt.on_conflict_do_nothing().returning(Follow.followee_id)
+    ).first() is not None
+    if changed:
+        # Their latest fanned-out posts, so the timeline is not empty until they post again
+        recent = (
+            select(literal(follower_id), Post.id, Post.user_id, Post.created_at)
+            .where(Post.user_id == followee_id, Post.fanned_out.is_(True))
+            .order_by(Post.created_at.desc(), Post.id.desc())
+            .limit(FOLLOW_BACKFILL)
+        )
+        db.session.execute(
+            sqlite_insert(TimelineEntry)
+            .from_select(['user_id', 'post_id', 'author_id', 'created_at'], recent)
+            .on_conflict_do_nothing()
+        )
+    return changed, _bump_followers(followee_id, 1 if changed else 0)
+
+
+def unfollow(follower_id, followee_id):
+    """Stop following a user; returns (changed, followee's follower count)."""
+    changed = db.session.execute(
+        delete(Follow)
+        .where(Follow.follower_id == follower_id, Follow.followee_id == followee_id)
+        .returning(Follow.followee_id)
+    ).first() is not None
+    if changed:
+        db.session.execute(
+            delete(TimelineEntry)
+            .where(TimelineEntry.user_id == follower_id, TimelineEntry.author_id == followee_id)
+        )
+    return changed, _bump_followers(followee_id, -1 if changed else 0)
+
+
+def _bump_followers(user_id, delta):
+    return db.session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(follower_count=User.follower_count + delta)
+        .returning(User.follower_count),
+        execution_options={'synchronize_session': False}
+    ).scalar()
+
+
+def timeline_page(user_id, limit, before=None):
+    """Newest-first (post_id, created_at) pairs of a user's home timeline.
+
+    Reads at most ``limit + 1`` rows from the user's precomputed entries and
+    from the not-fanned-out posts of the people they follow, then merges
+    them. Returns (post ids, last (created_at, id) on the page or None).
+    """
+    entries = (
+        select(TimelineEntry.post_id, TimelineEntry.created_at)
+        .where(TimelineEntry.user_id == user_id)
+    )
+    pending = (
+        select(Post.id, Post.created_at)
+        .join(Follow, Follow.followee_id == Post.user_id)
+        # Spelled "= 0" so SQLite can use the ix_posts_fanout_pending partial index
+        .where(Follow.follower_id == user_id, Post.fanned_out == False)
+    )
+    if before is not None:
+        entries = entries.where(tuple_(TimelineEntry.created_at, TimelineEntry.post_id) < tuple_(*before))
+        pending = pending.where(tuple_(Post.created_at, Post.id) < tuple_(*before))
+    rows = db.session.execute(
+        entries.order_by(TimelineEntry.created_at.desc(), TimelineEntry.post_id.desc()).limit(limit + 1)
+    ).all()
+    rows += db.session.execute(
+        pending.order_by(Post.created_at.desc(), Post.id.desc()).limit(limit + 1)
+    ).all()
+    merged = sorted({post_id: created_at for post_id, created_at in rows}.items(),
+                    key=lambda row: (row[1], row[0]), reverse=True)
+    if len(merged) > limit:
+        post_id, created_at = merged[limit - 1]
+        return [post_id for post_id, _ in merged[:limit]], (created_at, post_id)
+    return [post_id for post_id, _ in merged], None
+
+
+def rebuild_timelines():
+    """Recompute every timeline and follower count from follows (backfill / repair).
+
+    Returns the number of timeline rows written.
+    """
+    table = TimelineEntry.__table__
+    db.session.execute(delete(table))
+    own = select(Post.user_id, Post.id, Post.user_id.label('author_id'), Post.created_at)
+    followers = (
+        select(Follow.follower_id, Post.id, Post.user_id, Post.created_at)
+        .join(Follow, Follow.followee_id == Post.user_id)
+        .where(Post.fanned_out.is_(True))
+    )
+    db.session.execute(
+        sqlite_insert(table)
+        .from_select(['user_id', 'post_id', 'author_id', 'created_at'], union_all(own, followers))
+        .on_conflict_do_nothing()
+    )
+    db.session.execute(
+        update(User).values(follower_count=(
+            select(func.count())
+            .where(Follow.followee_id == User.id)
+            .scalar_subquery()
+        ))
+    )
+    db.session.commit()
+    return db.session.execute(select(func.count()).select_from(table)).scalar()
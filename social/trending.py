@@ -0,0 +1,113 @@
+from datetime import datetime, timedelta
+from sqlalchemy import bindparam, select, tuple_, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import db, Post, Comment, Like, Bookmark, Setting
+from social.feed import encode_cursor, feed_query
+from versions import TRENDING, touch
+
+# Engagement weights; a post starts with its own 'post' weight so fresh posts rank by age
+WEIGHTS = {'post': 1.0, 'like': 1.0, 'bookmark': 2.0, 'comment': 3.0}
+# An engagement counts half as much after this long
+HALF_LIFE = timedelta(hours=24)
+
+# A post's score is sum(weight * 2 ** ((t - epoch) / HALF_LIFE)) over its
+# engagements. Decaying every score by the same factor keeps the order, so
+# scores never need to be recomputed as time passes; they only grow for new
+# events. renormalize() moves the epoch forward (and rescales every score)
+# so the numbers stay small. The epoch is ORIGIN + n * EPOCH_STEP, with n
+# kept in the settings table under EPOCH_KEY. The scheduled
+# `renormalize-trending` job moves it daily.
+ORIGIN = datetime(2025, 1, 1)
+EPOCH_STEP = timedelta(days=7)
+EPOCH_KEY = 'trending_epoch'
+# Safety net for a job that has stopped: a write this far past the epoch
+# renormalizes first (once), keeping 2 ** age far from float overflow
+# (~1000 days). Scores reach at most 2 ** 56 before that happens.
+MAX_EPOCH_LAG = 8 * EPOCH_STEP
+
+
+def current_epoch():
+    n = db.session.execute(
+        select(Setting.value).where(Setting.name == EPOCH_KEY)
+    ).scalar()
+    return n or 0
+
+
+def contribution(kind, when, epoch=None):
+    """Score added by a ``kind`` event at ``when``, relative to the stored epoch."""
+    if epoch is None:
+        epoch = current_epoch()
+        if when - (ORIGIN + epoch * EPOCH_STEP) > MAX_EPOCH_LAG:
+            epoch = renormalize(when)
+    age = when - (ORIGIN + epoch * EPOCH_STEP)
+    return WEIGHTS[kind] * 2 ** (age / HALF_LIFE)
+
+
+def renormalize(now=None):
+    """Move the epoch up to ``now`` and rescale every score; returns the new epoch.
+
+    Meant to run daily (`flask --app app social renormalize-trending`): it
+    rewrites every post, so a request only does it when the job is
+    MAX_EPOCH_LAG overdue. Runs in the current transaction; the caller
+    commits.
+    """
+    now = now or datetime.utcnow()
+    epoch = current_epoch()
+    target = max(epoch, (now - ORIGIN) // EPOCH_STEP)
+    if target > epoch:
+        factor = 2 ** (-(target - epoch) * EPOCH_STEP / HALF_LIFE)
+        db.session.execute(
+            update(Post).values(trend_score=Post.trend_score * factor),
+            execution_options={'synchronize_session': False}
+        )
+        _save_epoch(target)
+    return target
+
+
+def _save_epoch(epoch):
+    stmt = sqlite_insert(Setting).values(name=EPOCH_KEY, value=epoch)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['name'], set_={'value': stmt.excluded.value}
+    ))
+    # Every score (and so every trending cursor and ETag) just changed
+    touch(TRENDING)
+
+
+def trending_page(limit, after=None):
+    """Posts by descending trend score, keyset-paginated on (score, id).
+
+    Returns (posts, next_cursor); next_cursor is None on the last page.
+    """
+    query = feed_query()
+    if after is not None:
+        query = query.filter(tuple_(Post.trend_score, Post.id) < tuple_(*after))
+    posts = query.order_by(Post.trend_score.desc(), Post.id.desc()).limit(limit + 1).all()
+    if len(posts) > limit:
+        last = posts[limit - 1]
+        return posts[:limit], encode_cursor(last.trend_score, last.id)
+    return posts, None
+
+
+def rebuild_trending(now=None):
+    """Recompute every post's score from posts, likes, bookmarks and comments.
+
+    Backfill / repair only: reads all engagement rows once. Returns the
+    number of posts scored.
+    """
+    epoch = renormalize(now)
+    scores = {}
+    for post_id, created_at in db.session.execute(select(Post.id, Post.created_at)):
+        scores[post_id] = contribution('post', created_at, epoch)
+    for kind, model in (('like', Like), ('bookmark', Bookmark), ('comment', Comment)):
+        rows = db.session.execute(select(model.post_id, model.created_at).where(model.created_at.is_not(None)))
+        for post_id, created_at in rows:
+            if post_id in scores:
+                scores[post_id] += contribution(kind, created_at, epoch)
+    db.session.execute(
+        update(Post.__table__)
+        .where(Post.__table__.c.id == bindparam('post_id'))
+        .values(trend_score=bindparam('score')),
+        [{'post_id': post_id, 'score': score} for post_id, score in scores.items()]
+    )
+    db.session.commit()
+    return len(scores)
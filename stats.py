@@ -0,0 +1,229 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from sqlalchemy import event, func, delete, insert, inspect, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from models import db, User, WorkoutRecord, UserDailyStats, UserStreak
+from cache import analytics_cache
+
+# Columns of workout_records that feed the rollup
+ROLLUP_FIELDS = ('user_id', 'date', 'category_id', 'duration_min', 'calories_burn', 'difficulty')
+
+
+def _record_values(record, old=False):
+    # Current (or pre-flush) values of the rollup fields of a record
+    state = inspect(record)
+    values = {}
+    for field in ROLLUP_FIELDS:
+        hist = state.attrs[field].history
+        if old and hist.deleted:
+            values[field] = hist.deleted[0]
+        else:
+            values[field] = getattr(record, field)
+    return values
+
+
+def _add_delta(deltas, values, sign):
+    key = (values['user_id'], values['date'], values['category_id'])
+    delta = deltas[key]
+    delta[0] += sign * (values['duration_min'] or 0)
+    delta[1] += sign * (values['calories_burn'] or 0)
+    delta[2] += sign * (values['difficulty'] or 0)
+    delta[3] += sign
+
+
+def apply_deltas(connection, deltas):
+    """Upsert (user, date, category) deltas of [minutes, calories, difficulty, count]."""
+    table = UserDailyStats.__table__
+    for (user_id, day, category_id), (minutes, calories, difficulty, count) in deltas.items():
+        if not count and not minutes and not calories and not difficulty:
+            continue
+        stmt = sqlite_insert(table).values(
+            user_id=user_id,
+            date=day,
+            category_id=category_id,
+            total_minutes=minutes,
+            total_calories=calories,
+            difficulty_sum=difficulty,
+            difficulty_count=count
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id', 'date', 'category_id'],
+            set_={
+                'total_minutes': table.c.total_minutes + stmt.excluded.total_minutes,
+                'total_calories': table.c.total_calories + stmt.excluded.total_calories,
+                'difficulty_sum': table.c.difficulty_sum + stmt.excluded.difficulty_sum,
+                'difficulty_count': table.c.difficulty_count + stmt.excluded.difficulty_count,
+            }
+        )
+        connection.execute(stmt)
+        if count < 0:
+            # Drop buckets whose last record went away
+            connection.execute(
+                delete(table).where(
+                    table.c.user_id == user_id,
+                    table.c.date == day,
+                    table.c.category_id == category_id,
+                    table.c.difficulty_count <= 0
+                )
+            )
+
+
+def streak_runs(days):
+    """(current run length, run end, longest run) for sorted distinct dates."""
+    run, longest, previous = 0, 0, None
+    for day in days:
+        run = run + 1 if previous is not None and day == previous + timedelta(days=1) else 1
+        longest = max(longest, run)
+        previous = day
+    return run, previous, longest
+
+
+def recompute_streak(connection, user_id):
+    # Full fallback: walk every distinct workout date of the user once
+    days = connection.execute(
+        select(UserDailyStats.date)
+        .where(UserDailyStats.user_id == user_id)
+        .group_by(UserDailyStats.date)
+        .order_by(UserDailyStats.date)
+    ).scalars().all()
+    run, run_end, longest = streak_runs(days)
+    _save_streak(connection, user_id, run, run_end, longest)
+
+
+def _save_streak(connection, user_id, run, run_end, longest):
+    table = UserStreak.__table__
+    stmt = sqlite_insert(table).values(
+        user_id=user_id, current_run=run, run_end=run_end, longest_run=longest
+    )
+    connection.execute(stmt.on_conflict_do_update(
+        index_elements=['user_id'],
+        set_={
+            'current_run': stmt.excluded.current_run,
+            'run_end': stmt.excluded.run_end,
+            'longest_run': stmt.excluded.longest_run,
+        }
+    ))
+
+
+def advance_streak(connection, user_id, days):
+    """Fold newly logged dates into the stored streak.
+
+    Dates on or after the current run end are O(1) updates; a backdated date
+    may merge older runs, so it falls back to recompute_streak().
+    """
+    table = UserStreak.__table__
+    row = connection.execute(select(table).where(table.c.user_id == user_id)).first()
+    if row is None or row.run_end is None:
+        recompute_streak(connection, user_id)
+        return
+    run, run_end, longest = row.current_run, row.run_end, row.longest_run
+    for day in sorted(days):
+        if day < run_end:
+            recompute_streak(connection, user_id)
+            return
+        if day == run_end:
+            continue
+        run = run + 1 if day == run_end + timedelta(days=1) else 1
+        run_end = day
+        longest = max(longest, run)
+    _save_streak(connection, user_id, run, run_end, longest)
+
+
+def current_streak(user_id, today=None):
+    """(current streak ending today, longest streak) for a user."""
+    today = today or date.today()
+    streak = db.session.get(UserStreak, user_id)
+    if streak is None:
+        # Not backfilled yet: compute without storing
+        days = (
+            db.session.query(UserDailyStats.date)
+            .filter(UserDailyStats.user_id == user_id)
+            .group_by(UserDailyStats.date)
+            .order_by(UserDailyStats.date)
+            .all()
+        )
+        run, run_end, longest = streak_runs([d for (d,) in days])
+    else:
+        run, run_end, longest = streak.current_run, streak.run_end, streak.longest_run
+    return (run if run_end == today else 0), longest
+
+
+@event.listens_for(Session, 'after_flush')
+def _maintain_rollup(session, flush_context):
+    # Runs inside the flushing transaction, so the rollup commits (or rolls
+    # back) together with the workout_records rows that changed it.
+    deltas = defaultdict(lambda: [0, 0.0, 0, 0])
+    new_days = defaultdict(set)
+    recompute = set()
+    for obj in session.new:
+        if isinstance(obj, WorkoutRecord):
+            values = _record_values(obj)
+            _add_delta(deltas, values, 1)
+            new_days[values['user_id']].add(values['date'])
+    for obj in session.deleted:
+        if isinstance(obj, WorkoutRecord):
+            values = _record_values(obj, old=True)
+            _add_delta(deltas, values, -1)
+            recompute.add(values['user_id'])
+    for obj in session.dirty:
+        if isinstance(obj, WorkoutRecord) and session.is_modified(obj):
+            old = _record_values(obj, old=True)
+            _add_delta(deltas, old, -1)
+            _add_delta(deltas, _record_values(obj), 1)
+            recompute.update({old['user_id'], obj.user_id})
+    if deltas:
+        connection = session.connection()
+        apply_deltas(connection, deltas)
+        for user_id in recompute:
+            recompute_streak(connection, user_id)
+        for user_id, days in new_days.items():
+            if user_id not in recompute:
+                advance_streak(connection, user_id, days)
+    # Cross-user averages also depend on how many users exist
+    users_changed = any(isinstance(obj, User) for obj in session.new | session.deleted)
+    if deltas or users_changed:
+        session.info['analytics_changed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_analytics(session):
+    if session.info.pop('analytics_changed', False):
+        analytics_cache.invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_analytics_flag(session):
+    session.info.pop('analytics_changed', None)
+
+
+def rebuild_streaks():
+    # Recompute every user's streak from the rollup (caller commits)
+    connection = db.session.connection()
+    connection.execute(delete(UserStreak.__table__))
+    user_ids = connection.execute(select(UserDailyStats.user_id).distinct()).scalars().all()
+    for user_id in user_ids:
+        recompute_streak(connection, user_id)
+
+
+def rebuild_daily_stats():
+    """Recompute user_daily_stats (and streaks) from workout_records (backfill / repair)."""
+    table = UserDailyStats.__table__
+    source = select(
+        WorkoutRecord.user_id,
+        WorkoutRecord.date,
+        WorkoutRecord.category_id,
+        func.sum(WorkoutRecord.duration_min),
+        func.sum(func.coalesce(WorkoutRecord.calories_burn, 0)),
+        func.sum(WorkoutRecord.difficulty),
+        func.count(WorkoutRecord.id)
+    ).group_by(WorkoutRecord.user_id, WorkoutRecord.date, WorkoutRecord.category_id)
+    db.session.execute(delete(table))
+    db.session.execute(insert(table).from_select([
+        'user_id', 'date', 'category_id', 'total_minutes',
+        'total_calories', 'difficulty_sum', 'difficulty_count'
+    ], source))
+    rebuild_streaks()
+    db.session.commit()
+    analytics_cache.invalidate()
+    return db.session.query(func.count()).select_from(table).scalar()
@@ -1,6 +1,7 @@
 import unittest
 from app import app, db
 from models import User, WorkoutRecord, SportsCategory
+from ratelimit import auth_limiter
 from datetime import datetime, date, timedelta
 from werkzeug.security import generate_password_hash
 
@@ -16,6 +17,7 @@ class TestApp(unittest.TestCase):
         self.ctx = app.app_context()
         self.ctx.push()
         db.create_all()
+        auth_limiter.reset()
             
         # Create standard categories and get timestamp for unique user
         timestamp = datetime.now().timestamp()
@@ -0,0 +1,87 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from app import app, db
+from cache import Cache, MemoryBackend, SQLiteBackend, analytics_cache
+from models import User, SportsCategory
+
+
+class TestCache(unittest.TestCase):
+    def test_ttl_expiry(self):
+        """Entries expire after the TTL"""
+        cache = Cache(MemoryBackend(), ttl=10)
+        calls = []
+        compute = lambda: calls.append(1) or len(calls)
+        with mock.patch('cache.time.time', return_value=1000):
+            self.assertEqual(cache.get_or_set(('trend_average', 'week', 'd'), compute), 1)
+            self.assertEqual(cache.get_or_set(('trend_average', 'week', 'd'), compute), 1)
+        with mock.patch('cache.time.time', return_value=1011):
+            self.assertEqual(cache.get_or_set(('trend_average', 'week', 'd'), compute), 2)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_lru_eviction(self):
+        """The least recently used entry is evicted first"""
+        cache = Cache(MemoryBackend(max_entries=2))
+        cache.get_or_set(('a',), lambda: 1)
+        cache.get_or_set(('b',), lambda: 2)
+        cache.get_or_set(('a',), lambda: 0)
+        cache.get_or_set(('c',), lambda: 3)
+        self.assertEqual(cache.get_or_set(('a',), lambda: 0), 1)
+        self.assertEqual(cache.get_or_set(('b',), lambda: 'recomputed'), 'recomputed')
+        self.assertEqual(cache.stats()['evictions'], 2)
+
+    def test_sqlite_backend_is_shared(self):
+        """Two caches on the same file see each other's entries and invalidations"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'cache.sqlite3')
+            first = Cache(SQLiteBackend(path))
+            second = Cache(SQLiteBackend(path))
+            first.get_or_set(('category_average', 'week', 'd'), lambda: [[1, 2.5]])
+            self.assertEqual(second.get_or_set(('category_average', 'week', 'd'), lambda: None), [[1, 2.5]])
+            second.invalidate('category_average')
+            self.assertEqual(first.get_or_set(('category_average', 'week', 'd'), lambda: 'fresh'), 'fresh')
+
+
+class TestAnalyticsCacheInvalidation(unittest.TestCase):
+    def setUp(self):
+        app.config.update({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+            'WTF_CSRF_ENABLED': False,
+            'SECRET_KEY': 'test-key'
+        })
+        self.client = app.test_client()
+        self.ctx = app.app_context()
+        self.ctx.push()
+        db.create_all()
+        db.session.add(SportsCategory(name='Running', met_value=9.8))
+        self.user = User(username='cached', email='cached@example.com', password_hash='hash')
+        db.session.add(self.user)
+        db.session.commit()
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = self.user.id
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_log_invalidates_average(self):
+        """Logging a workout drops the cached average series"""
+        self.assertEqual(self.client.get('/api/record/trend').json['average'][-1], 0)
+        hits = analytics_cache.hits
+        self.client.get('/api/record/trend')
+        self.assertEqual(analytics_cache.hits, hits + 1)
+
+        self.client.post('/api/log_cardio', data={'activity': 'Running', 'duration': '60', 'calories': '300'})
+        self.assertEqual(self.client.get('/api/record/trend').json['average'][-1], 1.0)
+
+        stats = self.client.get('/api/record/cacheStats').json
+        self.assertEqual(stats['backend'], 'memory')
+        self.assertGreater(stats['misses'], 0)
+        self.assertEqual(app.test_client().get('/api/record/cacheStats').status_code, 401)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import threading
+import unittest
+from social.events import EventBus, feed_bus, format_event, stream
+
+
+class TestEventBus(unittest.TestCase):
+    def test_replay_after_last_id(self):
+        """Events after an id are replayed until they fall out of the buffer"""
+        bus = EventBus(history=3)
+        for i in range(5):
+            bus.publish('post', {'n': i})
+        self.assertEqual([e[2]['n'] for e in bus.since(3)], [3, 4])
+        self.assertEqual(bus.since(5), [])
+        # Event 2 was evicted, and ids from a previous process are unknown
+        self.assertIsNone(bus.since(1))
+        self.assertIsNone(bus.since(99))
+
+    def test_wait_wakes_on_publish(self):
+        """wait() returns as soon as a newer event is published"""
+        bus = EventBus()
+        timer = threading.Timer(0.05, bus.publish, args=('comment', {}))
+        timer.start()
+        events = bus.wait(0, timeout=5)
+        timer.join()
+        self.assertEqual([e[1] for e in events], ['comment'])
+        self.assertEqual(bus.wait(1, timeout=0.01), [])
+
+    def test_stream_heartbeat_and_reset(self):
+        """Unknown ids get a reset event; idle streams send heartbeats"""
+        chunks = stream(feed_bus.last_id + 100, heartbeat=0.01)
+        self.assertEqual(next(chunks), 'retry: 3000\n\n')
+        self.assertEqual(next(chunks), format_event(feed_bus.last_id, 'reset', {}))
+        self.assertEqual(next(chunks), ': heartbeat\n\n')
+        chunks.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+from app import app, db
+from models import User
+import passwords
+from passwords import hash_password, method_string, needs_rehash
+from ratelimit import auth_limiter
+from werkzeug.security import generate_password_hash
+
+
+class TestPasswordPolicy(unittest.TestCase):
+    def setUp(self):
+        self.saved_policy = (app.config['PASSWORD_HASH_METHOD'], app.config['PASSWORD_HASH_ITERATIONS'])
+        app.config.update({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+            'WTF_CSRF_ENABLED': False,
+            'SECRET_KEY': 'test-key',
+            # Cheap policy so the tests stay fast
+            'PASSWORD_HASH_METHOD': 'pbkdf2:sha256',
+            'PASSWORD_HASH_ITERATIONS': 1000
+        })
+        self.client = app.test_client()
+        self.ctx = app.app_context()
+        self.ctx.push()
+        db.create_all()
+        auth_limiter.reset()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+        app.config['PASSWORD_HASH_METHOD'], app.config['PASSWORD_HASH_ITERATIONS'] = self.saved_policy
+
+    def add_user(self, password_hash):
+        user = User(username='alice', email='alice@example.com', password_hash=password_hash)
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+    def login(self, password):
+        return self.client.post('/api/login', json={'username': 'alice', 'password': password})
+
+    def test_hash_follows_policy(self):
+        """New hashes use the configured method and iterations"""
+        self.assertTrue(hash_password('secret').startswith('pbkdf2:sha256:1000$'))
+        app.config.update({'PASSWORD_HASH_METHOD': 'scrypt', 'PASSWORD_HASH_ITERATIONS': 2 ** 10})
+        hashed = hash_password('secret')
+        self.assertTrue(hashed.startswith('scrypt:1024:8:1$'))
+        self.assertFalse(needs_rehash(hashed))
+
+    def test_login_rehashes_old_policy(self):
+        """A successful login upgrades a hash made under another policy"""
+        old = generate_password_hash('secret', method='pbkdf2:sha256:2000')
+        user_id = self.add_user(old)
+
+        self.assertEqual(self.login('wrong').status_code, 401)
+        self.assertEqual(db.session.get(User, user_id).password_hash, old)
+
+        self.assertEqual(self.login('secret').status_code, 200)
+        db.session.expire_all()
+        upgraded = db.session.get(User, user_id).password_hash
+        self.assertTrue(upgraded.startswith('pbkdf2:sha256:1000$'))
+
+        # Current hashes are left alone and still log in
+        self.assertEqual(self.login('secret').status_code, 200)
+        db.session.expire_all()
+        self.assertEqual(db.session.get(User, user_id).password_hash, upgraded)
+
+    def test_scrypt_policy(self):
+        """scrypt uses its own default cost, and logins rehash onto it"""
+        user_id = self.add_user(generate_password_hash('secret', method='pbkdf2:sha256:1000'))
+        app.config.update({'PASSWORD_HASH_METHOD': 'scrypt', 'PASSWORD_HASH_ITERATIONS': None})
+        self.assertEqual(self.login('secret').status_code, 200)
+        db.session.expire_all()
+        upgraded = db.session.get(User, user_id).password_hash
+        self.assertTrue(upgraded.startswith('scrypt:32768:8:1$'))
+        self.assertEqual(self.login('secret').status_code, 200)
+
+    def test_invalid_policy_fails_at_startup(self):
+        """Unusable policies are rejected when the app is configured"""
+        for method, iterations in [('scrypt', 600_000), ('md5', None), ('pbkdf2:sha256', 0)]:
+            with self.assertRaises(ValueError):
+                method_string(method, iterations)
+        app.config.update({'PASSWORD_HASH_METHOD': 'scrypt', 'PASSWORD_HASH_ITERATIONS': 600_000})
+        with self.assertRaises(ValueError):
+            passwords.init_app(app)
@@ -0,0 +1,178 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from PIL import Image, ImageFile
+from app import app, db
+from models import User
+import avatars
+import blobstore
+from tests.unit.utils import capture_queries
+
+
+class TestAvatars(unittest.TestCase):
+    def setUp(self):
+        self.upload_dir = tempfile.mkdtemp()
+        self.saved_upload_dir = app.config['UPLOAD_FOLDER']
+        app.config.update({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+            'WTF_CSRF_ENABLED': False,
+            'SECRET_KEY': 'test-key',
+            'UPLOAD_FOLDER': self.upload_dir
+        })
+        self.client = app.test_client()
+        self.ctx = app.app_context()
+        self.ctx.push()
+        db.create_all()
+
+        self.user = User(username='alice', email='alice@example.com', password_hash='hash')
+        self.other = User(username='bob', email='bob@example.com', password_hash='hash')
+        db.session.add_all([self.user, self.other])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+        app.config['UPLOAD_FOLDER'] = self.saved_upload_dir
+        shutil.rmtree(self.upload_dir)
+
+    def png(self, size=(300, 200), color='red'):
+        out = io.BytesIO()
+        Image.new('RGBA', size, color).save(out, 'PNG')
+        return out.getvalue()
+
+    def upload(self, user_id, data, filename='me.png'):
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = user_id
+        return self.client.post('/api/account/edit', data={
+            'avatar': (io.BytesIO(data), filename, 'image/png')
+        }, content_type='multipart/form-data')
+
+    def test_upload_stores_hash_not_bytes(self):
+        """Uploaded avatars land in the blob store; identical bytes are stored once"""
+        data = self.png()
+        self.assertEqual(self.upload(self.user.id, data).status_code, 200)
+        self.assertEqual(self.upload(self.other.id, data).status_code, 200)
+
+        digests = {u.avatar_hash for u in User.query.all()}
+        self.assertEqual(len(digests), 1)
+        digest = digests.pop()
+        self.assertEqual(len(digest), 64)
+        with open(blobstore.blob_path(self.upload_dir, digest), 'rb') as f:
+            self.assertEqual(f.read(), data)
+        # The original plus one thumbnail per size
+        self.assertEqual(len(os.listdir(os.path.dirname(blobstore.blob_path(self.upload_dir, digest)))),
+                         1 + len(avatars.SIZES))
+        self.assertIsNone(db.session.execute(db.text('SELECT avatar FROM users WHERE id = :id'),
+                                             {'id': self.user.id}).scalar())
+
+    def test_thumbnails_are_immutable_and_conditional(self):
+        """Versioned thumbnail URLs are cacheable forever and answer If-None-Match with 304"""
+        self.upload(self.user.id, self.png())
+        digest = db.session.get(User, self.user.id).avatar_hash
+
+        response = self.client.get(f'/account/avatar/{self.user.id}?size=40')
+        self.assertEqual(response.status_code, 302)
+        url = f'/account/avatar/{self.user.id}/40/{digest}'
+        self.assertTrue(response.location.endswith(url))
+
+        with capture_queries() as statements:
+            response = self.client.get(url)
+        self.assertEqual(statements, [])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'image/jpeg')
+        self.assertTrue(response.cache_control.immutable)
+        self.assertEqual(Image.open(io.BytesIO(response.get_data())).size, (40, 40))
+        etag = response.headers['ETag']
+        response.close()
+
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.get_data(), b'')
+
+        self.assertEqual(self.client.get(f'/account/avatar/{self.user.id}/41/{digest}').status_code, 404)
+        self.assertEqual(self.client.get(f'/account/avatar/{self.user.id}/40/{"0" * 64}').status_code, 404)
+
+    def stored_files(self):
+        return [name for _, _, names in os.walk(self.upload_dir) for name in names]
+
+    def test_rejects_unreadable_image(self):
+        """Wrong magic bytes and undecodable PNGs are refused and leave no files"""
+        response = self.upload(self.user.id, b'GIF89a' + b'\0' * 100)
+        self.assertEqual(response.status_code, 400)
+        response = self.upload(self.user.id, b'\x89PNG\r\n\x1a\n' + b'garbage' * 100)
+        self.assertEqual(response.status_code, 400)
+        self.assertIsNone(db.session.get(User, self.user.id).avatar_hash)
+        self.assertEqual(self.stored_files(), [])
+
+    def test_rejects_too_many_pixels(self):
+        """Images over MAX_PIXELS are refused from their header, before decoding"""
+        out = io.BytesIO()
+        # 100M pixels, but only a few kilobytes as a PNG
+        Image.new('1', (10_000, 10_000)).save(out, 'PNG')
+        self.assertLess(len(out.getvalue()), app.config['AVATAR_MAX_BYTES'])
+        with mock.patch.object(ImageFile.ImageFile, 'load') as load:
+            response = self.upload(self.user.id, out.getvalue())
+        load.assert_not_called()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.stored_files(), [])
+
+    def test_rejects_oversized_upload(self):
+        """Files over AVATAR_MAX_BYTES get the app's JSON 413 under the default limits"""
+        cap = app.config['AVATAR_MAX_BYTES']
+        self.assertLess(cap, app.config['MAX_CONTENT_LENGTH'])
+        response = self.upload(self.user.id, b'\x89PNG\r\n\x1a\n' + b'\0' * cap)
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(response.json, {'error': 'Avatar is too large'})
+        self.assertIsNone(db.session.get(User, self.user.id).avatar_hash)
+        self.assertEqual(self.stored_files(), [])
+
+    def test_rejects_oversized_request(self):
+        """Bodies over MAX_CONTENT_LENGTH are refused by Werkzeug and answered by the app"""
+        data = b'\x89PNG\r\n\x1a\n' + b'\0' * app.config['MAX_CONTENT_LENGTH']
+        response = self.upload(self.user.id, data)
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(response.json, {'error': 'Avatar is too large'})
+
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = self.user.id
+        response = self.client.post('/account/edit', data={'avatar': (io.BytesIO(data), 'me.png')},
+                                    content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.location.endswith('/account/edit'))
+        self.assertEqual(self.stored_files(), [])
+
+    def test_receive_stops_at_bad_head(self):
+        """A rejected first chunk stops the copy before the rest of the stream is read"""
+        stream = io.BytesIO(b'x' * (1024 * 1024))
+        with self.assertRaises(ValueError):
+            with blobstore.receive(self.upload_dir, stream, 10 * 1024 * 1024,
+                                   check_head=avatars.sniff, chunk_size=1024):
+                pass
+        self.assertEqual(stream.tell(), 1024)
+        self.assertEqual(self.stored_files(), [])
+
+    def test_avatar_column_is_deferred(self):
+        """Loading users does not select the legacy avatar blob"""
+        db.session.expire_all()
+        with capture_queries() as statements:
+            User.query.all()
+        self.assertEqual(len(statements), 1)
+        self.assertIn('users_avatar_hash', statements[0])
+        self.assertNotRegex(statements[0], r'AS users_avatar\b')
+
+    def test_legacy_blob_still_served(self):
+        """Rows the migration has not moved yet are served from the column"""
+        self.user.avatar = b'legacy-bytes'
+        self.user.avatar_mimetype = 'image/jpeg'
+        db.session.commit()
+        response = self.client.get(f'/account/avatar/{self.user.id}')
+        self.assertEqual(response.get_data(), b'legacy-bytes')
+        self.assertEqual(response.mimetype, 'image/jpeg')
+
+        response = self.client.get(f'/account/avatar/{self.other.id}')
+        self.assertEqual(response.status_code, 302)
@@ -0,0 +1,105 @@
+import re
+import unittest
+from datetime import date, datetime, timedelta
+from sqlalchemy import event
+from app import app, db
+from models import User, SportsCategory, WorkoutRecord, WorkoutPlan, Post, Comment, Like, Bookmark
+
+# Tables the endpoints are allowed to read in full: every user is ranked,
+# and categories are a small lookup table.
+FULL_SCAN_ALLOWED = {'users', 'sports_categories'}
+
+ENDPOINTS = [
+    '/api/record/dashboard?range=week',
+    '/api/record/metrics?range=month',
+    '/api/record/trend?range=month',
+    '/api/record/aeroAnaerobic?range=week',
+    '/api/record/categoryComparison?range=week',
+    '/api/record/leaderboard?range=week&category=Running',
+    '/api/my_plan',
+    '/api/posts',
+    '/api/posts/bookmarked',
+    '/api/sport_categories',
+    '/api/posts/search?q=hello',
+    '/api/timeline',
+    '/api/posts/trending',
+]
+
+
+class TestQueryPlans(unittest.TestCase):
+    def setUp(self):
+        app.config.update({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+            'WTF_CSRF_ENABLED': False,
+            'SECRET_KEY': 'test-key'
+        })
+        self.client = app.test_client()
+        self.ctx = app.app_context()
+        self.ctx.push()
+        db.create_all()
+
+        category = SportsCategory(name='Running', met_value=9.8)
+        user = User(username='planner', email='planner@example.com', password_hash='hash')
+        db.session.add_all([category, user])
+        db.session.commit()
+        post = Post(user_id=user.id, content='hello')
+        db.session.add_all([
+            WorkoutRecord(user_id=user.id, category_id=category.id, date=date.today(),
+                          duration_min=30, difficulty=2, calories_burn=200),
+            WorkoutPlan(user_id=user.id, activity='Running', start_time=datetime.utcnow(),
+                        end_time=datetime.utcnow() + timedelta(hours=1)),
+            post,
+        ])
+        db.session.commit()
+        db.session.add_all([
+            Comment(user_id=user.id, post_id=post.id, content='nice'),
+            Like(user_id=user.id, post_id=post.id),
+            Bookmark(user_id=user.id, post_id=post.id),
+        ])
+        db.session.commit()
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = user.id
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def capture(self, url):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+                statements.append((statement, parameters))
+
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            response = self.client.get(url)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+        self.assertEqual(response.status_code, 200, url)
+        return statements
+
+    def test_no_full_table_scans(self):
+        """Main endpoint queries use indexes instead of scanning whole tables"""
+        tables = set(db.metadata.tables)
+        conn = db.engine.raw_connection()
+        try:
+            for url in ENDPOINTS:
+                for statement, parameters in self.capture(url):
+                    plan = conn.cursor().execute('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+                    for row in plan:
+                        match = re.match(r'SCAN (\w+)(.*)', row[-1])
+                        if not match or match.group(1) not in tables:
+                            continue  # searches, CTEs, temp b-trees
+                        table, rest = match.groups()
+                        if table in FULL_SCAN_ALLOWED or 'INDEX' in rest:
+                            continue
+                        self.fail(f'{url} scans {table}:\n{statement}\n{plan}')
+        finally:
+            conn.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
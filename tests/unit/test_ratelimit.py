@@ -0,0 +1,130 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from app import app, db
+from models import User
+from ratelimit import MemoryBackend, RateLimiter, SQLiteBackend, auth_limiter
+
+
+class TestSlidingWindow(unittest.TestCase):
+    def test_limit_and_retry_after(self):
+        """Hits past the limit are rejected with the time until one more fits"""
+        limiter = RateLimiter(MemoryBackend(), {'ip': (3, 60)})
+        for _ in range(3):
+            self.assertEqual(limiter.hit('login', now=600, ip='1.2.3.4'), 0)
+        self.assertEqual(limiter.hit('login', now=610, ip='1.2.3.4'), 70)
+        # Other keys and scopes are counted separately
+        self.assertEqual(limiter.hit('login', now=610, ip='5.6.7.8'), 0)
+        self.assertEqual(limiter.hit('reset-password', now=610, ip='1.2.3.4'), 0)
+        self.assertEqual(limiter.stats()['rejected'], 1)
+
+    def test_previous_window_fades_out(self):
+        """The previous window's count is weighted by how much of it still overlaps"""
+        limiter = RateLimiter(MemoryBackend(), {'ip': (4, 60)})
+        for _ in range(4):
+            limiter.hit('login', now=630, ip='a')
+        # 15 s into the next window: 4 * 0.75 = 3 still counted, room for one
+        self.assertEqual(limiter.hit('login', now=675, ip='a'), 0)
+        self.assertEqual(limiter.hit('login', now=675, ip='a'), 15)
+        self.assertEqual(limiter.hit('login', now=690, ip='a'), 0)
+
+    def test_rejections_are_not_counted(self):
+        """A flood does not extend the lockout of the key it targets"""
+        limiter = RateLimiter(MemoryBackend(), {'username': (2, 60)})
+        limiter.hit('login', now=0, username='alice')
+        limiter.hit('login', now=0, username='alice')
+        for second in range(1, 60):
+            self.assertGreater(limiter.hit('login', now=second, username='alice'), 0)
+        self.assertEqual(limiter.hit('login', now=120, username='alice'), 0)
+        self.assertEqual(limiter.stats()['allowed'], 3)
+
+    def test_sqlite_backend_is_shared(self):
+        """Two limiters on the same file share their window counts and their stats"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'limits.sqlite3')
+            first = RateLimiter(SQLiteBackend(path), {'ip': (2, 60)})
+            second = RateLimiter(SQLiteBackend(path), {'ip': (2, 60)})
+            self.assertEqual(first.hit('login', now=0, ip='a'), 0)
+            self.assertEqual(second.hit('login', now=1, ip='a'), 0)
+            self.assertGreater(first.hit('login', now=2, ip='a'), 0)
+            stats = second.stats()
+            self.assertEqual(stats['keys'], 1)
+            self.assertEqual((stats['allowed'], stats['rejected'], stats['rejected_by']), (2, 1, {'login': 1}))
+            second.reset()
+            self.assertEqual(first.stats()['rejected'], 0)
+            self.assertEqual(first.hit('login', now=3, ip='a'), 0)
+
+    def test_sqlite_backend_closes_connections(self):
+        """Every SQLite connection is closed when its call returns"""
+        with tempfile.TemporaryDirectory() as tmp:
+            opened = []
+            connect = SQLiteBackend._connect
+
+            def tracking_connect(backend):
+                conn = mock.MagicMock(wraps=connect(backend))
+                opened.append(conn)
+                return conn
+            with mock.patch.object(SQLiteBackend, '_connect', tracking_connect):
+                limiter = RateLimiter(SQLiteBackend(os.path.join(tmp, 'limits.sqlite3')), {'ip': (2, 60)})
+                limiter.hit('login', now=0, ip='a')
+                limiter.stats()
+                limiter.reset()
+            self.assertEqual(len(opened), 5)
+            for conn in opened:
+                conn.close.assert_called_once()
+
+
+class TestAuthAdmission(unittest.TestCase):
+    def setUp(self):
+        app.config.update({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+            'WTF_CSRF_ENABLED': False,
+            'SECRET_KEY': 'test-key'
+        })
+        self.client = app.test_client()
+        self.ctx = app.app_context()
+        self.ctx.push()
+        db.create_all()
+        auth_limiter.reset()
+        db.session.add(User(username='alice', email='alice@example.com', password_hash='pbkdf2:sha256:1000$x$y'))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+        auth_limiter.reset()
+
+    def test_login_rejected_before_hashing(self):
+        """Past the per-username limit, login answers 429 without checking the password"""
+        limit = app.config['AUTH_RATE_LIMITS']['username'][0]
+        with mock.patch('auth.check_password', return_value=False) as check:
+            for _ in range(limit):
+                response = self.client.post('/api/login', json={'username': 'alice', 'password': 'guess'})
+                self.assertEqual(response.status_code, 401)
+            self.assertEqual(check.call_count, limit)
+
+            response = self.client.post('/api/login', json={'username': 'alice', 'password': 'guess'})
+            self.assertEqual(response.status_code, 429)
+            self.assertGreater(int(response.headers['Retry-After']), 0)
+            self.assertEqual(check.call_count, limit)
+
+        self.assertEqual(self.client.get('/api/auth/limiterStats').status_code, 401)
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = User.query.one().id
+        stats = self.client.get('/api/auth/limiterStats').json
+        self.assertEqual(stats['rejected_by'], {'login': 1})
+        self.assertEqual(stats['allowed'], limit)
+
+    def test_reset_password_rejected_before_hashing(self):
+        """The per-IP limit stops password resets before a new hash is made"""
+        limit = app.config['AUTH_RATE_LIMITS']['ip'][0]
+        with mock.patch('auth.hash_password', return_value='hashed') as hash_password:
+            for i in range(limit):
+                # A different username each time, so only the IP limit applies
+                self.client.post('/api/reset-password', json={'username': f'user{i}', 'password': 'new'})
+            response = self.client.post('/api/reset-password', json={'username': 'alice', 'password': 'new'})
+            self.assertEqual(response.status_code, 429)
+            hash_password.assert_not_called()
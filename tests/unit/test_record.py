@@ -0,0 +1,314 @@
+import unittest
+from app import app, db
+from models import User, WorkoutRecord, SportsCategory, UserDailyStats, UserStreak
+from stats import rebuild_daily_stats
+from cache import analytics_cache
+from record import MAX_WINDOW_DAYS
+from ranking import calorie_rank, leaderboard
+from datetime import date, timedelta
+from tests.unit.utils import capture_queries
+
+
+class TestRecord(unittest.TestCase):
+    def setUp(self):
+        app.config.update({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+            'WTF_CSRF_ENABLED': False,
+            'SECRET_KEY': 'test-key'
+        })
+        self.client = app.test_client()
+        self.ctx = app.app_context()
+        self.ctx.push()
+        db.create_all()
+
+        self.category = SportsCategory(name='Running', met_value=9.8)
+        db.session.add(self.category)
+        db.session.commit()
+        self.user = self.add_user('runner')
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def add_user(self, username):
+        user = User(username=username, email=f'{username}@example.com', password_hash='hash')
+        db.session.add(user)
+        db.session.commit()
+        return user
+
+    def add_record(self, user, days_ago=0, minutes=60, calories=500, difficulty=3):
+        db.session.add(WorkoutRecord(
+            user_id=user.id,
+            category_id=self.category.id,
+            date=date.today() - timedelta(days=days_ago),
+            duration_min=minutes,
+            difficulty=difficulty,
+            calories_burn=calories
+        ))
+        db.session.commit()
+
+    def login(self, user):
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = user.id
+
+    def test_trend_values(self):
+        """Trend zero-fills the window and averages over every user"""
+        other = self.add_user('walker')
+        self.add_record(self.user, days_ago=0, minutes=90)
+        self.add_record(self.user, days_ago=0, minutes=30)
+        self.add_record(other, days_ago=2, minutes=60)
+        self.login(self.user)
+
+        response = self.client.get('/api/record/trend?range=week')
+        self.assertEqual(response.status_code, 200)
+        data = response.json
+        self.assertEqual(len(data['labels']), 8)
+        self.assertEqual(data['labels'][-1], date.today().strftime('%m-%d'))
+        self.assertEqual(data['you'][-1], 2.0)
+        self.assertEqual(data['you'][-3], 0)
+        self.assertEqual(data['average'][-1], 1.0)
+        self.assertEqual(data['average'][-3], 0.5)
+
+    def test_trend_query_count_is_constant(self):
+        """Trend query count does not depend on the number of users or days"""
+        self.login(self.user)
+        with capture_queries() as small:
+            self.client.get('/api/record/trend?range=week')
+
+        for i in range(5):
+            other = self.add_user(f'user{i}')
+            self.add_record(other, days_ago=i)
+        with capture_queries() as large:
+            self.client.get('/api/record/trend?range=month')
+
+        self.assertEqual(len(small), len(large))
+
+    def test_log_updates_daily_stats(self):
+        """Logging a workout folds it into the daily rollup"""
+        self.login(self.user)
+        for minutes in ('30', '45'):
+            response = self.client.post('/api/log_strength', data={
+                'activity': 'Running',
+                'duration': minutes,
+                'calories': '200',
+                'difficulty': '4'
+            })
+            self.assertEqual(response.status_code, 200)
+
+        row = db.session.get(UserDailyStats, (self.user.id, date.today(), self.category.id))
+        self.assertEqual(row.total_minutes, 75)
+        self.assertEqual(row.total_calories, 400)
+        self.assertEqual(row.difficulty_sum, 8)
+        self.assertEqual(row.difficulty_count, 2)
+
+    def test_daily_stats_follow_deletes_and_rebuild(self):
+        """Deleting records shrinks the rollup and a rebuild reproduces it"""
+        self.add_record(self.user, minutes=60)
+        self.add_record(self.user, minutes=20)
+        record = WorkoutRecord.query.filter_by(duration_min=20).first()
+        db.session.delete(record)
+        db.session.commit()
+
+        row = db.session.get(UserDailyStats, (self.user.id, date.today(), self.category.id))
+        self.assertEqual((row.total_minutes, row.difficulty_count), (60, 1))
+
+        db.session.query(UserDailyStats).delete()
+        db.session.commit()
+        self.assertEqual(rebuild_daily_stats(), 1)
+        row = db.session.get(UserDailyStats, (self.user.id, date.today(), self.category.id))
+        self.assertEqual((row.total_minutes, row.difficulty_count), (60, 1))
+
+    def test_metrics_percentiles(self):
+        """Percentiles rank hours, calories and difficulty with stable ties"""
+        tied = self.add_user('tied')
+        low = self.add_user('low')
+        self.add_user('idle')
+        self.add_record(self.user, minutes=60, calories=300, difficulty=2)
+        self.add_record(tied, minutes=60, calories=600, difficulty=5)
+        self.add_record(low, minutes=30, calories=100, difficulty=1)
+        self.login(self.user)
+
+        response = self.client.get('/api/record/metrics')
+        self.assertEqual(response.status_code, 200)
+        # idle and low are below; tied shares the caller's hours
+        self.assertEqual(response.json['percentile'], 66)
+        self.assertEqual(response.json['percentiles'], {'hours': 66, 'calories': 66, 'difficulty': 66})
+
+        self.login(tied)
+        response = self.client.get('/api/record/metrics')
+        self.assertEqual(response.json['percentiles'], {'hours': 66, 'calories': 100, 'difficulty': 100})
+
+    def test_leaderboard_limit_category_and_rank(self):
+        """Leaderboard honours limit/category and reports the caller's rank"""
+        cycling = SportsCategory(name='Cycling', met_value=7.5)
+        db.session.add(cycling)
+        db.session.commit()
+        users = [self.add_user(f'user{i}') for i in range(3)]
+        for i, user in enumerate(users):
+            self.add_record(user, calories=100 * (i + 1))
+        db.session.add(WorkoutRecord(user_id=self.user.id, category_id=cycling.id, date=date.today(),
+                                     duration_min=30, difficulty=2, calories_burn=1000))
+        db.session.commit()
+
+        response = self.client.get('/api/record/leaderboard?limit=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['username'] for r in response.json['leaderboard']], ['runner', 'user2'])
+        self.assertIsNone(response.json['your_rank'])
+
+        self.login(users[0])
+        response = self.client.get('/api/record/leaderboard?category=Running')
+        board = response.json['leaderboard']
+        self.assertEqual([r['username'] for r in board], ['user2', 'user1', 'user0', 'runner'])
+        self.assertEqual(response.json['your_rank'], {'rank': 3, 'total_calories': 100.0, 'total_hours': 1.0})
+
+        response = self.client.get('/api/record/leaderboard?category=Rowing')
+        self.assertEqual(response.status_code, 400)
+
+    def test_rank_matches_leaderboard_order(self):
+        """calorie_rank agrees with leaderboard() for ties, zero totals and users without records"""
+        users = [self.user] + [self.add_user(f'user{i}') for i in range(5)]
+        self.add_record(users[1], calories=300)
+        self.add_record(users[2], calories=300)
+        self.add_record(users[4], calories=0)
+        self.add_record(users[5], calories=100)
+        start, end = date.today() - timedelta(days=7), date.today()
+        board = [row['username'] for row in leaderboard(start, end, limit=10)]
+        for user in users:
+            self.assertEqual(calorie_rank(user.id, start, end)['rank'], board.index(user.username) + 1,
+                             user.username)
+
+    def test_public_leaderboard_uses_named_ranges(self):
+        """Anonymous callers cannot mint new cache keys with custom or made-up windows"""
+        self.add_record(self.user)
+        start = (date.today() - timedelta(days=3)).isoformat()
+        response = self.client.get(f'/api/record/leaderboard?from={start}')
+        self.assertEqual(response.status_code, 401)
+
+        analytics_cache.invalidate()
+        self.client.get('/api/record/leaderboard?range=bogus1')
+        hits = analytics_cache.hits
+        self.client.get('/api/record/leaderboard?range=bogus2')
+        self.assertEqual(analytics_cache.hits, hits + 1)
+
+        self.login(self.user)
+        response = self.client.get(f'/api/record/leaderboard?from={start}')
+        self.assertEqual(response.json['your_rank']['rank'], 1)
+
+    def test_category_comparison_caches_averages(self):
+        """Everyone's category averages come from the analytics cache; the caller's figures are one query"""
+        db.session.add(SportsCategory(name='Yoga', met_value=3.0))
+        db.session.commit()
+        other = self.add_user('walker')
+        self.add_record(self.user, minutes=30, calories=150, difficulty=2)
+        self.add_record(self.user, minutes=30, calories=150, difficulty=4)
+        self.add_record(other, minutes=60, calories=400, difficulty=5)
+        self.login(self.user)
+        analytics_cache.invalidate()
+        expected = {
+            'categories': ['Running', 'Yoga'],
+            'you': [3.0, 0],
+            'average': [3.67, 0],
+            'minutes': [60, 0],
+            'calories': [300.0, 0]
+        }
+
+        with capture_queries() as queries:
+            response = self.client.get('/api/record/categoryComparison')
+        self.assertEqual(response.json, expected)
+        self.assertEqual(len(queries), 2)
+
+        with capture_queries() as queries:
+            response = self.client.get('/api/record/categoryComparison')
+        self.assertEqual(response.json, expected)
+        self.assertEqual(len(queries), 1)
+
+    def test_dashboard_matches_individual_endpoints(self):
+        """The batched dashboard returns the same payloads as the old endpoints"""
+        other = self.add_user('walker')
+        self.add_record(self.user, minutes=45, calories=300)
+        self.add_record(self.user, days_ago=1, minutes=30, calories=200)
+        self.add_record(other, minutes=60, calories=500)
+        self.login(self.user)
+
+        response = self.client.get('/api/record/dashboard?range=month')
+        self.assertEqual(response.status_code, 200)
+        data = response.json
+        for key, url in (
+            ('metrics', '/api/record/metrics'),
+            ('trend', '/api/record/trend'),
+            ('aeroAnaerobic', '/api/record/aeroAnaerobic'),
+            ('categoryComparison', '/api/record/categoryComparison'),
+            ('leaderboard', '/api/record/leaderboard'),
+        ):
+            self.assertEqual(data[key], self.client.get(url + '?range=month').json, key)
+        self.assertEqual(data['metrics']['current_streak'], 2)
+
+    def test_custom_windows_and_buckets(self):
+        """from/to and range=year are supported with bucketed trend series"""
+        self.add_record(self.user, days_ago=0, minutes=60)
+        self.add_record(self.user, days_ago=3, minutes=120)
+        self.login(self.user)
+
+        start = (date.today() - timedelta(days=3)).isoformat()
+        response = self.client.get(f'/api/record/trend?from={start}&to={date.today().isoformat()}')
+        self.assertEqual(response.json['you'], [2.0, 0, 0, 1.0])
+        self.assertEqual(response.json['cumulative'], [2.0, 2.0, 2.0, 3.0])
+
+        response = self.client.get('/api/record/trend?range=year')
+        self.assertEqual(response.json['bucket'], 'week')
+        self.assertEqual(sum(response.json['you']), 3.0)
+
+        response = self.client.get('/api/record/dashboard?range=all&bucket=month')
+        self.assertEqual(response.json['trend']['cumulative'][-1], 3.0)
+        self.assertEqual(response.json['metrics']['total_hours'], 3.0)
+
+        self.assertEqual(self.client.get('/api/record/trend?from=2024-02-01&to=2024-01-01').status_code, 400)
+        self.assertEqual(self.client.get('/api/record/trend?bucket=hour').status_code, 400)
+
+    def test_window_span_is_capped(self):
+        """Over-wide custom windows are refused and custom windows never enter the shared cache"""
+        self.add_record(self.user)
+        self.login(self.user)
+        response = self.client.get('/api/record/dashboard?from=0001-01-01&to=9999-12-31')
+        self.assertEqual(response.status_code, 400)
+        start = date.today() - timedelta(days=MAX_WINDOW_DAYS)
+        response = self.client.get(f'/api/record/trend?from={start.isoformat()}')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(f'/api/record/trend?from={(start + timedelta(days=1)).isoformat()}')
+        self.assertEqual(response.status_code, 200)
+
+        analytics_cache.invalidate()
+        self.client.get(f'/api/record/dashboard?from={(date.today() - timedelta(days=40)).isoformat()}')
+        self.assertEqual(analytics_cache.stats()['size'], 0)
+
+    def test_streaks_are_not_capped_by_window(self):
+        """Stored streaks exceed the range window and merge backdated gaps"""
+        for days_ago in list(range(0, 5)) + list(range(6, 12)):
+            self.add_record(self.user, days_ago=days_ago)
+        self.login(self.user)
+
+        metrics = self.client.get('/api/record/metrics?range=week').json
+        self.assertEqual((metrics['current_streak'], metrics['longest_streak']), (5, 6))
+
+        # Backdated insert fills the gap and joins both runs
+        self.add_record(self.user, days_ago=5)
+        metrics = self.client.get('/api/record/metrics?range=week').json
+        self.assertEqual((metrics['current_streak'], metrics['longest_streak']), (12, 12))
+
+        # Deleting today's only record breaks the current streak
+        db.session.delete(WorkoutRecord.query.filter_by(date=date.today()).one())
+        db.session.commit()
+        streak = db.session.get(UserStreak, self.user.id)
+        self.assertEqual((streak.current_run, streak.longest_run), (11, 11))
+        self.assertEqual(self.client.get('/api/record/metrics').json['current_streak'], 0)
+
+        db.session.query(UserStreak).delete()
+        db.session.commit()
+        rebuild_daily_stats()
+        self.assertEqual(db.session.get(UserStreak, self.user.id).longest_run, 11)
+
+
+if __name__ == '__main__':
+    unittest.main()
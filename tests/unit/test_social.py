@@ -0,0 +1,445 @@
+import threading
+import unittest
+from datetime import datetime, timedelta
+from app import app, db
+from models import User, Post, Comment, Like, Bookmark, ResourceVersion
+from social.counters import repair_post_counters
+from social.events import feed_bus
+from social.search import rebuild_search_index
+from social import timeline, trending
+from unittest import mock
+from tests.unit.utils import capture_queries
+
+
+class TestSocial(unittest.TestCase):
+    def setUp(self):
+        app.config.update({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+            'WTF_CSRF_ENABLED': False,
+            'SECRET_KEY': 'test-key'
+        })
+        self.client = app.test_client()
+        self.ctx = app.app_context()
+        self.ctx.push()
+        db.create_all()
+
+        self.user = User(username='poster', email='poster@example.com', password_hash='hash')
+        db.session.add(self.user)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def login(self, user):
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = user.id
+
+    def add_posts(self, count, user=None):
+        base = datetime(2025, 5, 1, 12, 0)
+        posts = [
+            # Pairs share a timestamp so the id tie-breaker is exercised
+            Post(user_id=(user or self.user).id, content=f'post {i}', created_at=base + timedelta(minutes=i // 2))
+            for i in range(count)
+        ]
+        db.session.add_all(posts)
+        db.session.commit()
+        return posts
+
+    def test_feed_keyset_pagination(self):
+        """Pages are newest first, disjoint, and end with a null cursor"""
+        self.add_posts(25)
+        seen = []
+        url = '/api/posts?limit=10'
+        while url:
+            page = self.client.get(url).json
+            seen.extend(p['id'] for p in page['posts'])
+            url = f"/api/posts?limit=10&before={page['next_cursor']}" if page['next_cursor'] else None
+        self.assertEqual(len(seen), 25)
+        expected = [p.id for p in Post.query.order_by(Post.created_at.desc(), Post.id.desc())]
+        self.assertEqual(seen, expected)
+
+        self.assertEqual(self.client.get('/api/posts?before=garbage').status_code, 400)
+
+    def add_engagement(self, posts, users):
+        for post in posts:
+            for user in users:
+                db.session.add_all([
+                    Like(user_id=user.id, post_id=post.id),
+                    Bookmark(user_id=user.id, post_id=post.id),
+                    Comment(user_id=user.id, post_id=post.id, content=f'hi from {user.username}'),
+                ])
+        db.session.commit()
+        repair_post_counters()
+
+    def test_feed_query_count_is_bounded(self):
+        """Feed and bookmarks serialization cost does not grow with posts or engagement"""
+        self.login(self.user)
+        self.add_engagement(self.add_posts(2), [self.user])
+        with capture_queries() as small_feed:
+            self.client.get('/api/posts')
+        with capture_queries() as small_bookmarks:
+            self.client.get('/api/posts/bookmarked')
+
+        fans = [User(username=f'fan{i}', email=f'fan{i}@example.com', password_hash='hash') for i in range(4)]
+        db.session.add_all(fans)
+        db.session.commit()
+        self.add_engagement(self.add_posts(15), fans + [self.user])
+        with capture_queries() as large_feed:
+            response = self.client.get('/api/posts')
+        with capture_queries() as large_bookmarks:
+            bookmarked = self.client.get('/api/posts/bookmarked').json
+
+        self.assertEqual(len(small_feed), len(large_feed))
+        self.assertLessEqual(len(large_feed), 6)
+        self.assertEqual(len(small_bookmarks), len(large_bookmarks))
+
+        post = response.json['posts'][0]
+        self.assertEqual((post['likes'], post['bookmarks'], post['comment_count']), (5, 5, 5))
+        self.assertTrue(post['is_liked'] and post['is_bookmarked'])
+        self.assertEqual([c['username'] for c in post['comments']], ['fan2', 'fan3', 'poster'])
+        self.assertEqual(len(bookmarked), 17)
+
+    def test_counters_follow_writes_and_repair(self):
+        """Toggles and comments keep counters exact; repair recounts drift"""
+        post = self.add_posts(1)[0]
+        self.login(self.user)
+        self.client.post(f'/api/posts/{post.id}/like')
+        self.client.post(f'/api/posts/{post.id}/bookmark')
+        self.client.post(f'/api/posts/{post.id}/comments', json={'text': 'first'})
+        self.client.post(f'/api/posts/{post.id}/bookmark')
+        db.session.refresh(post)
+        self.assertEqual((post.like_count, post.bookmark_count, post.comment_count), (1, 0, 1))
+
+        post.like_count = 42
+        db.session.commit()
+        self.assertEqual(repair_post_counters(), 1)
+        db.session.refresh(post)
+        self.assertEqual(post.like_count, 1)
+
+    def test_concurrent_toggles_keep_counters_exact(self):
+        """Toggles hammered from many threads never let counters drift"""
+        post = self.add_posts(1)[0]
+        users = [User(username=f'clicker{i}', email=f'clicker{i}@example.com', password_hash='hash') for i in range(6)]
+        db.session.add_all(users)
+        db.session.commit()
+        user_ids = [u.id for u in users]
+        post_id = post.id
+        errors = []
+
+        def hammer(user_id):
+            client = app.test_client()
+            with client.session_transaction() as sess:
+                sess['user_id'] = user_id
+            for i in range(15):
+                action = 'like' if i % 2 else 'bookmark'
+                response = client.post(f'/api/posts/{post_id}/{action}')
+                if response.status_code != 200:
+                    errors.append(response.status_code)
+
+        # Two threads per user so the same (user, post) pair races itself
+        threads = [threading.Thread(target=hammer, args=(uid,)) for uid in user_ids * 2]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(errors, [])
+        db.session.expire_all()
+        post = db.session.get(Post, post_id)
+        self.assertEqual(post.like_count, Like.query.filter_by(post_id=post_id).count())
+        self.assertEqual(post.bookmark_count, Bookmark.query.filter_by(post_id=post_id).count())
+        self.assertEqual(repair_post_counters(), 0)
+
+    def test_toggle_returns_state_without_reading_first(self):
+        """A toggle is write-only SQL and reports the new state and count"""
+        post = self.add_posts(1)[0]
+        url = f'/api/posts/{post.id}/like'
+        self.login(self.user)
+        trending.renormalize()
+        db.session.commit()
+        with capture_queries() as statements:
+            response = self.client.post(url)
+        self.assertEqual(response.json, {'success': True, 'is_liked': True, 'likes': 1})
+        # DELETE like, INSERT like, read the trending epoch, bump the feed
+        # version, UPDATE counter and score; the like itself is never read
+        sql = [s.split()[0] for s in statements]
+        self.assertEqual(sql, ['DELETE', 'INSERT', 'SELECT', 'INSERT', 'UPDATE'])
+        self.assertIn('settings', statements[2])
+
+        response = self.client.post(url)
+        self.assertEqual(response.json, {'success': True, 'is_liked': False, 'likes': 0})
+        response = self.client.post(f'/api/posts/{post.id}/bookmark')
+        self.assertEqual(response.json, {'success': True, 'is_bookmarked': True, 'bookmarks': 1})
+        self.assertEqual(self.client.post('/api/posts/999/like').status_code, 404)
+        self.assertEqual(Like.query.count(), 0)
+
+    def test_toggle_row_without_timestamp(self):
+        """A like with a NULL created_at is removed by a toggle and adds no trend weight"""
+        post = self.add_posts(1)[0]
+        post_id = post.id
+        # Raw SQL: the ORM would fill in the column default
+        db.session.execute(db.text('INSERT INTO likes (user_id, post_id, created_at) VALUES (:u, :p, NULL)'),
+                           {'u': self.user.id, 'p': post_id})
+        repair_post_counters()
+        score = db.session.get(Post, post_id).trend_score
+        self.login(self.user)
+
+        response = self.client.post(f'/api/posts/{post_id}/like')
+        self.assertEqual(response.json, {'success': True, 'is_liked': False, 'likes': 0})
+        self.assertEqual(Like.query.count(), 0)
+        db.session.expire_all()
+        self.assertEqual(db.session.get(Post, post_id).trend_score, score)
+        self.assertEqual(repair_post_counters(), 0)
+
+    def test_comment_on_missing_post(self):
+        """Commenting on an unknown post is a 404 that stores and publishes nothing"""
+        self.login(self.user)
+        start = feed_bus.last_id
+        response = self.client.post('/api/posts/999/comments', json={'text': 'orphan'})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json, {'error': 'Post not found'})
+        self.assertEqual(Comment.query.count(), 0)
+        self.assertEqual(feed_bus.last_id, start)
+        self.assertEqual(db.session.execute(db.text('SELECT COUNT(*) FROM post_search')).scalar(), 0)
+
+    def test_engagement_batch(self):
+        """Batched operations apply in order in one transaction"""
+        first, second = self.add_posts(2)
+        self.login(self.user)
+        response = self.client.post('/api/engagement/batch', json={'ops': [
+            {'type': 'like', 'post_id': first.id, 'state': True},
+            {'type': 'like', 'post_id': first.id, 'state': True},
+            {'type': 'bookmark', 'post_id': second.id},
+            {'type': 'like', 'post_id': second.id},
+            {'type': 'like', 'post_id': second.id, 'state': False},
+        ]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(r['state'], r['count']) for r in response.json['results']],
+            [(True, 1), (True, 1), (True, 1), (True, 1), (False, 0)]
+        )
+
+        # An unknown post rolls back the whole batch
+        response = self.client.post('/api/engagement/batch', json={'ops': [
+            {'type': 'like', 'post_id': first.id, 'state': False},
+            {'type': 'like', 'post_id': 999},
+        ]})
+        self.assertEqual((response.status_code, response.json['index']), (404, 1))
+        bad = {'ops': [{'type': 'share', 'post_id': first.id}]}
+        self.assertEqual(self.client.post('/api/engagement/batch', json=bad).status_code, 400)
+        db.session.expire_all()
+        self.assertEqual(db.session.get(Post, first.id).like_count, 1)
+        self.assertEqual(repair_post_counters(), 0)
+
+    def test_stream_replays_committed_writes(self):
+        """Writes publish feed deltas after commit and the stream replays them"""
+        post = self.add_posts(1)[0]
+        post_id = post.id
+        self.login(self.user)
+        start = feed_bus.last_id
+        self.client.post('/api/posts', json={'content': 'live'})
+        self.client.post(f'/api/posts/{post_id}/comments', json={'text': 'hi'})
+        self.client.post(f'/api/posts/{post_id}/like')
+        self.client.post('/api/posts/999/like')
+        self.client.post('/api/posts', json={})
+
+        events = feed_bus.since(start)
+        self.assertEqual([kind for _, kind, _ in events], ['post', 'comment', 'engagement'])
+        self.assertEqual(events[0][2]['content'], 'live')
+        self.assertEqual(events[1][2]['comment_count'], 1)
+        self.assertEqual(events[2][2], {'post_id': post_id, 'field': 'likes', 'count': 1})
+
+        response = self.client.get('/api/posts/stream', headers={'Last-Event-ID': str(start + 1)})
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        chunks = response.iter_encoded()
+        next(chunks)
+        self.assertTrue(next(chunks).startswith(f'id: {start + 2}\nevent: comment\n'.encode()))
+        response.close()
+        self.assertEqual(self.client.get('/api/posts/stream?last_event_id=x').status_code, 400)
+
+    def test_search_posts_and_comments(self):
+        """Search is ranked, keyset-paginated and kept in sync by triggers"""
+        posts = self.add_posts(6)
+        posts[0].content = 'Morning run by the river'
+        posts[1].content = 'Run run run: interval running day'
+        posts[2].content = 'Leg day at the gym'
+        db.session.add(Comment(user_id=self.user.id, post_id=posts[2].id, content='Great run after?'))
+        db.session.commit()
+
+        response = self.client.get('/api/posts/search?q=run')
+        ids = [p['id'] for p in response.json['posts']]
+        # The densest match ranks first; comments make their post match too
+        self.assertEqual(ids[0], posts[1].id)
+        self.assertEqual(set(ids), {posts[0].id, posts[1].id, posts[2].id})
+
+        first = self.client.get('/api/posts/search?q=run&limit=2').json
+        rest = self.client.get(f"/api/posts/search?q=run&limit=2&after={first['next_cursor']}").json
+        self.assertEqual([p['id'] for p in first['posts'] + rest['posts']], ids)
+        self.assertIsNone(rest['next_cursor'])
+
+        # Updates and deletes reach the index; operators in input are plain text
+        posts[0].content = 'Evening swim'
+        db.session.delete(posts[2])
+        db.session.commit()
+        ids = [p['id'] for p in self.client.get('/api/posts/search?q=run').json['posts']]
+        self.assertEqual(ids, [posts[1].id])
+        self.assertEqual(len(self.client.get('/api/posts/search?q=swim" (').json['posts']), 1)
+        self.assertEqual(self.client.get('/api/posts/search?q=%20').status_code, 400)
+        self.assertEqual(rebuild_search_index(), 5)
+
+    def test_follow_and_home_timeline(self):
+        """Follows fill the timeline on write; large accounts are merged on read"""
+        reader = User(username='reader', email='reader@example.com', password_hash='hash')
+        star = User(username='star', email='star@example.com', password_hash='hash')
+        db.session.add_all([reader, star])
+        db.session.commit()
+        self.add_posts(3)
+        self.add_posts(2, user=star)
+
+        self.login(reader)
+        response = self.client.post(f'/api/users/{self.user.id}/follow')
+        self.assertEqual(response.json['followers'], 1)
+        self.client.post(f'/api/users/{self.user.id}/follow')
+        self.assertEqual(self.client.post(f'/api/users/{reader.id}/follow').status_code, 400)
+        self.client.post(f'/api/users/{star.id}/follow')
+
+        self.login(self.user)
+        self.client.post('/api/posts', json={'content': 'fanned out'})
+        with mock.patch.object(timeline, 'FANOUT_LIMIT', 0):
+            self.login(star)
+            self.client.post('/api/posts', json={'content': 'read-time merge'})
+        self.assertEqual(Post.query.filter_by(fanned_out=False).count(), 1)
+
+        self.login(reader)
+        first = self.client.get('/api/timeline?limit=4').json
+        rest = self.client.get(f"/api/timeline?limit=4&before={first['next_cursor']}").json
+        posts = first['posts'] + rest['posts']
+        self.assertEqual([p['content'] for p in posts[:2]], ['read-time merge', 'fanned out'])
+        ids = [p['id'] for p in posts]
+        self.assertEqual(sorted(ids), sorted(set(ids)))
+        self.assertEqual(len(ids), 2 + 3 + 2)
+
+        self.client.delete(f'/api/users/{self.user.id}/follow')
+        posts = self.client.get('/api/timeline').json['posts']
+        self.assertEqual({p['username'] for p in posts}, {'star'})
+        self.assertEqual(posts[0]['content'], 'read-time merge')
+        # Own posts for both authors plus star's two fanned-out posts for the reader
+        self.assertEqual(timeline.rebuild_timelines(), 4 + 3 + 2)
+
+    def test_fan_out_reads_stored_follower_count(self):
+        """The write/read fan-out choice uses users.follower_count, not a COUNT over follows"""
+        self.login(self.user)
+        db.session.execute(db.text('UPDATE users SET follower_count = :n WHERE id = :id'),
+                           {'n': timeline.FANOUT_LIMIT + 1, 'id': self.user.id})
+        db.session.commit()
+        with capture_queries() as statements:
+            self.client.post('/api/posts', json={'content': 'big account'})
+        self.assertFalse(Post.query.one().fanned_out)
+        self.assertFalse(any('FROM follows' in s for s in statements))
+
+    def test_trending_scores_are_incremental(self):
+        """Engagement moves posts up the trending list and undoing it moves them back"""
+        fans = [User(username=f'fan{i}', email=f'fan{i}@example.com', password_hash='hash') for i in range(2)]
+        db.session.add_all(fans)
+        db.session.commit()
+        self.login(self.user)
+        for content in ('liked', 'commented', 'quiet'):
+            self.client.post('/api/posts', json={'content': content})
+        liked, commented, quiet = [p.id for p in Post.query.order_by(Post.id)]
+        for fan in fans:
+            self.login(fan)
+            self.client.post(f'/api/posts/{liked}/like')
+        self.client.post(f'/api/posts/{commented}/comments', json={'text': 'nice'})
+
+        def ranking(url='/api/posts/trending'):
+            return [p['id'] for p in self.client.get(url).json['posts']]
+        self.assertEqual(ranking(), [commented, liked, quiet])
+        first = self.client.get('/api/posts/trending?limit=2').json
+        rest = self.client.get('/api/posts/trending', query_string={'limit': 2, 'after': first['next_cursor']}).json
+        self.assertEqual([p['id'] for p in first['posts'] + rest['posts']], [commented, liked, quiet])
+
+        # Renormalizing rescales every score but keeps their ratios
+        before = {p.id: p.trend_score for p in Post.query}
+        self.assertEqual(trending.renormalize(datetime.utcnow() + timedelta(days=30)), trending.current_epoch())
+        db.session.commit()
+        db.session.expire_all()
+        after = {p.id: p.trend_score for p in Post.query}
+        self.assertAlmostEqual(after[liked] / after[quiet], before[liked] / before[quiet])
+        self.assertLess(after[liked], before[liked])
+
+        # Undoing a like subtracts what it added; the incremental scores match a full rebuild
+        self.client.post(f'/api/posts/{liked}/like')
+        db.session.expire_all()
+        incremental = {p.id: p.trend_score for p in Post.query}
+        self.assertEqual(trending.rebuild_trending(), 3)
+        db.session.expire_all()
+        for post in Post.query:
+            self.assertAlmostEqual(post.trend_score / incremental[post.id], 1, places=6)
+        self.assertEqual(ranking(), [commented, liked, quiet])
+
+        # Newer engagement outweighs older engagement
+        now = datetime.utcnow()
+        self.assertAlmostEqual(
+            trending.contribution('like', now + trending.HALF_LIFE) / trending.contribution('like', now), 2
+        )
+
+        # Within MAX_EPOCH_LAG scoring only reads the epoch; the daily job moves it
+        epoch = trending.current_epoch()
+        with capture_queries() as statements:
+            trending.contribution('like', now + trending.MAX_EPOCH_LAG - trending.EPOCH_STEP)
+        self.assertEqual([st.split()[0] for st in statements], ['SELECT'])
+        self.assertEqual(trending.current_epoch(), epoch)
+
+    def test_stale_epoch_renormalizes_instead_of_overflowing(self):
+        """A write long after the last renormalize rescales scores first rather than raising OverflowError"""
+        self.login(self.user)
+        self.client.post('/api/posts', json={'content': 'old'})
+        post_id = Post.query.one().id
+        epoch = trending.current_epoch()
+        etag = self.client.get('/api/posts/trending').headers['ETag']
+
+        # Far enough ahead that 2 ** age would overflow against the stored epoch
+        later = datetime.utcnow() + timedelta(days=1100)
+        with self.assertRaises(OverflowError):
+            trending.contribution('like', later, epoch)
+        score = trending.contribution('like', later)
+        self.assertLess(score, 2 ** 10)
+        self.assertGreater(trending.current_epoch(), epoch)
+        db.session.commit()
+        self.assertGreaterEqual(db.session.get(Post, post_id).trend_score, 0)
+        self.assertNotEqual(self.client.get('/api/posts/trending').headers['ETag'], etag)
+        self.assertIsNone(db.session.get(ResourceVersion, trending.EPOCH_KEY))
+
+    def test_score_cursors_reject_non_finite(self):
+        """Search and trending share the feed's cursor format and refuse NaN/inf scores"""
+        self.login(self.user)
+        for url in ('/api/posts/trending', '/api/posts/search?q=run'):
+            sep = '&' if '?' in url else '?'
+            self.assertEqual(self.client.get(f'{url}{sep}after=nan_1').status_code, 400)
+            self.assertEqual(self.client.get(f'{url}{sep}after=inf_1').status_code, 400)
+            self.assertEqual(self.client.get(f'{url}{sep}after=1.5_x').status_code, 400)
+            self.assertEqual(self.client.get(f'{url}{sep}after=-1.5_3').status_code, 200)
+
+    def test_comment_thread_pagination(self):
+        """The feed embeds the latest comments and the thread endpoint pages the rest"""
+        post = self.add_posts(1)[0]
+        self.login(self.user)
+        for i in range(7):
+            self.client.post(f'/api/posts/{post.id}/comments', json={'text': f'c{i}'})
+
+        feed_post = self.client.get('/api/posts').json['posts'][0]
+        self.assertEqual(feed_post['comment_count'], 7)
+        self.assertEqual([c['text'] for c in feed_post['comments']], ['c4', 'c5', 'c6'])
+
+        page = self.client.get(f"/api/posts/{post.id}/comments?limit=3&cursor={feed_post['comments'][0]['id']}").json
+        self.assertEqual([c['text'] for c in page['comments']], ['c1', 'c2', 'c3'])
+        page = self.client.get(f"/api/posts/{post.id}/comments?limit=3&cursor={page['next_cursor']}").json
+        self.assertEqual([c['text'] for c in page['comments']], ['c0'])
+        self.assertIsNone(page['next_cursor'])
+
+
+if __name__ == '__main__':
+    unittest.main()
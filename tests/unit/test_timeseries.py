@@ -0,0 +1,41 @@
+import unittest
+from datetime import date
+import numpy as np
+import timeseries
+
+
+class TestTimeseries(unittest.TestCase):
+    def test_daily_series_zero_fills_and_sums(self):
+        """Values on the same day add up; missing days are zero"""
+        series = timeseries.daily_series(
+            date(2024, 1, 1), date(2024, 1, 5),
+            [date(2024, 1, 2), date(2024, 1, 2), date(2024, 1, 5), date(2023, 12, 31)],
+            [10, 20, 5, 99]
+        )
+        self.assertEqual(series.tolist(), [0, 30, 0, 0, 5])
+
+    def test_week_and_month_buckets(self):
+        """Weeks start on Monday and months on the 1st"""
+        start, end = date(2024, 1, 29), date(2024, 2, 6)
+        days = timeseries.day_axis(start, end)
+        series = np.ones(len(days))
+
+        starts, sums, last_idx = timeseries.bucketize(days, series, 'week')
+        self.assertEqual(timeseries.labels(starts, 'week'), ['01-29', '02-05'])
+        self.assertEqual(sums.tolist(), [7, 2])
+        self.assertEqual(last_idx.tolist(), [6, 8])
+
+        starts, sums, _ = timeseries.bucketize(days, series, 'month')
+        self.assertEqual(timeseries.labels(starts, 'month'), ['2024-01', '2024-02'])
+        self.assertEqual(sums.tolist(), [3, 6])
+
+    def test_rolling_and_cumulative(self):
+        """Rolling mean uses the days available and cumulative is a running total"""
+        series = np.array([7, 0, 0, 0, 0, 0, 0, 14], dtype=float)
+        self.assertEqual(timeseries.rolling_mean(series, 7).tolist()[:2], [7, 3.5])
+        self.assertEqual(timeseries.rolling_mean(series, 7).tolist()[-1], 2)
+        self.assertEqual(timeseries.cumulative(series).tolist()[-1], 21)
+
+
+if __name__ == '__main__':
+    unittest.main()
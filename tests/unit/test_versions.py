@@ -0,0 +1,88 @@
+import unittest
+from app import app, db
+from models import User, Post, SportsCategory, WorkoutPlan
+from tests.unit.utils import capture_queries
+
+
+class TestConditionalGet(unittest.TestCase):
+    def setUp(self):
+        app.config.update({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+            'WTF_CSRF_ENABLED': False,
+            'SECRET_KEY': 'test-key'
+        })
+        self.client = app.test_client()
+        self.ctx = app.app_context()
+        self.ctx.push()
+        db.create_all()
+
+        self.user = User(username='reader', email='reader@example.com', password_hash='hash')
+        self.other = User(username='other', email='other@example.com', password_hash='hash')
+        db.session.add_all([self.user, self.other, SportsCategory(name='Running', met_value=9.8)])
+        db.session.commit()
+        post = Post(user_id=self.user.id, content='hello')
+        db.session.add(post)
+        db.session.commit()
+        self.post_id = post.id
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = self.user.id
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def revalidate(self, url, etag):
+        return self.client.get(url, headers={'If-None-Match': etag})
+
+    def test_not_modified_skips_serialization(self):
+        """A matching ETag is answered with one stamp query and no body"""
+        for url in ['/api/posts', '/api/posts/bookmarked', '/api/my_plan', '/api/sport_categories']:
+            first = self.client.get(url)
+            self.assertEqual(first.status_code, 200, url)
+            etag = first.headers['ETag']
+            with capture_queries() as statements:
+                response = self.revalidate(url, etag)
+            self.assertEqual(response.status_code, 304, url)
+            self.assertEqual(response.data, b'')
+            self.assertEqual(len(statements), 1, url)
+            self.assertIn('resource_versions', statements[0])
+
+    def test_writes_change_the_etag(self):
+        """Writes to a resource invalidate only the ETags that depend on it"""
+        feed = self.client.get('/api/posts').headers['ETag']
+        bookmarked = self.client.get('/api/posts/bookmarked').headers['ETag']
+        plans = self.client.get('/api/my_plan').headers['ETag']
+        categories = self.client.get('/api/sport_categories').headers['ETag']
+
+        self.client.post(f'/api/posts/{self.post_id}/like')
+        self.assertEqual(self.revalidate('/api/posts', feed).status_code, 200)
+        self.assertEqual(self.revalidate('/api/posts/bookmarked', bookmarked).status_code, 200)
+        self.assertEqual(self.revalidate('/api/my_plan', plans).status_code, 304)
+
+        # Another user's plan leaves ours alone; our own plan does not
+        db.session.add(WorkoutPlan(user_id=self.other.id, activity='Running',
+                                   start_time=db.func.now(), end_time=db.func.now()))
+        db.session.commit()
+        self.assertEqual(self.revalidate('/api/my_plan', plans).status_code, 304)
+        self.client.post('/api/my_plan', json={
+            'activity': 'Running', 'start_time': '2025-05-01T08:00', 'end_time': '2025-05-01T09:00'
+        })
+        self.assertEqual(self.revalidate('/api/my_plan', plans).status_code, 200)
+
+        self.assertEqual(self.revalidate('/api/sport_categories', categories).status_code, 304)
+        db.session.get(SportsCategory, 1).name = 'Trail running'
+        db.session.commit()
+        self.assertEqual(self.revalidate('/api/sport_categories', categories).status_code, 200)
+
+    def test_etag_is_per_user(self):
+        """The feed ETag differs between users because is_liked differs"""
+        mine = self.client.get('/api/posts').headers['ETag']
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = self.other.id
+        self.assertEqual(self.revalidate('/api/posts', mine).status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
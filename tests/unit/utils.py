@@ -0,0 +1,19 @@
+from contextlib import contextmanager
+from sqlalchemy import event
+from app import db
+
+
+@contextmanager
+def capture_queries():
+    """Collect every SQL statement executed against the app engine."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
@@ -0,0 +1,70 @@
+import numpy as np
+
+# Supported bucket sizes for bucketed series
+BUCKETS = ('day', 'week', 'month')
+
+# 1970-01-01 was a Thursday; shifting by 3 days makes weeks start on Monday
+_MONDAY_SHIFT = 3
+
+
+def day_axis(start, end):
+    """Every day from start to end inclusive as a datetime64[D] array."""
+    return np.arange(np.datetime64(start, 'D'), np.datetime64(end, 'D') + 1)
+
+
+def daily_series(start, end, dates, values):
+    """Zero-filled per-day sums of ``values`` over [start, end].
+
+    Several values on the same date are added together; dates outside the
+    window are ignored.
+    """
+    first = np.datetime64(start, 'D')
+    size = (np.datetime64(end, 'D') - first).astype(int) + 1
+    series = np.zeros(max(size, 0), dtype=float)
+    if len(dates):
+        offsets = (np.asarray(dates, dtype='datetime64[D]') - first).astype(int)
+        weights = np.asarray(values, dtype=float)
+        inside = (offsets >= 0) & (offsets < size)
+        np.add.at(series, offsets[inside], weights[inside])
+    return series
+
+
+def bucket_keys(days, unit):
+    # Integer bucket id for each day; equal ids belong to the same bucket
+    if unit == 'day':
+        return days.astype(int)
+    if unit == 'week':
+        return (days.astype(int) + _MONDAY_SHIFT) // 7
+    if unit == 'month':
+        return days.astype('datetime64[M]').astype(int)
+    raise ValueError(f'Unknown bucket: {unit}')
+
+
+def bucketize(days, series, unit):
+    """Sum a daily series into buckets.
+
+    Returns (first day of each bucket, bucket sums, index of each bucket's
+    last day in ``days``).
+    """
+    keys = bucket_keys(days, unit)
+    _, first_idx, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    sums = np.bincount(inverse, weights=series, minlength=len(first_idx))
+    last_idx = np.append(first_idx[1:] - 1, len(days) - 1)
+    return days[first_idx], sums, last_idx
+
+
+def rolling_mean(series, window=7):
+    """Trailing mean over ``window`` days; the first days average what is available."""
+    sums = np.cumsum(series)
+    sums[window:] = sums[window:] - sums[:-window]
+    counts = np.minimum(np.arange(1, len(series) + 1), window)
+    return sums / counts
+
+
+def cumulative(series):
+    return np.cumsum(series)
+
+
+def labels(starts, unit):
+    fmt = '%Y-%m' if unit == 'month' else '%m-%d'
+    return [d.strftime(fmt) for d in starts.astype(object)]
@@ -1,17 +1,48 @@
-import os
 from flask import (
     Blueprint, render_template, request, session,
-    current_app, redirect, url_for, flash
+    current_app, redirect, url_for, flash, send_file, abort
 )
-from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge
+import re
+import click
+import avatars
+import blobstore
 from models import db, User
 
-profile_bp = Blueprint('profile_bp', __name__)
+profile_bp = Blueprint('profile_bp', __name__, cli_group='profile')
 
 def allowed_file(filename):
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# A year: thumbnail URLs embed the content hash, so they never go stale
+THUMBNAIL_MAX_AGE = 365 * 24 * 3600
+DIGEST_RE = re.compile(r'[0-9a-f]{64}')
+
+def save_avatar(user, file):
+    # Streamed into the blob store with its thumbnails; the row keeps only the hash
+    # and the sniffed mimetype. Raises blobstore.TooLarge or ValueError (not an image).
+    root = current_app.config['UPLOAD_FOLDER']
+    user.avatar_hash, user.avatar_mimetype = avatars.save(
+        root, file.stream, current_app.config['AVATAR_MAX_BYTES']
+    )
+    user.avatar = None
+
+@profile_bp.app_template_global()
+def avatar_url(user, size=avatars.SIZES[-1]):
+    """Immutable thumbnail URL when the user has a stored avatar, else the redirecting one."""
+    if user.avatar_hash:
+        return url_for('profile_bp.avatar_thumbnail', user_id=user.id, size=size, digest=user.avatar_hash)
+    return url_for('profile_bp.get_avatar', user_id=user.id, size=size)
+
+@profile_bp.errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    # The body went over MAX_CONTENT_LENGTH while Werkzeug parsed the form
+    if request.path.startswith('/api/'):
+        return {'error': 'Avatar is too large'}, 413
+    flash('no bigger than 5MB', 'error')
+    return redirect(url_for('profile_bp.edit_info'))
+
 # 1) Account main page
 @profile_bp.route('/account')
 def account():
@@ -47,15 +78,12 @@ def edit_info():
             if ext not in ALLOWED:
                 flash('only JPG/PNG', 'error')
             else:
-                if file.content_length > 5*1024*1024:
+                try:
+                    save_avatar(user, file)
+                except blobstore.TooLarge:
                     flash('no bigger than 5MB', 'error')
-                else:
-                    fn = secure_filename(file.filename)
-                    updir = current_app.config['UPLOAD_FOLDER']
-                    os.makedirs(updir, exist_ok=True)
-                    path = os.path.join(updir, fn)
-                    file.save(path)
-                    user.avatar = fn
+                except ValueError:
+                    flash('not a valid image', 'error')
         db.session.commit()
         flash('flashed!', 'success')
         return redirect(url_for('profile_bp.my_info'))
@@ -74,7 +102,7 @@ def api_account_info():
         'email': user.email,
         'nickname': user.nickname or 'Not set',
         'address': user.address or 'Not set',
-        'avatar': url_for('profile_bp.get_avatar', user_id=user.id),
+        'avatar': avatar_url(user),
         'coins': user.coins or 0
     }
 
@@ -93,12 +121,15 @@ def api_account_edit():
     user.address = address or user.address
 
 
-    # update avatar and make it be binary
+    # update avatar
     file = request.files.get('avatar')
     if file and allowed_file(file.filename):
-        avatar_data = file.read()
-        user.avatar = avatar_data
-        user.avatar_mimetype = file.mimetype
+        try:
+            save_avatar(user, file)
+        except blobstore.TooLarge:
+            return {'error': 'Avatar is too large'}, 413
+        except ValueError:
+            return {'error': 'Invalid image'}, 400
     try:
         db.session.commit()
         return {'success': True}
@@ -109,6 +140,54 @@ def api_account_edit():
 @profile_bp.route('/account/avatar/<int:user_id>')
 def get_avatar(user_id):
     user = User.query.get_or_404(user_id)
-    if not user.avatar:
-        return redirect(url_for('static', filename='uploads/default.jpg')) # default avatar
-    return current_app.response_class(user.avatar, mimetype=user.avatar_mimetype)
\ No newline at end of file
+    if user.avatar_hash:
+        size = request.args.get('size', type=int)
+        if size not in avatars.SIZES:
+            size = avatars.SIZES[-1]
+        return redirect(avatar_url(user, size))
+    # Rows not yet moved by the move_avatars_to_blobstore migration; loads the deferred column
+    if user.avatar_hash is None and user.avatar:
+        return current_app.response_class(user.avatar, mimetype=user.avatar_mimetype)
+    return redirect(url_for('static', filename='uploads/default.jpg')) # default avatar
+
+@profile_bp.route('/account/avatar/<int:user_id>/<int:size>/<digest>')
+def avatar_thumbnail(user_id, size, digest):
+    # The digest pins the content, so this never touches the database
+    if size not in avatars.SIZES or not DIGEST_RE.fullmatch(digest):
+        abort(404)
+    root = current_app.config['UPLOAD_FOLDER']
+    try:
+        found = avatars.ensure_thumbnails(root, digest)
+    except ValueError:
+        found = False
+    if not found:
+        abort(404)
+    response = send_file(
+        avatars.thumbnail_path(root, digest, size),
+        mimetype=avatars.THUMBNAIL_MIMETYPE,
+        etag=f'{digest}-{size}',
+        max_age=THUMBNAIL_MAX_AGE,
+        conditional=True
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+@profile_bp.cli.command('rebuild-thumbnails')
+def rebuild_thumbnails_command():
+    """Create missing avatar thumbnails (e.g. for avatars moved by a migration)."""
+    root = current_app.config['UPLOAD_FOLDER']
+    digests = db.session.execute(
+        db.select(User.avatar_hash).where(User.avatar_hash.is_not(None)).distinct()
+    ).scalars()
+    missing = 0
+    for digest in digests:
+        try:
+            found = avatars.ensure_thumbnails(root, digest)
+        except ValueError:
+            found = False
+        if not found:
+            missing += 1
+            click.echo(f'Avatar {digest} is missing or unreadable.')
+    click.echo(f'Checked avatar thumbnails; {missing} avatars could not be processed.')
@@ -0,0 +1,89 @@
+import hashlib
+from flask import Response, request
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from models import db, Post, Comment, Like, Bookmark, User, WorkoutPlan, SportsCategory, ResourceVersion
+
+# Everything that appears in feed JSON (posts, counts, comments, usernames)
+FEED = 'feed'
+CATEGORIES = 'categories'
+# Trending scores as a whole, bumped when renormalizing rescales them
+TRENDING = 'trending'
+
+
+def plans(user_id):
+    return f'plans:{user_id}'
+
+
+def touch(*names, connection=None):
+    """Bump the write counters of ``names`` in the current transaction."""
+    connection = connection or db.session.connection()
+    table = ResourceVersion.__table__
+    for name in names:
+        stmt = sqlite_insert(table).values(name=name, version=1)
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=['name'],
+            set_={'version': table.c.version + 1}
+        ))
+
+
+def _changed_resources(session):
+    names = set()
+    for obj in session.new | session.deleted | session.dirty:
+        if obj in session.dirty and not session.is_modified(obj):
+            continue
+        if isinstance(obj, (Post, Comment, Like, Bookmark)):
+            names.add(FEED)
+        elif isinstance(obj, User):
+            if obj not in session.dirty or inspect(obj).attrs.username.history.has_changes():
+                names.add(FEED)
+        elif isinstance(obj, WorkoutPlan):
+            names.add(plans(obj.user_id))
+        elif isinstance(obj, SportsCategory):
+            names.add(CATEGORIES)
+    return names
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_versions(session, flush_context):
+    # ORM writes; Core statements (counters, engagement) call touch() themselves
+    names = _changed_resources(session)
+    if names:
+        touch(*sorted(names), connection=session.connection())
+
+
+def version_stamp(names, *aggregates, extra=()):
+    """Opaque ETag value for a resource, read in one query.
+
+    Combines the write counters of ``names`` with cheap aggregates such as
+    MAX(id) / COUNT(*), which also catch writes made outside the app (seed
+    scripts, migrations), and ``extra`` request parameters.
+    """
+    counters = [
+        func.coalesce(
+            select(ResourceVersion.version)
+            .where(ResourceVersion.name == name)
+            .scalar_subquery(),
+            0
+        )
+        for name in names
+    ]
+    row = db.session.execute(select(*counters, *aggregates)).one()
+    raw = '|'.join(str(value) for value in (*row, *extra))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def conditional(stamp, build):
+    """304 when If-None-Match matches ``stamp``; otherwise build() with an ETag.
+
+    ``build`` only runs on a miss, so a 304 skips the serialization queries.
+    """
+    if request.if_none_match.contains(stamp):
+        response = Response(status=304)
+    else:
+        response = build()
+    response.set_etag(stamp)
+    # Per-user bodies: browsers may keep them but must revalidate every time
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response